@@ -9,12 +9,23 @@ from app.repositories.impl.postgres_repository import (
     QdrantVectorRepository,
     PostgresLogRepository
 )
+from app.repositories.impl.pgvector_repository import (
+    PgvectorMemoryRepository,
+    PgvectorVectorRepository
+)
+from app.repositories.impl.embedded_repository import EmbeddedVectorRepository
+from app.repositories.impl.buffered_log_repository import BufferedLogRepository
 from app.services.memory_service import MemoryService
 from app.services.query_service import QueryService
 from app.services.reward_service import RewardService, TrainingService
 from app.core.agent import MemoryExtractor
 from app.core.rl_extractor import RLEnhancedExtractor
-from app.core.memory import EmbeddingService
+from app.core.memory import EmbeddingService, BatchingEmbeddingService
+from app.core.embedding_cache import CachedEmbeddingService
+from app.core.query_cache import get_query_result_cache, get_semantic_query_cache
+from app.core.provider_pool import provider_executor
+from app.database.vector_store import get_vector_write_buffer
+from app.database.vector_outbox import VectorOutboxDrainer
 from app.config import settings
 
 
@@ -46,29 +57,46 @@ class ServiceContainer:
         self._query_service: Any = None
         self._reward_service: Any = None
         self._training_service: Any = None
+        self._vector_outbox_drainer: Any = None
 
     @property
     def memory_repo(self):
         if self._memory_repo is None:
-            self._memory_repo = PostgresMemoryRepository()
+            if settings.VECTOR_BACKEND == "pgvector":
+                self._memory_repo = PgvectorMemoryRepository()
+            else:
+                self._memory_repo = PostgresMemoryRepository(vector_repo=self.vector_repo)
         return self._memory_repo
 
     @property
     def vector_repo(self):
         if self._vector_repo is None:
-            self._vector_repo = QdrantVectorRepository()
+            if settings.VECTOR_BACKEND == "pgvector":
+                self._vector_repo = PgvectorVectorRepository()
+            elif settings.VECTOR_BACKEND == "embedded":
+                self._vector_repo = EmbeddedVectorRepository()
+            else:
+                self._vector_repo = QdrantVectorRepository()
         return self._vector_repo
 
     @property
     def log_repo(self):
         if self._log_repo is None:
-            self._log_repo = PostgresLogRepository()
+            if settings.LOG_BUFFER_ENABLED:
+                self._log_repo = BufferedLogRepository(PostgresLogRepository())
+            else:
+                self._log_repo = PostgresLogRepository()
         return self._log_repo
 
     @property
     def embedding_service(self):
         if self._embedding_service is None:
-            self._embedding_service = EmbeddingService()
+            embedding_service = EmbeddingService()
+            if settings.EMBEDDING_BATCH_ENABLED:
+                embedding_service = BatchingEmbeddingService(embedding_service)
+            if settings.EMBEDDING_CACHE_ENABLED:
+                embedding_service = CachedEmbeddingService(embedding_service)
+            self._embedding_service = embedding_service
         return self._embedding_service
 
     @property
@@ -93,7 +121,8 @@ class ServiceContainer:
                 log_repo=self.log_repo,
                 embedding_service=self.embedding_service,
                 extractor=self.memory_extractor,
-                rl_extractor=self.rl_extractor
+                rl_extractor=self.rl_extractor,
+                vector_repo=self.vector_repo
             )
         return self._user_memory_service
 
@@ -105,7 +134,8 @@ class ServiceContainer:
                 log_repo=self.log_repo,
                 embedding_service=self.embedding_service,
                 extractor=self.memory_extractor,
-                rl_extractor=self.rl_extractor
+                rl_extractor=self.rl_extractor,
+                vector_repo=self.vector_repo
             )
         return self._agent_memory_service
 
@@ -130,5 +160,40 @@ class ServiceContainer:
             self._training_service = TrainingService()
         return self._training_service
 
+    @property
+    def vector_outbox_drainer(self):
+        if (
+            self._vector_outbox_drainer is None
+            and settings.VECTOR_INDEX_MODE == "outbox"
+            and settings.VECTOR_BACKEND == "qdrant"
+        ):
+            self._vector_outbox_drainer = VectorOutboxDrainer()
+        return self._vector_outbox_drainer
+
+    def stats(self) -> dict:
+        """汇总各组件的运行指标"""
+        stats = {}
+        if hasattr(self.embedding_service, "stats"):
+            stats["embedding"] = self.embedding_service.stats()
+        stats["providers"] = provider_executor.stats()
+        write_buffer = get_vector_write_buffer()
+        if write_buffer is not None:
+            stats["vector_write_buffer"] = write_buffer.stats()
+        if self.vector_outbox_drainer is not None:
+            stats["vector_outbox"] = self.vector_outbox_drainer.stats()
+        if getattr(self.vector_repo, "hot_cache", None) is not None:
+            stats["vector_hot_cache"] = self.vector_repo.hot_cache.stats()
+        if isinstance(self.log_repo, BufferedLogRepository):
+            stats["log_buffer"] = self.log_repo.stats()
+        query_cache = get_query_result_cache()
+        if query_cache is not None:
+            stats["query_cache"] = query_cache.stats()
+        semantic_cache = get_semantic_query_cache()
+        if semantic_cache is not None:
+            stats["semantic_query_cache"] = semantic_cache.stats()
+        if isinstance(self.vector_repo, EmbeddedVectorRepository):
+            stats["embedded_vector_index"] = self.vector_repo.index.stats()
+        return stats
+
 
 container = ServiceContainer()
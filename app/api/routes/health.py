@@ -49,3 +49,9 @@ async def get_config(
         "rl_flywheel_enabled": settings.ENABLE_RL_FLYWHEEL,
         "model_version": model_version
     }
+
+
+@router.get("/stats")
+async def get_stats():
+    """运行指标：缓存命中率、批量合并等"""
+    return container.stats()
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException
-from typing import Optional
-from app.api.schemas.memory import MemoryRequest, UpdateMemoryRequest
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Dict, Any, Tuple, Union, AsyncIterator, Deque
+from collections import deque
+from app.api.schemas.memory import MemoryRequest, UpdateMemoryRequest, BulkMemoryLine
 from app.api.dependencies import container
+from app.domain.dto import NewMemoryDTO
 from app.domain.enums import MemoryType, MemoryLayer
 from app.config import settings
+import asyncio
+import json
 
 router = APIRouter()
 
+# (行号, 解析后的记忆或错误信息)
+BulkItem = Tuple[int, Union[NewMemoryDTO, str]]
+
 
 def _get_memory_layer(layer: Optional[str]) -> MemoryLayer:
     if layer:
@@ -14,6 +22,173 @@ def _get_memory_layer(layer: Optional[str]) -> MemoryLayer:
     return MemoryLayer.EVENT
 
 
+def _memory_type_enabled(memory_type: MemoryType) -> bool:
+    if memory_type == MemoryType.USER:
+        return settings.ENABLE_USER_MEMORY
+    return settings.ENABLE_AGENT_MEMORY
+
+
+async def _ndjson_lines(request: Request) -> AsyncIterator[bytes]:
+    """逐行读取 NDJSON 请求体，按分块拼接跨分块的行；解码留给逐行解析，单行编码错误只影响该行"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def _read_ahead(request: Request) -> AsyncIterator[bytes]:
+    """
+    后台任务读取请求体，逐行放入有界队列
+
+    读取与写入重叠进行；写入跟不上时队列写满，读取暂停，上传随之被限速。
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.BULK_INGEST_CHUNK_SIZE)
+    done = object()
+
+    async def read():
+        try:
+            async for line in _ndjson_lines(request):
+                await queue.put(line)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(done)
+
+    reader = asyncio.create_task(read())
+    try:
+        while True:
+            line = await queue.get()
+            if line is done:
+                return
+            if isinstance(line, Exception):
+                raise line
+            yield line
+    finally:
+        reader.cancel()
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    边读请求体边输出结果的流式响应
+
+    StreamingResponse 在发送期间并发监听客户端断开并消费 receive()，与读取请求体冲突，
+    会丢失请求体消息或挂起。这里不另行监听，客户端断开时由读取请求体的一方收到
+    ClientDisconnect 并结束生成器。
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _parse_bulk_line(raw: Union[str, bytes]) -> Union[NewMemoryDTO, str]:
+    """解析一行记忆，失败时返回错误信息"""
+    try:
+        text = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+    except UnicodeDecodeError as e:
+        return f"invalid UTF-8: {e}"
+
+    try:
+        line = BulkMemoryLine.model_validate_json(text)
+        memory_type = MemoryType(line.memory_type)
+        memory_layer = _get_memory_layer(line.memory_layer)
+    except ValueError as e:
+        return str(e)
+
+    if not _memory_type_enabled(memory_type):
+        return f"{memory_type.value} memory is not enabled"
+
+    return NewMemoryDTO(
+        memory_type=memory_type,
+        entity_id=line.entity_id,
+        content=line.content,
+        memory_layer=memory_layer,
+        metadata=line.metadata or {},
+        is_permanent=line.is_permanent
+    )
+
+
+async def _store_chunk(service, chunk: List[BulkItem]) -> List[Dict[str, Any]]:
+    """写入一批记忆，按输入顺序返回每行的结果；写入失败时整批标记为失败"""
+    memories = [item for _, item in chunk if isinstance(item, NewMemoryDTO)]
+    error = None
+    try:
+        memory_ids = iter(await service.store_many(memories))
+    except Exception as e:
+        error = str(e)
+
+    results = []
+    for line_number, item in chunk:
+        if isinstance(item, str):
+            results.append({"line": line_number, "status": "error", "error": item})
+        elif error is not None:
+            results.append({"line": line_number, "status": "error", "error": error})
+        else:
+            results.append({
+                "line": line_number,
+                "status": "success",
+                "id": next(memory_ids),
+                "layer": item.memory_layer.value
+            })
+    return results
+
+
+async def bulk_ingest(service, lines: AsyncIterator[Union[str, bytes]]) -> AsyncIterator[str]:
+    """
+    按批写入 NDJSON 记忆流并逐行输出结果
+
+    最多 BULK_INGEST_CONCURRENCY 个批次同时处理，一批生成向量时另一批在写库；
+    结果按批次顺序输出，与输入行顺序一致。
+    """
+    in_flight: Deque[asyncio.Task] = deque()
+    chunk: List[BulkItem] = []
+    line_number = 0
+
+    async for text in lines:
+        line_number += 1
+        if not text.strip():
+            continue
+        chunk.append((line_number, _parse_bulk_line(text)))
+        if len(chunk) < settings.BULK_INGEST_CHUNK_SIZE:
+            continue
+
+        in_flight.append(asyncio.ensure_future(_store_chunk(service, chunk)))
+        chunk = []
+        if len(in_flight) >= settings.BULK_INGEST_CONCURRENCY:
+            for result in await in_flight.popleft():
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    if chunk:
+        in_flight.append(asyncio.ensure_future(_store_chunk(service, chunk)))
+    while in_flight:
+        for result in await in_flight.popleft():
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+
+@router.post("/memory/bulk")
+async def bulk_store_memories(request: Request):
+    """
+    批量导入记忆：请求体为 NDJSON，每行一条记忆，可跨实体、跨记忆层
+
+    每行格式 {"memory_type": "user", "entity_id": "...", "content": "...", "memory_layer": "event",
+    "metadata": {...}, "is_permanent": false}；响应为 NDJSON，每行对应一条输入的结果。
+    请求体边上传边写入，内存占用与请求体大小无关。
+    """
+    service = container.user_memory_service or container.agent_memory_service
+    if not service:
+        raise HTTPException(status_code=503, detail="Memory service not available")
+
+    return _DuplexStreamingResponse(
+        bulk_ingest(service, _read_ahead(request)),
+        media_type="application/x-ndjson"
+    )
+
+
 @router.post("/memory/user/{user_id}")
 async def store_user_memory(user_id: str, request: MemoryRequest):
     if not settings.ENABLE_USER_MEMORY:
@@ -169,20 +344,19 @@ async def update_user_profile(user_id: str, memory_id: str, request: UpdateMemor
     if not service:
         raise HTTPException(status_code=503, detail="User memory service not available")
 
-    success = await service.update(
+    memory = await service.update(
         memory_id, request.content, request.metadata,
         request.reason or "手动更新 Profile 层记忆"
     )
 
-    if not success:
+    if not memory:
         raise HTTPException(status_code=404, detail="Profile memory not found")
 
-    memory = await service.get_by_id(memory_id)
     return {
         "id": memory_id,
         "status": "success",
-        "content": memory.content if memory else None,
-        "metadata": memory.metadata if memory else None,
+        "content": memory.content,
+        "metadata": memory.metadata,
         "layer": "profile"
     }
 
@@ -196,20 +370,19 @@ async def update_user_event(user_id: str, memory_id: str, request: UpdateMemoryR
     if not service:
         raise HTTPException(status_code=503, detail="User memory service not available")
 
-    success = await service.update(
+    memory = await service.update(
         memory_id, request.content, request.metadata,
         request.reason or "手动更新 Event 层记忆"
     )
 
-    if not success:
+    if not memory:
         raise HTTPException(status_code=404, detail="Event memory not found")
 
-    memory = await service.get_by_id(memory_id)
     return {
         "id": memory_id,
         "status": "success",
-        "content": memory.content if memory else None,
-        "metadata": memory.metadata if memory else None,
+        "content": memory.content,
+        "metadata": memory.metadata,
         "layer": "event"
     }
 
@@ -257,20 +430,19 @@ async def update_agent_profile(agent_id: str, memory_id: str, request: UpdateMem
     if not service:
         raise HTTPException(status_code=503, detail="Agent memory service not available")
 
-    success = await service.update(
+    memory = await service.update(
         memory_id, request.content, request.metadata,
         request.reason or "手动更新 Agent Profile 层记忆"
     )
 
-    if not success:
+    if not memory:
         raise HTTPException(status_code=404, detail="Agent Profile memory not found")
 
-    memory = await service.get_by_id(memory_id)
     return {
         "id": memory_id,
         "status": "success",
-        "content": memory.content if memory else None,
-        "metadata": memory.metadata if memory else None,
+        "content": memory.content,
+        "metadata": memory.metadata,
         "layer": "profile"
     }
 
@@ -284,20 +456,19 @@ async def update_agent_event(agent_id: str, memory_id: str, request: UpdateMemor
     if not service:
         raise HTTPException(status_code=503, detail="Agent memory service not available")
 
-    success = await service.update(
+    memory = await service.update(
         memory_id, request.content, request.metadata,
         request.reason or "手动更新 Agent Event 层记忆"
     )
 
-    if not success:
+    if not memory:
         raise HTTPException(status_code=404, detail="Agent Event memory not found")
 
-    memory = await service.get_by_id(memory_id)
     return {
         "id": memory_id,
         "status": "success",
-        "content": memory.content if memory else None,
-        "metadata": memory.metadata if memory else None,
+        "content": memory.content,
+        "metadata": memory.metadata,
         "layer": "event"
     }
 
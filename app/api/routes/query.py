@@ -1,6 +1,10 @@
+from typing import Any, Dict, Optional
 from fastapi import APIRouter, HTTPException, Depends
 from app.api.dependencies import container
-from app.api.schemas.query import QueryRequest, QueryResponse
+from app.api.schemas.query import (
+    QueryRequest, QueryResponse, MemoryResult, BatchQueryRequest, BatchQueryResponse
+)
+from app.domain.dto import QueryItemDTO
 from app.config import settings
 
 router = APIRouter()
@@ -18,29 +22,86 @@ async def query_memory(
     - **user_id**: 用户 ID（可选）
     - **agent_id**: 代理 ID（可选）
     - **top_k**: 返回的最大结果数
+    - **filters**: 过滤条件（记忆层、创建时间窗口、最低重要性、是否包含过期记忆）
     """
     if not query_service:
         raise HTTPException(status_code=503, detail="No memory modules enabled")
 
-    if not request.user_id and not request.agent_id:
-        raise HTTPException(status_code=400, detail="Either user_id or agent_id is required")
-
-    if request.user_id and not settings.ENABLE_USER_MEMORY:
-        raise HTTPException(status_code=400, detail="User memory is not enabled")
-
-    if request.agent_id and not settings.ENABLE_AGENT_MEMORY:
-        raise HTTPException(status_code=400, detail="Agent memory is not enabled")
+    error = _validate_query(request)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
 
     results = await query_service.query(
         request.query,
         request.user_id,
         request.agent_id,
-        request.top_k
+        request.top_k,
+        request.filters
     )
 
+    return _query_response(results)
+
+
+@router.post("/memory/query/batch", response_model=BatchQueryResponse)
+async def batch_query_memory(
+    request: BatchQueryRequest,
+    query_service=Depends(lambda: container.query_service)
+):
+    """
+    批量融合查询
+
+    - **queries**: 查询列表，每项字段与 /memory/query 相同
+
+    所有不同的查询文本一次批量生成向量，检索并发进行，命中一次批量取回，结果与输入顺序一致
+    """
+    if not query_service:
+        raise HTTPException(status_code=503, detail="No memory modules enabled")
+
+    if len(request.queries) > settings.QUERY_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.QUERY_BATCH_MAX_ITEMS} queries per batch"
+        )
+
+    for index, item in enumerate(request.queries):
+        error = _validate_query(item)
+        if error:
+            raise HTTPException(status_code=400, detail=f"queries[{index}]: {error}")
+
+    results = await query_service.query_many([
+        QueryItemDTO(
+            query=item.query,
+            user_id=item.user_id,
+            agent_id=item.agent_id,
+            top_k=item.top_k,
+            filters=item.filters
+        )
+        for item in request.queries
+    ])
+
+    return BatchQueryResponse(results=[_query_response(result) for result in results])
+
+
+def _validate_query(request: QueryRequest) -> Optional[str]:
+    if not request.user_id and not request.agent_id:
+        return "Either user_id or agent_id is required"
+
+    if request.user_id and not settings.ENABLE_USER_MEMORY:
+        return "User memory is not enabled"
+
+    if request.agent_id and not settings.ENABLE_AGENT_MEMORY:
+        return "Agent memory is not enabled"
+
+    return None
+
+
+def _query_response(results: Dict[str, Any]) -> QueryResponse:
+    user_memories = [MemoryResult(**m) for m in results["user_memories"]]
+    agent_memories = [MemoryResult(**m) for m in results["agent_memories"]]
+
     return QueryResponse(
-        query=request.query,
-        total_results=len(results.get("user_memories", [])) + len(results.get("agent_memories", [])),
-        user_memories=[],
-        agent_memories=[]
+        query=results["query"],
+        total_results=len(user_memories) + len(agent_memories),
+        user_memories=user_memories,
+        agent_memories=agent_memories
     )
@@ -11,6 +11,16 @@ class MemoryRequest(BaseModel):
     is_permanent: bool = False
 
 
+class BulkMemoryLine(BaseModel):
+    """批量导入请求体（NDJSON）中的一行"""
+    memory_type: str
+    entity_id: str
+    content: str
+    memory_layer: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    is_permanent: bool = False
+
+
 class UpdateMemoryRequest(BaseModel):
     """记忆更新请求"""
     content: Optional[str] = None
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
+from app.domain.dto import MemoryFilterDTO
 
 
 class QueryRequest(BaseModel):
@@ -7,6 +8,7 @@ class QueryRequest(BaseModel):
     user_id: Optional[str] = None
     agent_id: Optional[str] = None
     top_k: int = 5
+    filters: Optional[MemoryFilterDTO] = None
 
 
 class MemoryResult(BaseModel):
@@ -24,3 +26,11 @@ class QueryResponse(BaseModel):
     total_results: int
     user_memories: list[MemoryResult]
     agent_memories: list[MemoryResult]
+
+
+class BatchQueryRequest(BaseModel):
+    queries: list[QueryRequest]
+
+
+class BatchQueryResponse(BaseModel):
+    results: list[QueryResponse]
@@ -4,6 +4,7 @@ import dashscope
 from dashscope import Generation
 import json
 from app.config import settings
+from app.core.provider_pool import provider_executor
 from datetime import datetime
 
 
@@ -142,7 +143,9 @@ class MemoryExtractor:
     
     async def _extract_with_dashscope(self, prompt: str) -> List[Dict[str, Any]]:
         """使用 DashScope 进行记忆抽取"""
-        response = Generation.call(
+        response = await provider_executor.run(
+            "dashscope_llm",
+            Generation.call,
             model=self.model,
             prompt=prompt,
             temperature=settings.LLM_TEMPERATURE,
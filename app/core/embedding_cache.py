@@ -0,0 +1,145 @@
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from app.repositories.interfaces import IEmbeddingService
+from app.database.models import EmbeddingCache, async_session
+from app.config import settings
+import hashlib
+
+
+class CachedEmbeddingService(IEmbeddingService):
+    """
+    内容寻址的 Embedding 缓存
+
+    缓存键为 (提供商, 模型, 维度, 内容哈希)，切换 EMBEDDING_PROVIDER 或模型后
+    旧条目自然不再命中。查找顺序：进程内 LRU -> PostgreSQL 持久层 -> 提供商。
+    """
+
+    def __init__(
+        self,
+        inner: IEmbeddingService,
+        max_entries: Optional[int] = None,
+        persistent: Optional[bool] = None
+    ):
+        self.inner = inner
+        self.max_entries = max_entries or settings.EMBEDDING_CACHE_MAX_ENTRIES
+        self.persistent = (
+            persistent if persistent is not None else settings.EMBEDDING_CACHE_PERSISTENT
+        )
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    async def generate(self, text: str) -> List[float]:
+        embeddings = await self.generate_many([text])
+        return embeddings[0]
+
+    async def generate_many(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._cache_key(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+
+        for key in keys:
+            embedding = self._lru_get(key)
+            if embedding is not None:
+                found[key] = embedding
+                self.memory_hits += 1
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing and self.persistent:
+            stored = await self._load_persistent(missing)
+            for key, embedding in stored.items():
+                found[key] = embedding
+                self._lru_put(key, embedding)
+            self.persistent_hits += sum(1 for key in keys if key in stored)
+
+        missing_texts = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing_texts.setdefault(key, text)
+
+        if missing_texts:
+            self.misses += len(missing_texts)
+            embeddings = await self._generate_missing(list(missing_texts.values()))
+            generated = dict(zip(missing_texts.keys(), embeddings))
+            for key, embedding in generated.items():
+                found[key] = embedding
+                self._lru_put(key, embedding)
+            if self.persistent:
+                await self._save_persistent(generated)
+
+        return [found[key] for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        hits = self.memory_hits + self.persistent_hits
+        stats = {
+            "cache": {
+                "entries": len(self._lru),
+                "max_entries": self.max_entries,
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0
+            }
+        }
+        if hasattr(self.inner, "stats"):
+            stats.update(self.inner.stats())
+        return stats
+
+    async def _generate_missing(self, texts: List[str]) -> List[List[float]]:
+        # 单条未命中走 generate，以便下层的微批合并生效
+        if len(texts) == 1:
+            return [await self.inner.generate(texts[0])]
+        return await self.inner.generate_many(texts)
+
+    def _cache_key(self, text: str) -> str:
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return (
+            f"{settings.EMBEDDING_PROVIDER}:{settings.embedding_model}:"
+            f"{settings.embedding_dim}:{content_hash}"
+        )
+
+    def _lru_get(self, key: str) -> Optional[List[float]]:
+        embedding = self._lru.get(key)
+        if embedding is not None:
+            self._lru.move_to_end(key)
+        return embedding
+
+    def _lru_put(self, key: str, embedding: List[float]):
+        self._lru[key] = embedding
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    async def _load_persistent(self, keys: List[str]) -> Dict[str, List[float]]:
+        async with async_session() as session:
+            result = await session.execute(
+                select(EmbeddingCache.cache_key, EmbeddingCache.embedding).where(
+                    EmbeddingCache.cache_key.in_(keys)
+                )
+            )
+            return {row.cache_key: row.embedding for row in result}
+
+    async def _save_persistent(self, embeddings: Dict[str, List[float]]):
+        rows = [
+            {
+                "cache_key": key,
+                "provider": settings.EMBEDDING_PROVIDER,
+                "model": settings.embedding_model,
+                "dimension": settings.embedding_dim,
+                "content_hash": key.rsplit(":", 1)[1],
+                "embedding": embedding
+            }
+            for key, embedding in embeddings.items()
+        ]
+
+        async with async_session() as session:
+            await session.execute(
+                insert(EmbeddingCache).values(rows).on_conflict_do_nothing(
+                    index_elements=["cache_key"]
+                )
+            )
+            await session.commit()
@@ -0,0 +1,90 @@
+from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import zlib
+import numpy as np
+
+
+def _features(text: str, ngram_range: tuple) -> List[bytes]:
+    """字符 n-gram + 空白分词，兼顾中文与英文"""
+    normalized = " ".join(text.lower().split())
+    features = [f"w:{word}".encode("utf-8") for word in normalized.split(" ") if word]
+    min_n, max_n = ngram_range
+    for n in range(min_n, max_n + 1):
+        for i in range(len(normalized) - n + 1):
+            features.append(f"c{n}:{normalized[i:i + n]}".encode("utf-8"))
+    return features
+
+
+def embed_texts(texts: List[str], dim: int, ngram_range: tuple = (1, 3)) -> np.ndarray:
+    """
+    哈希 n-gram 随机投影：每个特征经 crc32 映射到一个维度和一个 ±1 符号，
+    等价于稀疏 one-hot 乘以固定的随机符号矩阵。结果确定、无需网络，行向量已 L2 归一化。
+    """
+    rows, hashes = [], []
+    for row, text in enumerate(texts):
+        feature_hashes = [zlib.crc32(f) for f in _features(text, ngram_range)]
+        rows.extend([row] * len(feature_hashes))
+        hashes.extend(feature_hashes)
+
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    if hashes:
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        columns = hashes % dim
+        signs = np.where((hashes // dim) & 1, -1.0, 1.0).astype(np.float32)
+        np.add.at(matrix, (np.asarray(rows), columns), signs)
+
+    norms = np.linalg.norm(matrix, axis=1)
+    # 空文本没有特征，给一个固定的单位向量，避免余弦距离出现 NaN
+    matrix[norms == 0, 0] = 1.0
+    norms[norms == 0] = 1.0
+    return matrix / norms[:, None]
+
+
+class LocalEmbedder:
+    """进程内 Embedding：可选使用进程池并行处理大批量"""
+
+    def __init__(self, dim: int, processes: int = 0, chunk_size: int = 256):
+        self.dim = dim
+        self.chunk_size = chunk_size
+        self._pool: Optional[ProcessPoolExecutor] = (
+            ProcessPoolExecutor(max_workers=processes) if processes > 0 else None
+        )
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if self._pool is None or len(texts) <= self.chunk_size:
+            return embed_texts(texts, self.dim).tolist()
+
+        loop = asyncio.get_running_loop()
+        chunks = [
+            texts[start:start + self.chunk_size]
+            for start in range(0, len(texts), self.chunk_size)
+        ]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._pool, embed_texts, chunk, self.dim)
+            for chunk in chunks
+        ))
+        return np.vstack(results).tolist()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# 进程内共享的本地 Embedding，进程池随应用关闭
+_local_embedder: Optional[LocalEmbedder] = None
+
+
+def get_local_embedder(dim: int, processes: int = 0) -> LocalEmbedder:
+    global _local_embedder
+    if _local_embedder is None:
+        _local_embedder = LocalEmbedder(dim, processes=processes)
+    return _local_embedder
+
+
+def close_local_embedder():
+    """关闭时回收进程池中的子进程"""
+    global _local_embedder
+    if _local_embedder is not None:
+        _local_embedder.shutdown()
+        _local_embedder = None
@@ -1,8 +1,11 @@
-from typing import List
+from typing import List, Tuple, Optional, Dict, Any
 from abc import ABC, abstractmethod
 from app.repositories.interfaces import IEmbeddingService
 from openai import AsyncOpenAI
 from app.config import settings
+from app.core.provider_pool import provider_executor
+from app.core.local_embedding import get_local_embedder
+import asyncio
 import dashscope
 from dashscope import TextEmbedding
 
@@ -10,28 +13,134 @@ client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
 
 class EmbeddingService(IEmbeddingService):
-    """向量嵌入服务：支持 OpenAI 和 DashScope"""
+    """向量嵌入服务：支持 OpenAI、DashScope 和本地离线计算"""
 
     async def generate(self, text: str) -> List[float]:
+        embeddings = await self.generate_many([text])
+        return embeddings[0]
+
+    async def generate_many(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        if settings.EMBEDDING_PROVIDER == "local":
+            return await self._generate_local(texts)
+
         if settings.EMBEDDING_PROVIDER == "dashscope":
-            return await self._generate_dashscope(text)
+            batch_size = settings.DASHSCOPE_EMBEDDING_BATCH_SIZE
+            generate_batch = self._generate_dashscope
         else:
-            return await self._generate_openai(text)
+            batch_size = settings.OPENAI_EMBEDDING_BATCH_SIZE
+            generate_batch = self._generate_openai
 
-    async def _generate_dashscope(self, text: str) -> List[float]:
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            embeddings.extend(await generate_batch(texts[start:start + batch_size]))
+        return embeddings
+
+    async def _generate_dashscope(self, texts: List[str]) -> List[List[float]]:
         dashscope.api_key = settings.DASHSCOPE_API_KEY
-        response = TextEmbedding.call(
+        response = await provider_executor.run(
+            "dashscope_embedding",
+            TextEmbedding.call,
             model=settings.DASHSCOPE_EMBEDDING_MODEL,
-            input=text
+            input=texts
         )
         if response.status_code == 200:
-            return response.output['embeddings'][0]['embedding']
+            items = sorted(response.output['embeddings'], key=lambda e: e['text_index'])
+            return [item['embedding'] for item in items]
         else:
             raise Exception(f"DashScope API error: {response.message}")
 
-    async def _generate_openai(self, text: str) -> List[float]:
+    async def _generate_openai(self, texts: List[str]) -> List[List[float]]:
         response = await client.embeddings.create(
             model=settings.OPENAI_EMBEDDING_MODEL,
-            input=text
+            input=texts
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    async def _generate_local(self, texts: List[str]) -> List[List[float]]:
+        embedder = get_local_embedder(
+            settings.LOCAL_EMBEDDING_DIM,
+            processes=settings.LOCAL_EMBEDDING_PROCESSES
         )
-        return response.data[0].embedding
+        return await embedder.embed(texts)
+
+
+class BatchingEmbeddingService(IEmbeddingService):
+    """Embedding 微批合并：把窗口期内的并发单条请求合并为一次批量调用"""
+
+    def __init__(
+        self,
+        inner: IEmbeddingService,
+        window_ms: Optional[float] = None,
+        max_batch_size: Optional[int] = None
+    ):
+        self.inner = inner
+        self.window = (
+            window_ms if window_ms is not None else settings.EMBEDDING_BATCH_WINDOW_MS
+        ) / 1000
+        self.max_batch_size = max_batch_size or settings.EMBEDDING_BATCH_MAX_SIZE
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.request_count = 0
+        self.batch_count = 0
+
+    async def generate(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.request_count += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    async def generate_many(self, texts: List[str]) -> List[List[float]]:
+        """调用方已自行批量，直接下发"""
+        self.request_count += len(texts)
+        self.batch_count += 1
+        return await self.inner.generate_many(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        """合并统计：请求数、实际批次数"""
+        return {
+            "batching": {
+                "requests": self.request_count,
+                "batches": self.batch_count,
+                "pending": len(self._pending)
+            }
+        }
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.ensure_future(self._run_batch(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, pending: List[Tuple[str, asyncio.Future]]):
+        # 同一批次内相同文本只请求一次
+        texts = list(dict.fromkeys(text for text, _ in pending))
+        self.batch_count += 1
+
+        try:
+            embeddings = await self.inner.generate_many(texts)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, embeddings))
+        for text, future in pending:
+            if not future.done():
+                future.set_result(by_text[text])
@@ -0,0 +1,94 @@
+from typing import Dict, Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+from app.config import settings
+import asyncio
+import threading
+
+
+class ProviderExecutor:
+    """
+    同步 SDK 调用的专用线程池
+
+    DashScope SDK 只提供同步接口，直接在 async 函数里调用会阻塞事件循环。
+    每个提供商通道使用独立的有界线程池，LLM 抽取占满时不影响查询路径的 Embedding。
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = limits
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        # 排队与执行计数在工作线程中变更，用锁保护
+        self._lock = threading.Lock()
+        self.queued: Dict[str, int] = {name: 0 for name in limits}
+        self.running: Dict[str, int] = {name: 0 for name in limits}
+        self.completed: Dict[str, int] = {name: 0 for name in limits}
+        self.failed: Dict[str, int] = {name: 0 for name in limits}
+
+    async def run(self, provider: str, func: Callable, *args, **kwargs) -> Any:
+        """在提供商专用线程池中执行同步调用"""
+        loop = asyncio.get_running_loop()
+        started = abandoned = False
+
+        def call():
+            nonlocal started
+            with self._lock:
+                started = True
+                if not abandoned:
+                    self.queued[provider] -= 1
+                self.running[provider] += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running[provider] -= 1
+
+        with self._lock:
+            self.queued[provider] += 1
+        try:
+            result = await loop.run_in_executor(self._get_executor(provider), call)
+        except Exception:
+            self.failed[provider] += 1
+            raise
+        else:
+            self.completed[provider] += 1
+            return result
+        finally:
+            with self._lock:
+                # 排队期间被取消（线程池关闭或调用方取消）时在这里出队，之后即使开始执行也不再重复扣减
+                if not started:
+                    abandoned = True
+                    self.queued[provider] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """各提供商通道的排队数、执行中请求数与累计成功、失败数"""
+        with self._lock:
+            return {
+                name: {
+                    "queued": self.queued[name],
+                    "running": self.running[name],
+                    "max_concurrency": limit,
+                    "completed": self.completed[name],
+                    "failed": self.failed[name]
+                }
+                for name, limit in self.limits.items()
+            }
+
+    def shutdown(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors.clear()
+
+    def _get_executor(self, provider: str) -> ThreadPoolExecutor:
+        executor = self._executors.get(provider)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=self.limits[provider],
+                thread_name_prefix=f"provider-{provider}"
+            )
+            self._executors[provider] = executor
+        return executor
+
+
+provider_executor = ProviderExecutor({
+    "dashscope_embedding": settings.DASHSCOPE_EMBEDDING_MAX_CONCURRENCY,
+    "dashscope_llm": settings.DASHSCOPE_LLM_MAX_CONCURRENCY,
+})
@@ -0,0 +1,322 @@
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from app.domain.dto import MemoryFilterDTO
+from app.config import settings
+import numpy as np
+import hashlib
+import math
+import time
+
+EntityKey = Tuple[str, str]  # (memory_type, entity_id)
+_TRACKED_ENTITIES_MAX = 100000
+
+
+class MemoryVersions:
+    """
+    实体记忆版本号
+
+    每个实体一个单调递增的版本号，记忆写入提交后递增；查询缓存的条目记录检索开始时的版本，
+    版本不一致即失效，无需 TTL。版本号取自进程内的全局序号，只保留最近写入过的实体；
+    被淘汰实体的版本并入下限 floor，未记录的实体一律按 floor 计，
+    淘汰只会多产生缓存未命中，不会返回过期结果。
+    """
+
+    def __init__(self):
+        self._versions: "OrderedDict[EntityKey, int]" = OrderedDict()
+        self._sequence = 0
+        self._floor = 0
+
+    def version(self, memory_type: str, entity_id: str) -> int:
+        return self._versions.get((memory_type, entity_id), self._floor)
+
+    def bump(self, memory_type: str, entity_id: str):
+        """实体的记忆发生变化，此前缓存的查询结果全部失效"""
+        self._sequence += 1
+        key = (memory_type, entity_id)
+        self._versions[key] = self._sequence
+        self._versions.move_to_end(key)
+        while len(self._versions) > _TRACKED_ENTITIES_MAX:
+            _, version = self._versions.popitem(last=False)
+            self._floor = max(self._floor, version)
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+
+class QueryResultCache:
+    """
+    查询结果缓存
+
+    缓存键为 (实体, 过滤条件, 归一化查询文本的哈希, top_k)，条目记录写入时的实体记忆版本，
+    查找时版本不一致或结果中最早的过期时间已到即失效。条目数超过上限时按 LRU 淘汰。
+    版本号在进程内维护，其他实例的写入不会使本进程的缓存失效，多实例部署时不要开启。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or settings.QUERY_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[tuple, Tuple[int, float, List[Dict[str, Any]]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(
+        self,
+        memory_type: str,
+        entity_id: str,
+        query_text: str,
+        top_k: int,
+        filters: Optional[MemoryFilterDTO],
+        version: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """返回缓存的检索结果（调用方不得修改）；未命中或已失效时返回 None"""
+        key = self._cache_key(memory_type, entity_id, query_text, top_k, filters)
+        cached = self._entries.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+
+        cached_version, expires, results = cached
+        if cached_version != version or time.time() >= expires:
+            del self._entries[key]
+            self.invalidations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return results
+
+    def put(
+        self,
+        memory_type: str,
+        entity_id: str,
+        query_text: str,
+        top_k: int,
+        filters: Optional[MemoryFilterDTO],
+        version: int,
+        results: List[Dict[str, Any]]
+    ):
+        key = self._cache_key(memory_type, entity_id, query_text, top_k, filters)
+        self._entries[key] = (version, valid_until(results, filters), results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    @staticmethod
+    def _cache_key(
+        memory_type: str,
+        entity_id: str,
+        query_text: str,
+        top_k: int,
+        filters: Optional[MemoryFilterDTO]
+    ) -> tuple:
+        # 大小写与空白差异不影响缓存命中
+        normalized = " ".join(query_text.lower().split())
+        query_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return (memory_type, entity_id, filters_key(filters), query_hash, top_k)
+
+
+class RecentQueries:
+    """
+    一个实体（及过滤条件、top_k）最近查询的环形缓冲：归一化查询向量矩阵与对应的检索结果
+
+    多数缓冲只会存一两次查询，矩阵从 1 行起按需倍增到 capacity 行，写满后覆盖最旧的槽位。
+    """
+
+    def __init__(self, capacity: int, dim: int):
+        self.capacity = capacity
+        self.embeddings = np.zeros((1, dim), dtype=np.float32)
+        self.versions = np.full(1, -1, dtype=np.int64)
+        self.valid_until = np.zeros(1, dtype=np.float64)
+        self.results: List[List[Dict[str, Any]]] = []
+        self.next = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.embeddings.nbytes + self.versions.nbytes + self.valid_until.nbytes
+
+    def best_match(self, query: np.ndarray, version: int) -> Tuple[int, float]:
+        """一次矩阵-向量乘法对所有已用槽位打分，版本不符或已过期的槽位作为掩码排除"""
+        n = len(self.results)
+        similarities = self.embeddings[:n] @ query
+        valid = (self.versions[:n] == version) & (self.valid_until[:n] > time.time())
+        similarities[~valid] = -np.inf
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def put(self, query: np.ndarray, version: int, expires: float, results: List[Dict[str, Any]]):
+        if len(self.results) < self.capacity:
+            slot = len(self.results)
+            if slot == len(self.embeddings):
+                self._grow(min(slot * 2, self.capacity))
+            self.results.append(results)
+        else:
+            slot = self.next % self.capacity
+            self.results[slot] = results
+        self.embeddings[slot] = query
+        self.versions[slot] = version
+        self.valid_until[slot] = expires
+        self.next += 1
+
+    def _grow(self, rows: int):
+        grow = rows - len(self.embeddings)
+        self.embeddings = np.concatenate([
+            self.embeddings, np.zeros((grow, self.embeddings.shape[1]), dtype=np.float32)
+        ])
+        self.versions = np.concatenate([self.versions, np.full(grow, -1, dtype=np.int64)])
+        self.valid_until = np.concatenate([self.valid_until, np.zeros(grow, dtype=np.float64)])
+
+
+class SemanticQueryCache:
+    """
+    语义查询缓存
+
+    同一实体的查询常常是彼此的改写。每个 (实体, 过滤条件, top_k) 保留最近 size 次查询的
+    归一化查询向量与检索结果；新查询与其中某个向量的余弦相似度不低于 threshold、且实体记忆版本
+    未变时直接复用其结果。查找是对小环形缓冲的一次向量化比较。缓冲数超过上限时按 LRU 淘汰。
+    命中率与被接受命中的平均相似度用于调整阈值。与结果缓存相同，多实例部署时不要开启。
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        size: Optional[int] = None,
+        max_entities: Optional[int] = None
+    ):
+        self.threshold = threshold if threshold is not None else settings.SEMANTIC_QUERY_CACHE_THRESHOLD
+        self.size = size or settings.SEMANTIC_QUERY_CACHE_SIZE
+        self.max_entities = max_entities or settings.SEMANTIC_QUERY_CACHE_MAX_ENTITIES
+        self._buffers: "OrderedDict[tuple, RecentQueries]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.similarity_sum = 0.0
+        self.evictions = 0
+
+    def get(
+        self,
+        memory_type: str,
+        entity_id: str,
+        top_k: int,
+        filters: Optional[MemoryFilterDTO],
+        version: int,
+        query_embedding: List[float]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """返回相似查询缓存的检索结果（调用方不得修改）；没有足够相似的有效查询时返回 None"""
+        query = self._normalize(query_embedding)
+        key = (memory_type, entity_id, filters_key(filters), top_k)
+        buffer = self._buffers.get(key)
+        if query is None or buffer is None or buffer.embeddings.shape[1] != query.shape[0]:
+            self.misses += 1
+            return None
+
+        slot, similarity = buffer.best_match(query, version)
+        if similarity < self.threshold:
+            self.misses += 1
+            return None
+
+        self._buffers.move_to_end(key)
+        self.hits += 1
+        self.similarity_sum += similarity
+        return buffer.results[slot]
+
+    def put(
+        self,
+        memory_type: str,
+        entity_id: str,
+        top_k: int,
+        filters: Optional[MemoryFilterDTO],
+        version: int,
+        query_embedding: List[float],
+        results: List[Dict[str, Any]]
+    ):
+        query = self._normalize(query_embedding)
+        if query is None:
+            return
+
+        key = (memory_type, entity_id, filters_key(filters), top_k)
+        buffer = self._buffers.get(key)
+        # 切换 Embedding 模型后维度变化，旧缓冲作废
+        if buffer is None or buffer.embeddings.shape[1] != query.shape[0]:
+            buffer = RecentQueries(self.size, query.shape[0])
+            self._buffers[key] = buffer
+        buffer.put(query, version, valid_until(results, filters), results)
+
+        self._buffers.move_to_end(key)
+        while len(self._buffers) > self.max_entities:
+            self._buffers.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "buffers": len(self._buffers),
+            "resident_bytes": sum(buffer.nbytes for buffer in self._buffers.values()),
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "mean_hit_similarity": self.similarity_sum / self.hits if self.hits else 0.0
+        }
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+
+def filters_key(filters: Optional[MemoryFilterDTO]) -> str:
+    return filters.model_dump_json() if filters is not None else ""
+
+
+def valid_until(results: List[Dict[str, Any]], filters: Optional[MemoryFilterDTO]) -> float:
+    """检索排除了过期记忆时，结果中最早过期的记忆到期后缓存失效"""
+    if filters is not None and filters.include_expired:
+        return math.inf
+    expiries = [
+        hit["payload"]["expiry_at"]
+        for hit in results
+        if (hit.get("payload") or {}).get("expiry_at") is not None
+    ]
+    return min(expiries, default=math.inf)
+
+
+_memory_versions = MemoryVersions()
+_query_cache: Optional[QueryResultCache] = None
+_semantic_cache: Optional[SemanticQueryCache] = None
+
+
+def get_memory_versions() -> MemoryVersions:
+    """获取进程内共享的实体记忆版本号"""
+    return _memory_versions
+
+
+def get_query_result_cache() -> Optional[QueryResultCache]:
+    """获取共享的查询结果缓存；未启用时返回 None"""
+    global _query_cache
+    if _query_cache is None and settings.QUERY_CACHE_ENABLED:
+        _query_cache = QueryResultCache()
+    return _query_cache
+
+
+def get_semantic_query_cache() -> Optional[SemanticQueryCache]:
+    """获取共享的语义查询缓存；未启用时返回 None"""
+    global _semantic_cache
+    if _semantic_cache is None and settings.SEMANTIC_QUERY_CACHE_ENABLED:
+        _semantic_cache = SemanticQueryCache()
+    return _semantic_cache
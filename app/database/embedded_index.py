@@ -0,0 +1,388 @@
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import quote
+from app.config import settings
+from app.database.vector_store import to_timestamp
+from app.domain.dto import MemoryFilterDTO
+import numpy as np
+import json
+import os
+import shutil
+import threading
+import time
+
+INITIAL_CAPACITY = 64
+# 删除的行超过该数量且多于存活行时压缩文件
+COMPACT_MIN_DEAD = 64
+LAYER_CODES = {"profile": 0, "event": 1}
+
+
+class EntityVectors:
+    """
+    单个实体的向量矩阵
+
+    向量归一化后按行存入内存映射文件（float32，或按行缩放的 int8），余弦相似度即点积；
+    payload 与行号记录在追加写的 log.jsonl 中，加载时回放。过滤用到的字段另存为
+    按行对齐的 NumPy 数组，过滤与打分都是向量化的。path 为 None 时只保存在内存中。
+    """
+
+    def __init__(self, path: Optional[Path], dim: int, dtype: str = "float32"):
+        self.path = path
+        self.dim = dim
+        self.dtype = dtype
+        self.quantized = dtype == "int8"
+        self.capacity = 0
+        self.count = 0  # 已使用的行数（含已删除的行）
+        self.vectors: Optional[np.memmap] = None
+        self.scales: Optional[np.memmap] = None
+        self.rows: Dict[str, int] = {}
+        self.ids: List[Optional[str]] = []
+        self.payloads: List[Optional[Dict[str, Any]]] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.layer = np.zeros(0, dtype=np.int8)
+        self.created_at = np.zeros(0, dtype=np.float64)
+        self.importance = np.zeros(0, dtype=np.int32)
+        self.expiry_at = np.zeros(0, dtype=np.float64)
+        self._log = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.capacity * self.dim * (1 if self.quantized else 4)
+
+    @property
+    def _vector_file(self) -> Path:
+        return self.path / ("vectors.i8" if self.quantized else "vectors.f32")
+
+    def load(self, capacity: int = INITIAL_CAPACITY):
+        if self.path is None:
+            self._open(max(capacity, 1))
+            return
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        log_path = self.path / "log.jsonl"
+        records = []
+        if log_path.exists():
+            with open(log_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # 写入中途崩溃留下的不完整末行
+                        break
+
+        if records and records[0].get("op") == "init":
+            header = records.pop(0)
+            if header["dim"] != self.dim or header["quantized"] != self.quantized:
+                raise ValueError(
+                    f"{self.path}: 向量维度或类型与当前配置不一致，切换 Embedding 后需重建向量"
+                )
+
+        self._open(INITIAL_CAPACITY)
+        for record in records:
+            if record["op"] == "put":
+                self._apply_put(record["row"], record["memory_id"], record["payload"])
+            elif record["op"] == "del":
+                self._apply_delete(record["memory_id"])
+
+        self._log = open(log_path, "a", encoding="utf-8")
+        if not records and log_path.stat().st_size == 0:
+            self._append_log({"op": "init", "dim": self.dim, "quantized": self.quantized})
+
+    def close(self):
+        if isinstance(self.vectors, np.memmap):
+            self.vectors.flush()
+        if isinstance(self.scales, np.memmap):
+            self.scales.flush()
+        self.vectors = None
+        self.scales = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def put(self, memory_id: str, embedding: Optional[List[float]], payload: Dict[str, Any]) -> bool:
+        """写入或覆盖一条向量；embedding 为空时只更新 payload"""
+        row = self.rows.get(memory_id)
+        if embedding is None and row is None:
+            return False
+
+        if row is None:
+            row = self.count
+            self._ensure_capacity(row + 1)
+        if embedding is not None:
+            self._write_vector(row, embedding)
+
+        self._append_log({"op": "put", "row": row, "memory_id": memory_id, "payload": payload})
+        self._apply_put(row, memory_id, payload)
+        return True
+
+    def delete(self, memory_id: str) -> bool:
+        if memory_id not in self.rows:
+            return False
+        self._append_log({"op": "del", "memory_id": memory_id})
+        self._apply_delete(memory_id)
+
+        dead = self.count - len(self.rows)
+        if dead >= COMPACT_MIN_DEAD and dead > len(self.rows):
+            self.compact()
+        return True
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[MemoryFilterDTO] = None
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """精确余弦检索：一次矩阵-向量乘法打分，过滤条件作为掩码"""
+        n = self.count
+        if n == 0 or top_k <= 0:
+            return []
+
+        mask = self._filter_mask(n, filters or MemoryFilterDTO())
+        candidates = int(mask.sum())
+        if candidates == 0:
+            return []
+
+        query = self._normalize(query_embedding)
+        scores = self.vectors[:n] @ query
+        if self.quantized:
+            scores = scores * self.scales[:n]
+        scores = np.where(mask, scores, -np.inf)
+
+        k = min(top_k, candidates)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[row], float(scores[row]), self.payloads[row]) for row in top]
+
+    def compact(self):
+        """去掉已删除的行：在临时目录重建后替换原目录"""
+        live = [
+            (memory_id, self._read_vector(row), self.payloads[row])
+            for memory_id, row in sorted(self.rows.items(), key=lambda item: item[1])
+        ]
+        if self.path is None:
+            self.__init__(None, self.dim, self.dtype)
+            self.load()
+            for memory_id, vector, payload in live:
+                self.put(memory_id, vector, payload)
+            return
+
+        tmp_path = self.path.with_name(self.path.name + ".compact")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        compacted = EntityVectors(tmp_path, self.dim, self.dtype)
+        compacted.load()
+        for memory_id, vector, payload in live:
+            compacted.put(memory_id, vector, payload)
+        compacted.close()
+        self.close()
+
+        old_path = self.path.with_name(self.path.name + ".old")
+        os.replace(self.path, old_path)
+        os.replace(tmp_path, self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+        self.__init__(self.path, self.dim, self.dtype)
+        self.load()
+
+    def _filter_mask(self, n: int, filters: MemoryFilterDTO) -> np.ndarray:
+        mask = self.alive[:n].copy()
+        if filters.memory_layer:
+            mask &= self.layer[:n] == LAYER_CODES.get(filters.memory_layer.value, -1)
+        if filters.created_after:
+            mask &= self.created_at[:n] >= to_timestamp(filters.created_after)
+        if filters.created_before:
+            mask &= self.created_at[:n] < to_timestamp(filters.created_before)
+        if filters.min_importance is not None:
+            mask &= self.importance[:n] >= filters.min_importance
+        if not filters.include_expired:
+            expiry = self.expiry_at[:n]
+            mask &= np.isnan(expiry) | (expiry > time.time())
+        return mask
+
+    def _normalize(self, embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _read_vector(self, row: int) -> np.ndarray:
+        vector = np.asarray(self.vectors[row], dtype=np.float32)
+        return vector * self.scales[row] if self.quantized else vector
+
+    def _write_vector(self, row: int, embedding):
+        vector = self._normalize(embedding)
+        if self.quantized:
+            scale = float(np.abs(vector).max()) / 127 or 1.0
+            self.vectors[row] = np.round(vector / scale).astype(np.int8)
+            self.scales[row] = scale
+        else:
+            self.vectors[row] = vector
+
+    def _apply_put(self, row: int, memory_id: str, payload: Dict[str, Any]):
+        self._ensure_capacity(row + 1)
+        previous = self.rows.get(memory_id)
+        if previous is not None and previous != row:
+            self.alive[previous] = False
+        self.rows[memory_id] = row
+        self.ids[row] = memory_id
+        self.payloads[row] = payload
+        self.alive[row] = True
+        self.layer[row] = LAYER_CODES.get(payload.get("memory_layer"), -1)
+        self.created_at[row] = payload.get("created_at", 0.0)
+        self.importance[row] = payload.get("importance", 3)
+        self.expiry_at[row] = payload.get("expiry_at", np.nan)
+        self.count = max(self.count, row + 1)
+
+    def _apply_delete(self, memory_id: str):
+        row = self.rows.pop(memory_id, None)
+        if row is not None:
+            self.alive[row] = False
+            self.payloads[row] = None
+
+    def _append_log(self, record: Dict[str, Any]):
+        if self._log is None:
+            return
+        self._log.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._log.flush()
+
+    def _ensure_capacity(self, rows: int):
+        if rows > self.capacity:
+            self._open(max(rows, self.capacity * 2))
+
+    def _open(self, capacity: int):
+        """打开（或扩容）向量文件；行优先存储，扩容只需在文件末尾追加"""
+        if self.path is None:
+            vectors = np.zeros((capacity, self.dim), dtype=np.int8 if self.quantized else np.float32)
+            if self.vectors is not None:
+                vectors[:self.capacity] = self.vectors
+            self.vectors = vectors
+            if self.quantized:
+                scales = np.zeros(capacity, dtype=np.float32)
+                if self.scales is not None:
+                    scales[:self.capacity] = self.scales
+                self.scales = scales
+            self._grow_columns(capacity)
+            return
+
+        vector_file = self._vector_file
+        itemsize = 1 if self.quantized else 4
+        existing = vector_file.stat().st_size // (self.dim * itemsize) if vector_file.exists() else 0
+        capacity = max(capacity, existing)
+
+        if self.vectors is not None:
+            self.vectors.flush()
+        with open(vector_file, "ab") as f:
+            f.truncate(capacity * self.dim * itemsize)
+        self.vectors = np.memmap(
+            vector_file, dtype=np.int8 if self.quantized else np.float32,
+            mode="r+", shape=(capacity, self.dim)
+        )
+        if self.quantized:
+            scale_file = self.path / "scales.f32"
+            if self.scales is not None:
+                self.scales.flush()
+            with open(scale_file, "ab") as f:
+                f.truncate(capacity * 4)
+            self.scales = np.memmap(scale_file, dtype=np.float32, mode="r+", shape=(capacity,))
+
+        self._grow_columns(capacity)
+
+    def _grow_columns(self, capacity: int):
+        grow = capacity - self.capacity
+        self.ids.extend([None] * grow)
+        self.payloads.extend([None] * grow)
+        self.alive = np.concatenate([self.alive, np.zeros(grow, dtype=bool)])
+        self.layer = np.concatenate([self.layer, np.full(grow, -1, dtype=np.int8)])
+        self.created_at = np.concatenate([self.created_at, np.zeros(grow, dtype=np.float64)])
+        self.importance = np.concatenate([self.importance, np.zeros(grow, dtype=np.int32)])
+        self.expiry_at = np.concatenate([self.expiry_at, np.full(grow, np.nan)])
+        self.capacity = capacity
+
+
+class EmbeddedVectorIndex:
+    """
+    进程内向量索引
+
+    每个 (记忆类型, 实体) 一个 EntityVectors，首次访问时从磁盘加载；
+    已加载矩阵的总字节数超过 EMBEDDED_VECTOR_CACHE_MB 时按 LRU 卸载。
+    本身不是线程安全的，在线程池中访问时需持有 lock。
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        dim: Optional[int] = None,
+        dtype: Optional[str] = None,
+        max_bytes: Optional[int] = None
+    ):
+        self.root = Path(root or settings.EMBEDDED_VECTOR_DIR)
+        self.dim = dim or settings.embedding_dim
+        self.dtype = dtype or settings.EMBEDDED_VECTOR_DTYPE
+        self.max_bytes = max_bytes or settings.EMBEDDED_VECTOR_CACHE_MB * 1024 * 1024
+        self._entities: "OrderedDict[str, EntityVectors]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def entity(self, memory_type: str, entity_id: str, create: bool = True) -> Optional[EntityVectors]:
+        """获取实体的向量矩阵；create 为 False 且磁盘上没有时返回 None"""
+        key = f"{memory_type}/{entity_id}"
+        entity = self._entities.get(key)
+        if entity is not None:
+            self._entities.move_to_end(key)
+            self.hits += 1
+            return entity
+
+        path = self.root / memory_type / quote(entity_id, safe="")
+        if not create and not path.exists():
+            return None
+
+        entity = EntityVectors(path, self.dim, self.dtype)
+        entity.load()
+        self.loads += 1
+        self._entities[key] = entity
+        self.evict()
+        return entity
+
+    def evict(self):
+        """超出内存预算时卸载最久未使用的实体（至少保留最近一个）"""
+        while len(self._entities) > 1 and self.resident_bytes > self.max_bytes:
+            _, entity = self._entities.popitem(last=False)
+            entity.close()
+            self.evictions += 1
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(entity.nbytes for entity in self._entities.values())
+
+    def close(self):
+        for entity in self._entities.values():
+            entity.close()
+        self._entities.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entities": len(self._entities),
+            "resident_bytes": self.resident_bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
+
+
+_embedded_index: Optional[EmbeddedVectorIndex] = None
+
+
+def get_embedded_vector_index() -> EmbeddedVectorIndex:
+    global _embedded_index
+    if _embedded_index is None:
+        _embedded_index = EmbeddedVectorIndex()
+    return _embedded_index
+
+
+def close_embedded_vector_index():
+    """关闭时把内存映射写回磁盘"""
+    global _embedded_index
+    if _embedded_index is not None:
+        _embedded_index.close()
+        _embedded_index = None
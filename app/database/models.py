@@ -1,4 +1,6 @@
-from sqlalchemy import Column, String, DateTime, JSON, Text, Index, Boolean, ForeignKey, Float
+from sqlalchemy import (
+    Column, String, DateTime, JSON, Text, Index, Boolean, ForeignKey, Float, Integer, BigInteger, Identity
+)
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -6,7 +8,14 @@ from app.config import settings
 
 Base = declarative_base()
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+_connect_args = {}
+if settings.VECTOR_BACKEND == "pgvector":
+    # pgvector 检索参数在建连时设置，检索时不需要额外的 SET 往返
+    _connect_args["server_settings"] = {"hnsw.ef_search": str(settings.PGVECTOR_EF_SEARCH)}
+    if settings.PGVECTOR_ITERATIVE_SCAN:
+        _connect_args["server_settings"]["hnsw.iterative_scan"] = settings.PGVECTOR_ITERATIVE_SCAN
+
+engine = create_async_engine(settings.DATABASE_URL, echo=True, connect_args=_connect_args)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 class ProfileMemory(Base):
@@ -48,6 +57,47 @@ class EventMemory(Base):
         Index('idx_event_expiry', 'expiry_date'),
     )
 
+class EmbeddingCache(Base):
+    """Embedding 缓存表：按 (提供商, 模型, 维度, 内容哈希) 缓存向量"""
+    __tablename__ = "embedding_cache"
+
+    cache_key = Column(String, primary_key=True)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    dimension = Column(Integer, nullable=False)
+    content_hash = Column(String, nullable=False)
+    embedding = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_embedding_cache_model', 'provider', 'model', 'dimension'),
+    )
+
+class VectorOutbox(Base):
+    """向量索引发件箱：与记忆行同事务提交，由后台任务批量写入 Qdrant"""
+    __tablename__ = "vector_outbox"
+
+    id = Column(String, primary_key=True)
+    operation = Column(String, nullable=False)  # 'upsert'、'set_payload' 或 'delete'
+    memory_id = Column(String, nullable=False)
+    memory_type = Column(String, nullable=False)
+    entity_id = Column(String, nullable=False)
+    point_id = Column(String, nullable=False)
+    embedding = Column(JSON, nullable=True)
+    payload = Column(JSON, default={})
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # 插入时由数据库分配的单调序号；同一事务写入的记录 created_at 可能相同，处理顺序以它为准
+    seq = Column(BigInteger, Identity(), nullable=False)
+
+    __table_args__ = (
+        Index('idx_outbox_next_attempt', 'next_attempt_at'),
+        Index('idx_outbox_created_at', 'created_at'),
+        Index('idx_outbox_entity', 'memory_type', 'entity_id', 'seq'),
+    )
+
 class MemoryLog(Base):
     """记忆操作日志表：记录所有记忆操作的原因"""
     __tablename__ = "memory_logs"
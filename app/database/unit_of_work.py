@@ -0,0 +1,56 @@
+from typing import AsyncIterator, Optional
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.models import async_session
+
+_current_session: ContextVar[Optional[AsyncSession]] = ContextVar("unit_of_work_session", default=None)
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[AsyncSession]:
+    """
+    工作单元：块内所有仓储读写共用一个会话（一个连接），结束时一次提交，异常时整体回滚
+
+    会话通过 ContextVar 传递给仓储，仓储接口不变；嵌套调用加入外层工作单元。
+    同一会话不能并发使用，工作单元内不要用 gather 并发调用仓储。
+    sync 模式下的 Qdrant 写入不在事务内，回滚后残留的点由 scripts/reconcile_vectors.py 清理；
+    outbox 模式下发件箱记录随工作单元一起提交或回滚。
+    """
+    session = _current_session.get()
+    if session is not None:
+        yield session
+        return
+
+    async with async_session() as session:
+        token = _current_session.set(session)
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            _current_session.reset(token)
+
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncSession]:
+    """
+    仓储获取会话的入口
+
+    处于工作单元内时复用其会话，不提交：新增的行在工作单元提交时一次 flush，
+    同表的 INSERT 合并为多行语句；否则开启独立会话，结束时提交。
+    """
+    session = _current_session.get()
+    if session is not None:
+        yield session
+        return
+
+    async with async_session() as session:
+        yield session
+        await session.commit()
+
+
+def in_unit_of_work() -> bool:
+    return _current_session.get() is not None
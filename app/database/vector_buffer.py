@@ -0,0 +1,91 @@
+from typing import Dict, List, Tuple, Any
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import PointStruct
+import asyncio
+
+
+class VectorWriteBuffer:
+    """
+    向量写入缓冲
+
+    按集合收集待写入的点，数量达到 max_batch_size 或等待超过 flush_interval_ms 时
+    合并为一次批量 upsert。每个点返回一个完成 future，批量写入成功后才会完成。
+    """
+
+    def __init__(
+        self,
+        client: AsyncQdrantClient,
+        max_batch_size: int,
+        flush_interval_ms: float
+    ):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._pending: Dict[str, List[Tuple[PointStruct, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks = set()
+        self.point_count = 0
+        self.batch_count = 0
+
+    def add(self, collection_name: str, point: PointStruct) -> asyncio.Future:
+        """加入缓冲区，返回该点的完成 future"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(collection_name, [])
+        pending.append((point, future))
+        self.point_count += 1
+
+        if len(pending) >= self.max_batch_size:
+            self._flush(collection_name)
+        elif collection_name not in self._timers:
+            self._timers[collection_name] = loop.call_later(
+                self.flush_interval, self._flush, collection_name
+            )
+
+        return future
+
+    async def flush(self):
+        """立即写出所有集合的缓冲并等待完成"""
+        for collection_name in list(self._pending):
+            self._flush(collection_name)
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "points": self.point_count,
+            "batches": self.batch_count,
+            "pending": sum(len(p) for p in self._pending.values())
+        }
+
+    def _flush(self, collection_name: str):
+        timer = self._timers.pop(collection_name, None)
+        if timer is not None:
+            timer.cancel()
+
+        pending = self._pending.pop(collection_name, [])
+        if pending:
+            task = asyncio.ensure_future(self._write_batch(collection_name, pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write_batch(
+        self,
+        collection_name: str,
+        pending: List[Tuple[PointStruct, asyncio.Future]]
+    ):
+        self.batch_count += 1
+        try:
+            await self.client.upsert(
+                collection_name=collection_name,
+                points=[point for point, _ in pending]
+            )
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for _, future in pending:
+            if not future.done():
+                future.set_result(None)
@@ -0,0 +1,158 @@
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable, List
+from collections import OrderedDict
+from app.config import settings
+from app.database.embedded_index import EntityVectors
+import asyncio
+import time
+
+EntityKey = Tuple[str, str]  # (memory_type, entity_id)
+_LARGE_ENTITIES_MAX = 100000
+
+
+class HotVectorCache:
+    """
+    小实体向量的进程内读穿缓存
+
+    实体首次检索后在后台把它的全部向量载入一个连续的 NumPy 矩阵，之后的检索在进程内
+    精确计算，不再访问 Qdrant。向量数超过 max_entity_size 的实体不缓存，继续走 Qdrant。
+    经由本进程仓储的写入会同步更新缓存；其他实例的写入要等 ttl 秒过期后才可见，
+    因此只适用于单实例部署，默认关闭。
+    已缓存矩阵的总字节数超过预算时按 LRU 淘汰。
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        max_entity_size: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        self.max_bytes = max_bytes or settings.VECTOR_HOT_CACHE_MB * 1024 * 1024
+        self.max_entity_size = max_entity_size or settings.VECTOR_HOT_CACHE_MAX_ENTITY_SIZE
+        self.ttl = ttl if ttl is not None else settings.VECTOR_HOT_CACHE_TTL
+        self._entities: "OrderedDict[EntityKey, Tuple[EntityVectors, float]]" = OrderedDict()
+        self._large: "OrderedDict[EntityKey, float]" = OrderedDict()
+        self._loading: Dict[EntityKey, asyncio.Task] = {}
+        # 加载期间发生过写入的实体，加载结果作废
+        self._stale_loads = set()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, key: EntityKey) -> Optional[EntityVectors]:
+        cached = self._entities.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+
+        entity, loaded_at = cached
+        if time.monotonic() - loaded_at > self.ttl:
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entities.move_to_end(key)
+        self.hits += 1
+        return entity
+
+    def schedule_load(self, key: EntityKey, loader: Callable[[], Awaitable[Optional[EntityVectors]]]):
+        """后台加载实体；loader 返回 None 表示实体过大，不缓存"""
+        if key in self._loading or key in self._entities:
+            return
+        checked_at = self._large.get(key)
+        if checked_at is not None and time.monotonic() - checked_at < self.ttl:
+            return
+
+        task = asyncio.ensure_future(self._load(key, loader))
+        self._loading[key] = task
+
+    async def _load(self, key: EntityKey, loader):
+        try:
+            entity = await loader()
+        except Exception as e:
+            print(f"Hot vector cache load error: {e}")
+            return
+        finally:
+            self._loading.pop(key, None)
+            stale = key in self._stale_loads
+            self._stale_loads.discard(key)
+
+        if stale:
+            return
+        if entity is None:
+            self._large[key] = time.monotonic()
+            self._large.move_to_end(key)
+            while len(self._large) > _LARGE_ENTITIES_MAX:
+                self._large.popitem(last=False)
+            return
+
+        self._entities[key] = (entity, time.monotonic())
+        self.resident_bytes += entity.nbytes
+        self.loads += 1
+        self._evict()
+
+    def apply_put(self, key: EntityKey, memory_id: str, embedding: Optional[List[float]], payload: Dict[str, Any]):
+        """同步写入；实体超过大小上限后移出缓存"""
+        self._mark_stale(key)
+        cached = self._entities.get(key)
+        if cached is None:
+            return
+        entity = cached[0]
+        before = entity.nbytes
+        entity.put(memory_id, embedding, payload)
+        self.resident_bytes += entity.nbytes - before
+        if len(entity.rows) > self.max_entity_size:
+            self._remove(key)
+        else:
+            self._evict()
+
+    def apply_delete(self, key: EntityKey, memory_id: str):
+        self._mark_stale(key)
+        cached = self._entities.get(key)
+        if cached is not None:
+            entity = cached[0]
+            before = entity.nbytes
+            entity.delete(memory_id)
+            self.resident_bytes += entity.nbytes - before
+
+    def invalidate(self, key: EntityKey):
+        """写入未经过缓存（如发件箱后台写入）时整体失效"""
+        self._mark_stale(key)
+        self._remove(key)
+
+    def _mark_stale(self, key: EntityKey):
+        if key in self._loading:
+            self._stale_loads.add(key)
+
+    def _remove(self, key: EntityKey):
+        cached = self._entities.pop(key, None)
+        if cached is not None:
+            self.resident_bytes -= cached[0].nbytes
+
+    def _evict(self):
+        while self._entities and self.resident_bytes > self.max_bytes:
+            self._remove(next(iter(self._entities)))
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entities": len(self._entities),
+            "resident_bytes": self.resident_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "large_entities": len(self._large)
+        }
+
+
+_hot_cache: Optional[HotVectorCache] = None
+
+
+def get_hot_vector_cache() -> Optional[HotVectorCache]:
+    """获取共享的热向量缓存；未启用时返回 None"""
+    global _hot_cache
+    if _hot_cache is None and settings.VECTOR_HOT_CACHE_ENABLED:
+        _hot_cache = HotVectorCache()
+    return _hot_cache
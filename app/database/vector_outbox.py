@@ -0,0 +1,299 @@
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, update, delete, exists, text
+from sqlalchemy.orm import aliased
+from qdrant_client.models import PointStruct
+from app.database.models import VectorOutbox, async_session
+from app.database.vector_store import QdrantStore
+from app.database.vector_cache import get_hot_vector_cache
+from app.core.query_cache import get_memory_versions
+from app.config import settings
+import asyncio
+import uuid
+
+
+def outbox_entry(
+    operation: str,
+    memory_id: str,
+    memory_type: str,
+    entity_id: str,
+    point_id: str,
+    embedding: Optional[List[float]] = None,
+    payload: Optional[Dict[str, Any]] = None
+) -> VectorOutbox:
+    """构造发件箱记录，调用方将其与记忆行加入同一个会话后一起提交"""
+    return VectorOutbox(
+        id=str(uuid.uuid4()),
+        operation=operation,
+        memory_id=memory_id,
+        memory_type=memory_type,
+        entity_id=entity_id,
+        point_id=str(point_id),
+        embedding=embedding,
+        payload=payload or {},
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+
+
+class VectorOutboxDrainer:
+    """
+    发件箱后台处理
+
+    分三步处理一批到期记录：
+    1. 短事务认领：先对候选实体逐个尝试事务级 advisory lock，同一实体同一时间只有一个实例在认领；
+       拿到锁后再读取这些实体的到期记录，此时其他实例已提交的租约都可见。
+       实体存在更早的未到期记录（退避中或被其他实例认领）时，其后的记录不认领，保证同一实体按序写入。
+       认领的记录把 next_attempt_at 推后一个租约时长后立即提交，不在 Qdrant 调用期间持有锁和事务。
+    2. 按 seq 顺序写入 Qdrant：同一点被后续 upsert/delete 覆盖的记录直接丢弃，
+       相邻的同类操作合并为一次批量调用；某实体一次写入失败后，该实体的后续记录本批不再处理。
+    3. 第二个事务删除已完成的记录，失败的记录指数退避后重试。
+    进程在第 2 步崩溃时记录在租约到期后重新处理，Qdrant 写入是幂等的。
+    lag 指标为待处理数量和最老记录的等待时间。
+    """
+
+    def __init__(self, vector_store: Optional[QdrantStore] = None):
+        self.vector_store = vector_store or QdrantStore()
+        self.batch_size = settings.OUTBOX_BATCH_SIZE
+        self.poll_interval = settings.OUTBOX_POLL_INTERVAL
+        self.lease = settings.OUTBOX_LEASE_SECONDS
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.processed = 0
+        self.failed = 0
+        self.pending = 0
+        self.lag_seconds = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务，并尽量处理完剩余记录"""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+        while await self.drain_once():
+            pass
+
+    async def drain_once(self) -> int:
+        """处理一批到期记录，返回成功写入的数量"""
+        entries = await self._claim()
+        if not entries:
+            return 0
+
+        done, retries = await self.apply(entries)
+        await self._finish(done, retries)
+        return len(done)
+
+    async def apply(self, entries: List[VectorOutbox]) -> Tuple[List[str], List[VectorOutbox]]:
+        """
+        按 seq 顺序把一批记录写入 Qdrant，返回 (可删除的记录 ID, 需要重试的记录)
+
+        需要重试的记录已更新 attempts、last_error 与 next_attempt_at。
+        """
+        now = datetime.utcnow()
+        entries = sorted(entries, key=lambda e: e.seq)
+        live, done = self._supersede(entries)
+
+        failed_entities: Dict[Tuple[str, str], datetime] = {}
+        retries: List[VectorOutbox] = []
+        for group in self._runs(live):
+            operation, memory_type, entity_id = group[0].operation, group[0].memory_type, group[0].entity_id
+            entity = (memory_type, entity_id)
+            if entity in failed_entities:
+                # 同一实体更早的写入失败，本批不再处理，与失败记录同时重试以保持顺序
+                for entry in group:
+                    entry.next_attempt_at = failed_entities[entity]
+                retries.extend(group)
+                continue
+
+            try:
+                await self._write(operation, memory_type, entity_id, group)
+            except Exception as e:
+                self.failed += len(group)
+                retry_at = now
+                for entry in group:
+                    entry.attempts = (entry.attempts or 0) + 1
+                    entry.last_error = str(e)[:1000]
+                    backoff = min(2 ** entry.attempts, settings.OUTBOX_MAX_BACKOFF)
+                    entry.next_attempt_at = now + timedelta(seconds=backoff)
+                    retry_at = max(retry_at, entry.next_attempt_at)
+                failed_entities[entity] = retry_at
+                retries.extend(group)
+                continue
+
+            done.extend(entry.id for entry in group)
+            hot_cache = get_hot_vector_cache()
+            if hot_cache is not None:
+                hot_cache.invalidate(entity)
+            # 提交后到写入 Qdrant 前的查询可能缓存了旧结果，写入后再使其失效
+            get_memory_versions().bump(memory_type, entity_id)
+
+        self.processed += len(done)
+        return done, retries
+
+    @staticmethod
+    def _supersede(entries: List[VectorOutbox]) -> Tuple[List[VectorOutbox], List[str]]:
+        """同一点在最后一次 upsert/delete 之前的记录已被覆盖，直接丢弃；其后的 set_payload 保留"""
+        last_write = {}
+        for index, entry in enumerate(entries):
+            if entry.operation != "set_payload":
+                last_write[entry.point_id] = index
+
+        live, superseded = [], []
+        for index, entry in enumerate(entries):
+            if index < last_write.get(entry.point_id, -1):
+                superseded.append(entry.id)
+            else:
+                live.append(entry)
+        return live, superseded
+
+    @staticmethod
+    def _runs(entries: List[VectorOutbox]) -> List[List[VectorOutbox]]:
+        """把相邻的同一 (操作, 记忆类型, 实体) 记录合并为一组，组间保持创建顺序"""
+        runs: List[List[VectorOutbox]] = []
+        for entry in entries:
+            key = (entry.operation, entry.memory_type, entry.entity_id)
+            if runs and (runs[-1][0].operation, runs[-1][0].memory_type, runs[-1][0].entity_id) == key:
+                runs[-1].append(entry)
+            else:
+                runs.append([entry])
+        return runs
+
+    async def _write(self, operation: str, memory_type: str, entity_id: str, group: List[VectorOutbox]):
+        if operation == "delete":
+            await self.vector_store.delete_points(
+                memory_type, entity_id, [e.point_id for e in group]
+            )
+        elif operation == "set_payload":
+            await self.vector_store.set_payloads(
+                memory_type, entity_id, [(e.point_id, e.payload) for e in group]
+            )
+        else:
+            await self.vector_store.upsert_points(
+                memory_type, entity_id,
+                [
+                    PointStruct(id=e.point_id, vector=e.embedding, payload=e.payload)
+                    for e in group
+                ]
+            )
+
+    async def _claim(self) -> List[VectorOutbox]:
+        """
+        短事务认领一批到期记录：推后 next_attempt_at 作为租约后提交
+
+        只用 FOR UPDATE SKIP LOCKED 不足以保证实体内的顺序：另一实例锁住了实体较早的记录但尚未
+        提交租约时，本实例跳过这些行，看到的仍是旧的 next_attempt_at，会认领同一实体较晚的记录。
+        因此先按实体取得 advisory lock，再在新的语句中读取记录。
+        """
+        now = datetime.utcnow()
+        entity_key = VectorOutbox.memory_type + "/" + VectorOutbox.entity_id
+        earlier = aliased(VectorOutbox)
+        due = [
+            VectorOutbox.next_attempt_at <= now,
+            ~exists().where(
+                earlier.memory_type == VectorOutbox.memory_type,
+                earlier.entity_id == VectorOutbox.entity_id,
+                earlier.seq < VectorOutbox.seq,
+                earlier.next_attempt_at > now
+            )
+        ]
+        async with async_session() as session:
+            result = await session.execute(
+                select(entity_key)
+                .where(*due)
+                .group_by(entity_key)
+                .order_by(func.min(VectorOutbox.seq))
+                .limit(self.batch_size)
+            )
+            candidates = result.scalars().all()
+            if not candidates:
+                return []
+
+            # 锁随认领事务提交释放；拿不到锁的实体正被其他实例认领，本轮跳过
+            result = await session.execute(
+                text(
+                    "SELECT key FROM unnest(CAST(:keys AS text[])) AS key "
+                    "WHERE pg_try_advisory_xact_lock(hashtext('vector_outbox/' || key))"
+                ),
+                {"keys": list(candidates)}
+            )
+            locked = result.scalars().all()
+            if not locked:
+                await session.rollback()
+                return []
+
+            result = await session.execute(
+                select(VectorOutbox)
+                .where(entity_key.in_(locked), *due)
+                .order_by(VectorOutbox.seq)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            entries = result.scalars().all()
+            if entries:
+                await session.execute(
+                    update(VectorOutbox)
+                    .where(VectorOutbox.id.in_([e.id for e in entries]))
+                    .values(next_attempt_at=now + timedelta(seconds=self.lease))
+                )
+                await session.commit()
+            # 会话关闭后处理过程只读取已加载的属性
+            for entry in entries:
+                session.expunge(entry)
+            return entries
+
+    async def _finish(self, done: List[str], retries: List[VectorOutbox]):
+        """第二个事务：删除已完成的记录，写回重试记录的退避状态"""
+        async with async_session() as session:
+            if done:
+                await session.execute(delete(VectorOutbox).where(VectorOutbox.id.in_(done)))
+            for entry in retries:
+                await session.execute(
+                    update(VectorOutbox)
+                    .where(VectorOutbox.id == entry.id)
+                    .values(
+                        attempts=entry.attempts,
+                        last_error=entry.last_error,
+                        next_attempt_at=entry.next_attempt_at
+                    )
+                )
+            await session.commit()
+
+    async def refresh_lag(self):
+        """更新待处理数量与最老记录的等待时间"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(func.count(VectorOutbox.id), func.min(VectorOutbox.created_at))
+            )
+            count, oldest = result.one()
+        self.pending = count
+        self.lag_seconds = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "lag_seconds": self.lag_seconds,
+            "processed": self.processed,
+            "failed": self.failed
+        }
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                drained = await self.drain_once()
+                await self.refresh_lag()
+            except Exception as e:
+                print(f"Vector outbox drain error: {e}")
+                drained = 0
+
+            # 满批说明还有积压，立即继续；否则等待下一个轮询周期
+            if drained < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
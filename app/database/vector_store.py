@@ -1,56 +1,414 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, Filter, FieldCondition, MatchValue, PointStruct
-from typing import List, Dict, Any, Optional
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, Filter, FieldCondition, MatchValue, PointStruct,
+    HnswConfigDiff, KeywordIndexParams, KeywordIndexType, PayloadSchemaType,
+    Range, IsEmptyCondition, PayloadField, VectorParamsDiff, Disabled,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig,
+    SearchParams, QuantizationSearchParams, OverwritePayloadOperation, SetPayload
+)
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable, TypeVar
+from collections import OrderedDict
+from datetime import datetime, timezone
 from app.config import settings
+from app.database.vector_buffer import VectorWriteBuffer
+from app.domain.dto import MemoryFilterDTO
+from app.domain.enums import MemoryType
+import time
 import uuid
 
+T = TypeVar("T")
+
+# 进程内集合存在性缓存：已确认存在的集合，以及最近确认不存在的集合（负缓存）
+_known_collections = set()
+_missing_collections: "OrderedDict[str, float]" = OrderedDict()
+_MISSING_COLLECTIONS_MAX = 100000
+
+# 进程内共享的 Qdrant 客户端，所有 QdrantStore 复用同一个连接池
+_shared_client: Optional[AsyncQdrantClient] = None
+_write_buffer: Optional[VectorWriteBuffer] = None
+
+
+def get_qdrant_client() -> AsyncQdrantClient:
+    """获取共享的异步 Qdrant 客户端；QDRANT_PREFER_GRPC 为 true 时走 gRPC"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = AsyncQdrantClient(
+            url=settings.QDRANT_URL,
+            prefer_grpc=settings.QDRANT_PREFER_GRPC,
+            grpc_port=settings.QDRANT_GRPC_PORT,
+            pool_size=settings.QDRANT_POOL_SIZE,
+            timeout=settings.QDRANT_TIMEOUT
+        )
+    return _shared_client
+
+
+def get_vector_write_buffer() -> Optional[VectorWriteBuffer]:
+    """获取共享的向量写入缓冲；未启用时返回 None"""
+    global _write_buffer
+    if _write_buffer is None and settings.QDRANT_WRITE_BUFFER_ENABLED:
+        _write_buffer = VectorWriteBuffer(
+            get_qdrant_client(),
+            settings.QDRANT_WRITE_BUFFER_SIZE,
+            settings.QDRANT_WRITE_BUFFER_INTERVAL_MS
+        )
+    return _write_buffer
+
+
+async def close_qdrant_client():
+    """关闭前先写出缓冲区中的向量"""
+    global _shared_client, _write_buffer
+    if _write_buffer is not None:
+        await _write_buffer.flush()
+        _write_buffer = None
+    if _shared_client is not None:
+        await _shared_client.close()
+        _shared_client = None
+
+
+# 点 ID 由 memory_id 确定性派生，重试写入不会产生重复向量，更新/删除无需查询 PostgreSQL
+POINT_ID_NAMESPACE = uuid.UUID("6f1c3a52-9d4e-5b7a-8c21-3e5f0a9b7d14")
+
+
+def point_id_for(memory_id: str) -> str:
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, memory_id))
+
+
+# 过滤检索用到的 payload 索引；时间字段以 Unix 时间戳存储
+PAYLOAD_INDEXES = {
+    "memory_layer": PayloadSchemaType.KEYWORD,
+    "created_at": PayloadSchemaType.FLOAT,
+    "importance": PayloadSchemaType.INTEGER,
+    "expiry_at": PayloadSchemaType.FLOAT,
+}
+
+
+def to_timestamp(value: datetime) -> float:
+    """payload 中的时间字段统一为 Unix 时间戳；无时区的时间按 UTC 处理（与数据库一致）"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def vector_metadata(
+    metadata: Optional[Dict[str, Any]],
+    memory_layer: str,
+    created_at: datetime,
+    expiry_date: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """向量 payload 中的元数据：业务元数据 + 过滤检索用的记忆层与时间字段"""
+    payload = {
+        **(metadata or {}),
+        "memory_layer": memory_layer,
+        "created_at": to_timestamp(created_at)
+    }
+    if expiry_date is not None:
+        payload["expiry_at"] = to_timestamp(expiry_date)
+    return payload
+
+
+def quantization_config(quantization: str, always_ram: bool = True):
+    """量化配置：scalar 为 int8 标量量化（体积 1/4），binary 为二值量化（体积 1/32）"""
+    if quantization == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=0.99, always_ram=always_ram
+        ))
+    if quantization == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=always_ram))
+    return None
+
+
+def search_params(
+    quantization: str,
+    hnsw_ef: int = 0,
+    rescore: bool = True,
+    oversampling: float = 2.0
+) -> Optional[SearchParams]:
+    """检索参数：量化集合先按量化向量取 oversampling 倍候选，再用原始向量重打分"""
+    quantization_params = None
+    if quantization in ("scalar", "binary"):
+        quantization_params = QuantizationSearchParams(rescore=rescore, oversampling=oversampling)
+    if not hnsw_ef and quantization_params is None:
+        return None
+    return SearchParams(hnsw_ef=hnsw_ef or None, quantization=quantization_params)
+
+
+def _is_conflict(error: Exception) -> bool:
+    """集合已被其他进程并发创建"""
+    return getattr(error, "status_code", None) == 409 or "already exists" in str(error)
+
+
+def _is_collection_missing(error: Exception) -> bool:
+    """集合不存在（例如在服务之外被删除），区别于点不存在"""
+    message = str(error).lower()
+    return "collection" in message and (
+        getattr(error, "status_code", None) == 404 or "not found" in message or "doesn't exist" in message
+    )
+
+
 class QdrantStore:
-    def __init__(self):
-        self.client = QdrantClient(url=settings.QDRANT_URL)
-        if settings.EMBEDDING_PROVIDER == "dashscope":
-            self.embedding_dim = settings.DASHSCOPE_EMBEDDING_DIM
+    def __init__(
+        self,
+        client: Optional[AsyncQdrantClient] = None,
+        write_buffer: Optional[VectorWriteBuffer] = None
+    ):
+        self.client = client or get_qdrant_client()
+        if write_buffer is not None:
+            self.write_buffer = write_buffer
+        elif client is None:
+            self.write_buffer = get_vector_write_buffer()
         else:
-            self.embedding_dim = settings.OPENAI_EMBEDDING_DIM
+            # 共享写入缓冲绑定共享客户端，传入自定义客户端时不使用
+            self.write_buffer = None
+        self.embedding_dim = settings.embedding_dim
+
+    @property
+    def shared_layout(self) -> bool:
+        return settings.QDRANT_COLLECTION_LAYOUT == "shared"
 
     def _get_collection_name(self, memory_type: str, entity_id: str) -> str:
+        if self.shared_layout:
+            return f"{settings.QDRANT_COLLECTION_PREFIX}_{memory_type}"
         return f"{settings.QDRANT_COLLECTION_PREFIX}_{memory_type}_{entity_id}"
 
-    def ensure_collection(self, collection_name: str):
-        collections = self.client.get_collections()
-        existing = [c.name for c in collections.collections]
-        
-        if collection_name not in existing:
-            self.client.create_collection(
+    def _build_filter(self, entity_id: str, filters: Optional[MemoryFilterDTO] = None) -> Optional[Filter]:
+        """把租户隔离（共享集合布局）和业务过滤条件合成一个 Qdrant 过滤器"""
+        must = []
+        if self.shared_layout:
+            must.append(FieldCondition(key="entity_id", match=MatchValue(value=entity_id)))
+
+        filters = filters or MemoryFilterDTO()
+        if filters.memory_layer:
+            must.append(FieldCondition(key="memory_layer", match=MatchValue(value=filters.memory_layer.value)))
+        if filters.created_after or filters.created_before:
+            must.append(FieldCondition(key="created_at", range=Range(
+                gte=to_timestamp(filters.created_after) if filters.created_after else None,
+                lt=to_timestamp(filters.created_before) if filters.created_before else None
+            )))
+        if filters.min_importance is not None:
+            must.append(FieldCondition(key="importance", range=Range(gte=filters.min_importance)))
+        if not filters.include_expired:
+            # 没有过期时间，或过期时间晚于当前时间
+            must.append(Filter(should=[
+                IsEmptyCondition(is_empty=PayloadField(key="expiry_at")),
+                FieldCondition(key="expiry_at", range=Range(gt=time.time()))
+            ]))
+
+        return Filter(must=must) if must else None
+
+    async def ensure_collection(self, collection_name: str):
+        if collection_name in _known_collections:
+            return
+
+        if not await self.client.collection_exists(collection_name):
+            try:
+                await self._create_collection(collection_name)
+            except Exception as e:
+                if not _is_conflict(e):
+                    raise
+
+        _known_collections.add(collection_name)
+        _missing_collections.pop(collection_name, None)
+
+    async def _retry_if_missing(self, collection_name: str, operation: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行依赖集合存在的操作
+
+        集合在服务之外被删除时，进程内缓存仍认为它存在，之后的写入和检索都会失败。
+        遇到集合不存在的错误时清除缓存、重建集合并重试一次。
+        """
+        try:
+            return await operation()
+        except Exception as e:
+            if not _is_collection_missing(e):
+                raise
+        _known_collections.discard(collection_name)
+        await self.ensure_collection(collection_name)
+        return await operation()
+
+    def _hnsw_config(self) -> HnswConfigDiff:
+        if self.shared_layout:
+            # 多租户集合：关闭全局 HNSW 图，按租户 (entity_id) 构建子图
+            return HnswConfigDiff(
+                payload_m=settings.QDRANT_HNSW_M, m=0,
+                ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT, on_disk=settings.QDRANT_HNSW_ON_DISK
+            )
+        return HnswConfigDiff(
+            m=settings.QDRANT_HNSW_M,
+            ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT,
+            on_disk=settings.QDRANT_HNSW_ON_DISK
+        )
+
+    async def _create_collection(self, collection_name: str):
+        await self.client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(
+                size=self.embedding_dim, distance=Distance.COSINE, on_disk=settings.QDRANT_ON_DISK_VECTORS
+            ),
+            hnsw_config=self._hnsw_config(),
+            quantization_config=quantization_config(
+                settings.QDRANT_QUANTIZATION, settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+            )
+        )
+        if self.shared_layout:
+            await self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name="entity_id",
+                field_schema=KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True)
+            )
+
+        await self.ensure_payload_indexes(collection_name)
+
+    async def apply_collection_config(self, collection_name: str):
+        """把当前的量化、落盘与 HNSW 配置应用到已有集合（服务端后台重建索引）"""
+        await self.client.update_collection(
+            collection_name=collection_name,
+            vectors_config={"": VectorParamsDiff(on_disk=settings.QDRANT_ON_DISK_VECTORS)},
+            hnsw_config=self._hnsw_config(),
+            quantization_config=quantization_config(
+                settings.QDRANT_QUANTIZATION, settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+            ) or Disabled.DISABLED
+        )
+        await self.ensure_payload_indexes(collection_name)
+
+    async def ensure_payload_indexes(self, collection_name: str):
+        """创建过滤检索所需的 payload 索引（幂等）"""
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            await self.client.create_payload_index(
                 collection_name=collection_name,
-                vectors_config=VectorParams(size=self.embedding_dim, distance=Distance.COSINE)
+                field_name=field_name,
+                field_schema=field_schema
             )
 
-    async def insert(self, memory_id: str, embedding: List[float], 
+    async def collection_exists(self, collection_name: str) -> bool:
+        """带缓存的集合存在性检查；不存在的结果缓存 QDRANT_MISSING_COLLECTION_TTL 秒"""
+        if collection_name in _known_collections:
+            return True
+
+        checked_at = _missing_collections.get(collection_name)
+        if checked_at is not None and time.monotonic() - checked_at < settings.QDRANT_MISSING_COLLECTION_TTL:
+            return False
+
+        if await self.client.collection_exists(collection_name):
+            _known_collections.add(collection_name)
+            _missing_collections.pop(collection_name, None)
+            return True
+
+        _missing_collections[collection_name] = time.monotonic()
+        _missing_collections.move_to_end(collection_name)
+        while len(_missing_collections) > _MISSING_COLLECTIONS_MAX:
+            _missing_collections.popitem(last=False)
+        return False
+
+    async def memory_collections(self) -> List[str]:
+        """列出所有记忆集合（兼容 per_entity 与 shared 两种布局）"""
+        prefixes = tuple(
+            f"{settings.QDRANT_COLLECTION_PREFIX}_{memory_type.value}"
+            for memory_type in MemoryType
+        )
+        response = await self.client.get_collections()
+        return [c.name for c in response.collections if c.name.startswith(prefixes)]
+
+    async def insert(self, memory_id: str, embedding: List[float],
                     memory_type: str, entity_id: str, metadata: Dict[str, Any] = None):
         collection_name = self._get_collection_name(memory_type, entity_id)
-        self.ensure_collection(collection_name)
-        
-        # Use UUID as point ID, store original memory_id in payload
-        point_uuid = uuid.uuid4()
+        await self.ensure_collection(collection_name)
+
+        point_uuid = point_id_for(memory_id)
         point = PointStruct(
             id=point_uuid,
             vector=embedding,
-            payload={"memory_id": memory_id, **(metadata or {})}
+            payload=self.build_payload(memory_id, memory_type, entity_id, metadata)
         )
-        self.client.upsert(collection_name=collection_name, points=[point])
-        
+        await self._upsert(collection_name, point)
+
         return point_uuid
 
-    async def search(self, query_embedding: List[float], memory_type: str, 
-                    entity_id: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    @staticmethod
+    def build_payload(memory_id: str, memory_type: str, entity_id: str,
+                      metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        payload = {
+            "memory_id": memory_id,
+            **(metadata or {}),
+            "memory_type": memory_type,
+            "entity_id": entity_id
+        }
+        # importance 建有整数索引，统一成整数，缺省与抽取默认值一致
+        try:
+            payload["importance"] = int(payload.get("importance", 3))
+        except (TypeError, ValueError):
+            payload["importance"] = 3
+        return payload
+
+    async def scroll_entity(self, memory_type: str, entity_id: str, limit: int) -> Optional[List[Any]]:
+        """读取实体的全部点（含向量）；超过 limit 个时返回 None"""
+        collection_name = self._get_collection_name(memory_type, entity_id)
+        if not await self.collection_exists(collection_name):
+            return []
+
+        points, _ = await self.client.scroll(
+            collection_name=collection_name,
+            scroll_filter=self._build_filter(entity_id, MemoryFilterDTO(include_expired=True)),
+            limit=limit + 1,
+            with_payload=True,
+            with_vectors=True
+        )
+        return None if len(points) > limit else points
+
+    async def upsert_points(self, memory_type: str, entity_id: str, points: List[PointStruct]):
+        """批量写入同一实体的点（调用方已自行批量，不经过写入缓冲）"""
+        collection_name = self._get_collection_name(memory_type, entity_id)
+        await self.ensure_collection(collection_name)
+        await self._retry_if_missing(
+            collection_name, lambda: self.client.upsert(collection_name=collection_name, points=points)
+        )
+
+    async def set_payloads(self, memory_type: str, entity_id: str, payloads: List[Tuple[str, Dict[str, Any]]]):
+        """批量覆盖同一实体多个点的 payload（不重写向量，不与旧 payload 合并），一次请求"""
+        collection_name = self._get_collection_name(memory_type, entity_id)
+        await self.client.batch_update_points(
+            collection_name=collection_name,
+            update_operations=[
+                OverwritePayloadOperation(overwrite_payload=SetPayload(payload=payload, points=[point_id]))
+                for point_id, payload in payloads
+            ]
+        )
+
+    async def delete_points(self, memory_type: str, entity_id: str, point_ids: List[str]):
+        collection_name = self._get_collection_name(memory_type, entity_id)
+        if not await self.collection_exists(collection_name):
+            return
+        await self.client.delete(collection_name=collection_name, points_selector=point_ids)
+
+    async def _upsert(self, collection_name: str, point: PointStruct):
+        """有写入缓冲时合并为批量 upsert，否则单点写入"""
+        async def write():
+            if self.write_buffer is not None:
+                await self.write_buffer.add(collection_name, point)
+            else:
+                await self.client.upsert(collection_name=collection_name, points=[point])
+        await self._retry_if_missing(collection_name, write)
+
+    async def search(self, query_embedding: List[float], memory_type: str,
+                    entity_id: str, top_k: int = 5,
+                    filters: Optional[MemoryFilterDTO] = None) -> List[Dict[str, Any]]:
         collection_name = self._get_collection_name(memory_type, entity_id)
-        
-        response = self.client.search(
+
+        # 尚未写入过记忆的实体没有集合，直接返回空结果
+        if not await self.collection_exists(collection_name):
+            return []
+
+        response = await self._retry_if_missing(collection_name, lambda: self.client.query_points(
             collection_name=collection_name,
-            query_vector=query_embedding,
+            query=query_embedding,
+            query_filter=self._build_filter(entity_id, filters),
+            search_params=search_params(
+                settings.QDRANT_QUANTIZATION, settings.QDRANT_SEARCH_EF,
+                settings.QDRANT_RESCORE, settings.QDRANT_OVERSAMPLING
+            ),
             limit=top_k,
             with_payload=True
-        )
+        ))
 
         return [
             {
@@ -58,27 +416,25 @@ class QdrantStore:
                 "score": point.score,
                 "payload": point.payload
             }
-            for point in response
+            for point in response.points
         ]
 
-    async def update(self, memory_id: str, embedding: Optional[List[float]], 
+    async def update(self, memory_id: str, embedding: Optional[List[float]],
                     memory_type: str, entity_id: str, metadata: Dict[str, Any] = None):
+        """有新向量时整点覆盖写入；否则整体覆盖 payload（不合并，已删除的元数据键随之移除，与热缓存一致）"""
         collection_name = self._get_collection_name(memory_type, entity_id)
-        
-        payload = {"memory_id": memory_id}
-        if metadata:
-            payload.update(metadata)
-        
-        point = {
-            "id": memory_id,
-            "vector": embedding,
-            "payload": payload
-        }
-        self.client.upsert(collection_name=collection_name, points=[point])
+        payload = self.build_payload(memory_id, memory_type, entity_id, metadata)
+
+        if embedding is not None:
+            await self.ensure_collection(collection_name)
+            point = PointStruct(id=point_id_for(memory_id), vector=embedding, payload=payload)
+            await self._upsert(collection_name, point)
+        else:
+            await self.client.overwrite_payload(
+                collection_name=collection_name,
+                payload=payload,
+                points=[point_id_for(memory_id)]
+            )
 
     async def delete(self, memory_id: str, memory_type: str, entity_id: str):
-        collection_name = self._get_collection_name(memory_type, entity_id)
-        self.client.delete(
-            collection_name=collection_name,
-            points_selector=[memory_id]
-        )
+        await self.delete_points(memory_type, entity_id, [point_id_for(memory_id)])
@@ -10,6 +10,7 @@ from app.domain.dto import (
     MemoryDTO,
     ProfileMemoryDTO,
     EventMemoryDTO,
+    MemoryFilterDTO,
     MemoryLogDTO,
     ExtractionDTO,
     ExtractedMemoryResultDTO,
@@ -26,6 +27,7 @@ __all__ = [
     "MemoryDTO",
     "ProfileMemoryDTO",
     "EventMemoryDTO",
+    "MemoryFilterDTO",
     "MemoryLogDTO",
     "ExtractionDTO",
     "ExtractedMemoryResultDTO",
@@ -31,6 +31,35 @@ class EventMemoryDTO(MemoryDTO):
     expiry_date: Optional[datetime] = None
 
 
+class NewMemoryDTO(BaseModel):
+    """待写入的记忆（批量写入）"""
+    memory_type: MemoryType
+    entity_id: str
+    content: str
+    memory_layer: MemoryLayer = MemoryLayer.EVENT
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+    is_permanent: bool = False
+    expiry_date: Optional[datetime] = None
+
+
+class MemoryFilterDTO(BaseModel):
+    """向量检索过滤条件，下推到向量库执行"""
+    memory_layer: Optional[MemoryLayer] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    min_importance: Optional[int] = None
+    include_expired: bool = False
+
+
+class QueryItemDTO(BaseModel):
+    """一条融合查询（批量查询）"""
+    query: str
+    user_id: Optional[str] = None
+    agent_id: Optional[str] = None
+    top_k: int = 5
+    filters: Optional[MemoryFilterDTO] = None
+
+
 class MemoryLogDTO(BaseModel):
     """记忆日志 DTO"""
     id: str
@@ -43,3 +43,4 @@ class EmbeddingProvider(str, Enum):
     """Embedding 提供商枚举"""
     OPENAI = "openai"
     DASHSCOPE = "dashscope"
+    LOCAL = "local"
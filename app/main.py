@@ -2,6 +2,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import register_routes
 from app.database.models import init_db
+from app.core.provider_pool import provider_executor
+from app.core.local_embedding import close_local_embedder
+from app.database.vector_store import close_qdrant_client
+from app.database.embedded_index import close_embedded_vector_index
+from app.api.dependencies import container
+from app.repositories.impl.buffered_log_repository import BufferedLogRepository
 
 app = FastAPI(title="Z-Memory API", version="1.0.0")
 
@@ -16,5 +22,19 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     await init_db()
+    if container.vector_outbox_drainer is not None:
+        container.vector_outbox_drainer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if container.vector_outbox_drainer is not None:
+        await container.vector_outbox_drainer.stop()
+    if isinstance(container.log_repo, BufferedLogRepository):
+        await container.log_repo.stop()
+    provider_executor.shutdown()
+    close_local_embedder()
+    await close_qdrant_client()
+    close_embedded_vector_index()
 
 register_routes(app)
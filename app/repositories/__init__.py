@@ -9,6 +9,12 @@ from app.repositories.impl.postgres_repository import (
     QdrantVectorRepository,
     PostgresLogRepository
 )
+from app.repositories.impl.pgvector_repository import (
+    PgvectorMemoryRepository,
+    PgvectorVectorRepository
+)
+from app.repositories.impl.embedded_repository import EmbeddedVectorRepository
+from app.repositories.impl.buffered_log_repository import BufferedLogRepository
 
 __all__ = [
     "IMemoryRepository",
@@ -17,5 +23,9 @@ __all__ = [
     "IEmbeddingService",
     "PostgresMemoryRepository",
     "QdrantVectorRepository",
-    "PostgresLogRepository"
+    "PostgresLogRepository",
+    "PgvectorMemoryRepository",
+    "PgvectorVectorRepository",
+    "EmbeddedVectorRepository",
+    "BufferedLogRepository"
 ]
@@ -0,0 +1,167 @@
+from typing import List, Optional, Dict, Any
+from app.repositories.interfaces import ILogRepository
+from app.repositories.impl.postgres_repository import PostgresLogRepository
+from app.domain.enums import MemoryLayer, MemoryAction
+from app.config import settings
+import asyncio
+
+
+class BufferedLogRepository(ILogRepository):
+    """
+    写后日志仓储
+
+    log_action 只把日志行放入有界队列并立即返回日志 ID，后台任务在攒够 max_batch_size 条
+    或等待超过 flush_interval_ms 时用一条多行 INSERT 写入，日志写入不再计入请求延迟。
+    队列满时写入方等待（背压）。读取日志与更新奖励前先写出缓冲，保证能读到已记录的日志；
+    进程关闭时由 shutdown 钩子调用 stop 写出剩余日志。
+    处于工作单元内时同样只入队，不加入工作单元的事务：日志行与记忆行不再原子提交，
+    工作单元回滚时已入队的日志仍会写出，进程崩溃时未写出的日志会丢失。
+    """
+
+    def __init__(
+        self,
+        inner: Optional[PostgresLogRepository] = None,
+        max_batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[float] = None,
+        max_pending: Optional[int] = None
+    ):
+        self.inner = inner or PostgresLogRepository()
+        self.max_batch_size = max_batch_size or settings.LOG_BUFFER_BATCH_SIZE
+        self.flush_interval = (
+            flush_interval_ms if flush_interval_ms is not None else settings.LOG_BUFFER_INTERVAL_MS
+        ) / 1000
+        self.max_pending = max_pending or settings.LOG_BUFFER_MAX_PENDING
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # 等待写出的 flush 调用数，大于 0 时后台任务不再等待凑批
+        self._flushing = 0
+        self.logged = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+
+    async def log_action(
+        self,
+        memory_id: str,
+        memory_layer: MemoryLayer,
+        action: MemoryAction,
+        reason: str,
+        metadata: Dict[str, Any]
+    ) -> str:
+        row = self.inner.log_row(memory_id, memory_layer, action, reason, metadata)
+        await self._put(row)
+        return row["id"]
+
+    async def log_many(self, entries: List[Dict[str, Any]]) -> List[str]:
+        log_ids = []
+        for entry in entries:
+            log_ids.append(await self.log_action(
+                entry["memory_id"], entry["memory_layer"], entry["action"],
+                entry["reason"], entry.get("metadata")
+            ))
+        return log_ids
+
+    async def get_logs(
+        self,
+        memory_id: str,
+        memory_layer: Optional[MemoryLayer] = None,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        await self.flush()
+        return await self.inner.get_logs(memory_id, memory_layer, limit)
+
+    async def update_reward(
+        self,
+        log_id: str,
+        reward: float,
+        outcome: Dict[str, Any]
+    ) -> bool:
+        await self.flush()
+        return await self.inner.update_reward(log_id, reward, outcome)
+
+    async def get_pending_rewards(
+        self,
+        days_threshold: int = 7,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        await self.flush()
+        return await self.inner.get_pending_rewards(days_threshold, limit)
+
+    async def flush(self):
+        """唤醒后台任务并等待队列中的日志全部写出"""
+        if self._queue is None:
+            return
+        self._flushing += 1
+        try:
+            self._batch_ready.set()
+            await self._queue.join()
+        finally:
+            self._flushing -= 1
+
+    async def stop(self):
+        """写出剩余日志并停止后台任务"""
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "logged": self.logged,
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+            "pending": self._queue.qsize() if self._queue is not None else 0
+        }
+
+    async def _put(self, row: Dict[str, Any]):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._batch_ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+        await self._queue.put(row)
+        self.logged += 1
+        if self._queue.qsize() >= self.max_batch_size:
+            self._batch_ready.set()
+
+    async def _run(self):
+        while True:
+            rows = [await self._queue.get()]
+            if self._flushing == 0 and self._queue.qsize() < self.max_batch_size - 1:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+
+            while len(rows) < self.max_batch_size and not self._queue.empty():
+                rows.append(self._queue.get_nowait())
+
+            try:
+                await self._write(rows)
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+
+    async def _write(self, rows: List[Dict[str, Any]]):
+        """写入失败时等待一个间隔后重试一次，仍失败则丢弃并计数，避免阻塞后续日志"""
+        self.batches += 1
+        for attempt in range(2):
+            try:
+                await self.inner.write_rows(rows)
+                self.written += len(rows)
+                return
+            except Exception as e:
+                if attempt == 0:
+                    await asyncio.sleep(self.flush_interval)
+                    continue
+                self.failed += len(rows)
+                print(f"Memory log flush error ({len(rows)} rows dropped): {e}")
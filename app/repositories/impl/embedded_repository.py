@@ -0,0 +1,128 @@
+from typing import List, Optional, Dict, Any, Callable, TypeVar
+from app.repositories.interfaces import IVectorRepository
+from app.database.embedded_index import EmbeddedVectorIndex, get_embedded_vector_index
+from app.database.vector_store import QdrantStore, point_id_for
+from app.domain.dto import MemoryFilterDTO
+from app.domain.enums import MemoryType
+import asyncio
+
+T = TypeVar("T")
+
+
+class EmbeddedVectorRepository(IVectorRepository):
+    """
+    进程内向量仓储实现
+
+    向量存放在本地内存映射文件中，检索为精确的向量化余弦计算，只需要 PostgreSQL，
+    适用于单节点部署和 CI。每个实体几千条向量以内时，一次矩阵乘法比访问 Qdrant 更快。
+    加载、写入日志、扩容与压缩都是磁盘 I/O，在线程池中持有索引锁执行，不阻塞事件循环。
+    """
+
+    def __init__(self, index: Optional[EmbeddedVectorIndex] = None):
+        self.index = index or get_embedded_vector_index()
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        def locked() -> T:
+            with self.index.lock:
+                return func(*args)
+        return await asyncio.to_thread(locked)
+
+    async def insert(
+        self,
+        memory_id: str,
+        embedding: List[float],
+        memory_type: MemoryType,
+        entity_id: str,
+        metadata: Dict[str, Any]
+    ) -> str:
+        await self._run(self._put_many, [{
+            "memory_id": memory_id,
+            "embedding": embedding,
+            "memory_type": memory_type,
+            "entity_id": entity_id,
+            "metadata": metadata
+        }])
+        return point_id_for(memory_id)
+
+    async def insert_many(self, vectors: List[Dict[str, Any]]) -> List[str]:
+        await self._run(self._put_many, vectors)
+        return [point_id_for(vector["memory_id"]) for vector in vectors]
+
+    def _put_many(self, vectors: List[Dict[str, Any]]):
+        for vector in vectors:
+            memory_type = vector["memory_type"].value
+            entity = self.index.entity(memory_type, vector["entity_id"])
+            entity.put(
+                vector["memory_id"], vector["embedding"],
+                QdrantStore.build_payload(vector["memory_id"], memory_type, vector["entity_id"], vector["metadata"])
+            )
+        self.index.evict()
+
+    async def update(
+        self,
+        memory_id: str,
+        embedding: Optional[List[float]] = None,
+        memory_type: Optional[MemoryType] = None,
+        entity_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        # 向量按 (记忆类型, 实体) 分文件存放，缺少任一项时无从定位
+        if memory_type is None or entity_id is None:
+            return False
+        return await self._run(self._update, memory_id, embedding, memory_type.value, entity_id, metadata)
+
+    def _update(
+        self,
+        memory_id: str,
+        embedding: Optional[List[float]],
+        memory_type: str,
+        entity_id: str,
+        metadata: Optional[Dict[str, Any]]
+    ) -> bool:
+        entity = self.index.entity(memory_type, entity_id, create=embedding is not None)
+        if entity is None:
+            return False
+        updated = entity.put(
+            memory_id, embedding, QdrantStore.build_payload(memory_id, memory_type, entity_id, metadata)
+        )
+        self.index.evict()
+        return updated
+
+    async def delete(
+        self,
+        memory_id: str,
+        memory_type: MemoryType,
+        entity_id: str
+    ) -> bool:
+        return await self._run(self._delete, memory_id, memory_type.value, entity_id)
+
+    def _delete(self, memory_id: str, memory_type: str, entity_id: str) -> bool:
+        entity = self.index.entity(memory_type, entity_id, create=False)
+        return entity.delete(memory_id) if entity is not None else False
+
+    async def search(
+        self,
+        query_embedding: List[float],
+        memory_type: MemoryType,
+        entity_id: str,
+        top_k: int = 5,
+        filters: Optional[MemoryFilterDTO] = None
+    ) -> List[Dict[str, Any]]:
+        return await self._run(self._search, query_embedding, memory_type.value, entity_id, top_k, filters)
+
+    def _search(
+        self,
+        query_embedding: List[float],
+        memory_type: str,
+        entity_id: str,
+        top_k: int,
+        filters: Optional[MemoryFilterDTO]
+    ) -> List[Dict[str, Any]]:
+        entity = self.index.entity(memory_type, entity_id, create=False)
+        if entity is None:
+            return []
+
+        return [
+            {"memory_id": memory_id, "score": score, "payload": payload}
+            for memory_id, score, payload in entity.search(query_embedding, top_k, filters)
+        ]
@@ -0,0 +1,299 @@
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timezone
+from sqlalchemy import text, JSON
+from app.repositories.interfaces import IVectorRepository
+from app.repositories.impl.postgres_repository import (
+    PostgresMemoryRepository, memory_layer_of, new_memory_id
+)
+from app.database.models import ProfileMemory, EventMemory
+from app.database.unit_of_work import session_scope
+from app.database.vector_store import QdrantStore, point_id_for, vector_metadata
+from app.domain.dto import MemoryFilterDTO, NewMemoryDTO
+from app.domain.enums import MemoryType
+import json
+
+# 记忆层 -> 记忆表；vector 列由 scripts/migrate_pgvector.py 添加，不在 ORM 模型中声明
+LAYER_TABLES = {
+    "profile": ProfileMemory.__tablename__,
+    "event": EventMemory.__tablename__,
+}
+
+# 元数据中的重要性，取值规则与 QdrantStore.build_payload 一致：数值取整，整数字符串转换，
+# 其余（"4.5"、"high"、缺省）按 3 处理；直接 ::int 转换遇到非整数值会使整个检索失败。
+# 按 numeric 比较，超出 int 范围的取值也不会报错
+IMPORTANCE_SQL = (
+    "CASE WHEN json_typeof(metadata->'importance') = 'number' "
+    "THEN trunc((metadata->>'importance')::numeric) "
+    "WHEN metadata->>'importance' ~ '^\\s*[-+]?\\d+\\s*$' THEN trim(metadata->>'importance')::numeric "
+    "ELSE 3 END"
+)
+
+PROFILE_INSERT_SQL = (
+    "INSERT INTO profile_memories "
+    "(id, memory_type, entity_id, content, metadata, embedding_id, created_at, updated_at, embedding) "
+    "VALUES (:id, :memory_type, :entity_id, :content, CAST(:metadata AS json), "
+    ":embedding_id, :created_at, :created_at, CAST(:embedding AS vector))"
+)
+EVENT_INSERT_SQL = (
+    "INSERT INTO event_memories "
+    "(id, memory_type, entity_id, content, metadata, embedding_id, is_permanent, expiry_date, "
+    "created_at, updated_at, embedding) "
+    "VALUES (:id, :memory_type, :entity_id, :content, CAST(:metadata AS json), :embedding_id, "
+    ":is_permanent, :expiry_date, :created_at, :created_at, CAST(:embedding AS vector))"
+)
+
+
+def to_vector_literal(embedding: List[float]) -> str:
+    """pgvector 的文本格式 '[x1,x2,...]'，配合 CAST(:embedding AS vector) 使用，无需额外的驱动插件"""
+    return "[" + ",".join(repr(float(x)) for x in embedding) + "]"
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """记忆表的时间列不带时区，按 UTC 存储"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class PgvectorMemoryRepository(PostgresMemoryRepository):
+    """
+    pgvector 记忆仓储实现
+
+    向量存放在记忆行的 vector 列中，记忆与向量由一条 INSERT 写入、同一事务提交，
+    不再依赖 Qdrant。读取、更新、删除复用 PostgreSQL 实现。
+    """
+
+    def __init__(self):
+        self.vector_repo = PgvectorVectorRepository()
+
+    async def store_profile(
+        self,
+        memory_type: MemoryType,
+        entity_id: str,
+        content: str,
+        metadata: Dict[str, Any],
+        embedding: List[float]
+    ) -> str:
+        memory_id = new_memory_id(memory_type.value, "profile", entity_id)
+        async with session_scope() as session:
+            await session.execute(
+                text(PROFILE_INSERT_SQL),
+                self._row_params(memory_id, memory_type, entity_id, content, metadata, embedding)
+            )
+        return memory_id
+
+    async def store_event(
+        self,
+        memory_type: MemoryType,
+        entity_id: str,
+        content: str,
+        metadata: Dict[str, Any],
+        embedding: List[float],
+        is_permanent: bool = False,
+        expiry_date: Optional[datetime] = None
+    ) -> str:
+        memory_id = new_memory_id(memory_type.value, "event", entity_id)
+        params = self._row_params(memory_id, memory_type, entity_id, content, metadata, embedding)
+        params["is_permanent"] = is_permanent
+        params["expiry_date"] = expiry_date
+
+        async with session_scope() as session:
+            await session.execute(text(EVENT_INSERT_SQL), params)
+        return memory_id
+
+    async def store_many(
+        self,
+        memories: List[NewMemoryDTO],
+        embeddings: List[List[float]]
+    ) -> List[str]:
+        """记忆与向量同行写入：两个记忆层各一次 executemany INSERT，整批一次提交"""
+        memory_ids, rows, vectors = self._bulk_rows(memories, embeddings)
+        literals = {vector["memory_id"]: to_vector_literal(vector["embedding"]) for vector in vectors}
+
+        async with session_scope() as session:
+            for layer, sql in (("profile", PROFILE_INSERT_SQL), ("event", EVENT_INSERT_SQL)):
+                params = [
+                    {
+                        **{key: value for key, value in row.items() if key not in ("meta_info", "updated_at")},
+                        "metadata": json.dumps(row["meta_info"] or {}, ensure_ascii=False),
+                        "embedding": literals[row["id"]]
+                    }
+                    for row in rows[layer]
+                ]
+                if params:
+                    await session.execute(text(sql), params)
+
+        return memory_ids
+
+    @staticmethod
+    def _row_params(
+        memory_id: str,
+        memory_type: MemoryType,
+        entity_id: str,
+        content: str,
+        metadata: Dict[str, Any],
+        embedding: List[float]
+    ) -> Dict[str, Any]:
+        return {
+            "id": memory_id,
+            "memory_type": memory_type.value,
+            "entity_id": entity_id,
+            "content": content,
+            "metadata": json.dumps(metadata or {}, ensure_ascii=False),
+            "embedding_id": point_id_for(memory_id),
+            "created_at": datetime.utcnow(),
+            "embedding": to_vector_literal(embedding)
+        }
+
+    async def _reindex_vector(self, session, memory, memory_layer: str, embedding: List[float]):
+        """向量与记忆同行，随本次更新一起提交"""
+        await session.execute(
+            text(f"UPDATE {LAYER_TABLES[memory_layer]} SET embedding = CAST(:embedding AS vector) WHERE id = :id"),
+            {"embedding": to_vector_literal(embedding), "id": memory.id}
+        )
+
+    async def _remove_vector(self, session, memory):
+        """删除记忆行即删除向量"""
+        return None
+
+
+class PgvectorVectorRepository(IVectorRepository):
+    """
+    pgvector 向量仓储实现
+
+    在 profile_memories / event_memories 的 vector 列上做 HNSW 余弦检索，
+    两个记忆层各取 top_k 后合并排序；返回格式与 Qdrant 实现一致。
+    """
+
+    async def insert(
+        self,
+        memory_id: str,
+        embedding: List[float],
+        memory_type: MemoryType,
+        entity_id: str,
+        metadata: Dict[str, Any]
+    ) -> str:
+        await self._set_embedding(memory_id, to_vector_literal(embedding))
+        return point_id_for(memory_id)
+
+    async def insert_many(self, vectors: List[Dict[str, Any]]) -> List[str]:
+        """按记忆层各一次 executemany UPDATE"""
+        async with session_scope() as session:
+            for layer, table in LAYER_TABLES.items():
+                params = [
+                    {"embedding": to_vector_literal(vector["embedding"]), "id": vector["memory_id"]}
+                    for vector in vectors
+                    if memory_layer_of(vector["memory_id"]) == layer
+                ]
+                if params:
+                    await session.execute(
+                        text(f"UPDATE {table} SET embedding = CAST(:embedding AS vector) WHERE id = :id"),
+                        params
+                    )
+        return [point_id_for(vector["memory_id"]) for vector in vectors]
+
+    async def update(
+        self,
+        memory_id: str,
+        embedding: Optional[List[float]] = None,
+        memory_type: Optional[MemoryType] = None,
+        entity_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        # payload 就是记忆行本身，只有向量需要单独更新
+        if embedding is None:
+            return True
+        return await self._set_embedding(memory_id, to_vector_literal(embedding))
+
+    async def delete(
+        self,
+        memory_id: str,
+        memory_type: MemoryType,
+        entity_id: str
+    ) -> bool:
+        return await self._set_embedding(memory_id, None)
+
+    async def search(
+        self,
+        query_embedding: List[float],
+        memory_type: MemoryType,
+        entity_id: str,
+        top_k: int = 5,
+        filters: Optional[MemoryFilterDTO] = None
+    ) -> List[Dict[str, Any]]:
+        sql, params = self._build_search_sql(query_embedding, memory_type, entity_id, top_k, filters)
+        async with session_scope() as session:
+            # 原生 SQL 需要声明 json 列类型，才能得到反序列化后的元数据
+            result = await session.execute(text(sql).columns(metadata=JSON), params)
+            rows = result.mappings().all()
+
+        return [
+            {
+                "memory_id": row["id"],
+                "score": 1.0 - row["distance"],
+                "payload": QdrantStore.build_payload(
+                    row["id"], memory_type.value, entity_id,
+                    vector_metadata(row["metadata"], row["memory_layer"], row["created_at"], row["expiry_date"])
+                )
+            }
+            for row in rows
+        ]
+
+    def _build_search_sql(
+        self,
+        query_embedding: List[float],
+        memory_type: MemoryType,
+        entity_id: str,
+        top_k: int,
+        filters: Optional[MemoryFilterDTO] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """每个记忆层一个按距离排序的子查询（可走 HNSW 索引），UNION ALL 后取全局 top_k"""
+        filters = filters or MemoryFilterDTO()
+        params: Dict[str, Any] = {
+            "query": to_vector_literal(query_embedding),
+            "memory_type": memory_type.value,
+            "entity_id": entity_id,
+            "top_k": top_k
+        }
+
+        conditions = ["memory_type = :memory_type", "entity_id = :entity_id", "embedding IS NOT NULL"]
+        if filters.created_after:
+            conditions.append("created_at >= :created_after")
+            params["created_after"] = _naive_utc(filters.created_after)
+        if filters.created_before:
+            conditions.append("created_at < :created_before")
+            params["created_before"] = _naive_utc(filters.created_before)
+        if filters.min_importance is not None:
+            conditions.append(f"{IMPORTANCE_SQL} >= :min_importance")
+            params["min_importance"] = filters.min_importance
+
+        layers = [filters.memory_layer.value] if filters.memory_layer else list(LAYER_TABLES)
+        branches = []
+        for layer in layers:
+            layer_conditions = list(conditions)
+            if layer == "event":
+                expiry = "expiry_date"
+                if not filters.include_expired:
+                    layer_conditions.append("(expiry_date IS NULL OR expiry_date > :now)")
+                    params["now"] = datetime.utcnow()
+            else:
+                expiry = "NULL::timestamp"
+
+            branches.append(
+                f"(SELECT id, '{layer}' AS memory_layer, metadata, created_at, {expiry} AS expiry_date, "
+                f"embedding <=> CAST(:query AS vector) AS distance "
+                f"FROM {LAYER_TABLES[layer]} WHERE {' AND '.join(layer_conditions)} "
+                f"ORDER BY distance LIMIT :top_k)"
+            )
+
+        sql = " UNION ALL ".join(branches) + " ORDER BY distance LIMIT :top_k"
+        return sql, params
+
+    async def _set_embedding(self, memory_id: str, embedding: Optional[str]) -> bool:
+        table = LAYER_TABLES[memory_layer_of(memory_id)]
+        async with session_scope() as session:
+            result = await session.execute(
+                text(f"UPDATE {table} SET embedding = CAST(:embedding AS vector) WHERE id = :id"),
+                {"embedding": embedding, "id": memory_id}
+            )
+            return result.rowcount > 0
@@ -5,19 +5,43 @@ from app.repositories.interfaces import (
     IVectorRepository,
     ILogRepository
 )
-from app.database.models import ProfileMemory, EventMemory, MemoryLog, async_session
-from app.database.vector_store import QdrantStore
+from app.database.models import ProfileMemory, EventMemory, MemoryLog
+from app.database.unit_of_work import session_scope
+from app.database.vector_store import QdrantStore, point_id_for, vector_metadata
+from app.domain.dto import MemoryFilterDTO, NewMemoryDTO
+from app.database.vector_outbox import outbox_entry
+from app.database.vector_cache import HotVectorCache, get_hot_vector_cache
+from app.database.embedded_index import EntityVectors
 from app.domain.enums import MemoryType, MemoryLayer, MemoryAction
-from sqlalchemy import select
+from app.config import settings
+from sqlalchemy import select, insert, update, delete, union_all, literal_column
+from qdrant_client.models import PointStruct
+import asyncio
 import uuid
 
+LAYER_MODELS = {"profile": ProfileMemory, "event": EventMemory}
+
+_last_id_timestamp = 0.0
+
+
+def memory_layer_of(memory_id: str) -> str:
+    """从记忆 ID（{memory_type}_{layer}_{entity_id}_{timestamp}）中解析记忆层"""
+    return memory_id.split("_", 2)[1]
+
+
+def new_memory_id(memory_type: str, memory_layer: str, entity_id: str) -> str:
+    """生成记忆 ID；时间戳在进程内严格递增，批量写入时同一微秒内的记忆也不会重复"""
+    global _last_id_timestamp
+    timestamp = max(datetime.now().timestamp(), round(_last_id_timestamp + 1e-6, 6))
+    _last_id_timestamp = timestamp
+    return f"{memory_type}_{memory_layer}_{entity_id}_{timestamp}"
+
 
 class PostgresMemoryRepository(IMemoryRepository):
     """PostgreSQL 记忆仓储实现"""
 
     def __init__(self, vector_repo: IVectorRepository = None):
-        self.vector_store = QdrantStore()
-        self.vector_repo = vector_repo
+        self.vector_repo = vector_repo or QdrantVectorRepository()
 
     async def store_profile(
         self,
@@ -27,13 +51,13 @@ class PostgresMemoryRepository(IMemoryRepository):
         metadata: Dict[str, Any],
         embedding: List[float]
     ) -> str:
-        async with async_session() as session:
-            memory_id = f"{memory_type.value}_profile_{entity_id}_{datetime.now().timestamp()}"
+        async with session_scope() as session:
+            memory_id = new_memory_id(memory_type.value, "profile", entity_id)
+            created_at = datetime.utcnow()
 
-            layer_metadata = metadata.copy()
-            layer_metadata["memory_layer"] = "profile"
-            embedding_uuid = await self.vector_store.insert(
-                memory_id, embedding, memory_type, entity_id, layer_metadata
+            layer_metadata = vector_metadata(metadata, "profile", created_at)
+            embedding_uuid = await self._index_vector(
+                session, memory_id, memory_type, entity_id, embedding, layer_metadata
             )
 
             memory = ProfileMemory(
@@ -42,10 +66,10 @@ class PostgresMemoryRepository(IMemoryRepository):
                 entity_id=entity_id,
                 content=content,
                 meta_info=metadata,
-                embedding_id=str(embedding_uuid)
+                embedding_id=str(embedding_uuid),
+                created_at=created_at
             )
             session.add(memory)
-            await session.commit()
 
             return memory_id
 
@@ -59,13 +83,13 @@ class PostgresMemoryRepository(IMemoryRepository):
         is_permanent: bool = False,
         expiry_date: Optional[datetime] = None
     ) -> str:
-        async with async_session() as session:
-            memory_id = f"{memory_type.value}_event_{entity_id}_{datetime.now().timestamp()}"
+        async with session_scope() as session:
+            memory_id = new_memory_id(memory_type.value, "event", entity_id)
+            created_at = datetime.utcnow()
 
-            layer_metadata = metadata.copy()
-            layer_metadata["memory_layer"] = "event"
-            embedding_uuid = await self.vector_store.insert(
-                memory_id, embedding, memory_type, entity_id, layer_metadata
+            layer_metadata = vector_metadata(metadata, "event", created_at, expiry_date)
+            embedding_uuid = await self._index_vector(
+                session, memory_id, memory_type, entity_id, embedding, layer_metadata
             )
 
             memory = EventMemory(
@@ -76,59 +100,118 @@ class PostgresMemoryRepository(IMemoryRepository):
                 meta_info=metadata,
                 embedding_id=str(embedding_uuid),
                 is_permanent=is_permanent,
-                expiry_date=expiry_date
+                expiry_date=expiry_date,
+                created_at=created_at
             )
             session.add(memory)
-            await session.commit()
 
             return memory_id
 
+    async def store_many(
+        self,
+        memories: List[NewMemoryDTO],
+        embeddings: List[List[float]]
+    ) -> List[str]:
+        """向量按集合批量写入，两个记忆层各一次 executemany INSERT，整批一次提交"""
+        memory_ids, rows, vectors = self._bulk_rows(memories, embeddings)
+
+        async with session_scope() as session:
+            if self.use_outbox:
+                session.add_all([
+                    outbox_entry(
+                        "upsert", vector["memory_id"], vector["memory_type"].value, vector["entity_id"],
+                        point_id_for(vector["memory_id"]), vector["embedding"],
+                        QdrantStore.build_payload(
+                            vector["memory_id"], vector["memory_type"].value,
+                            vector["entity_id"], vector["metadata"]
+                        )
+                    )
+                    for vector in vectors
+                ])
+            elif vectors:
+                await self.vector_repo.insert_many(vectors)
+
+            for layer, model in (("profile", ProfileMemory), ("event", EventMemory)):
+                if rows[layer]:
+                    await session.execute(insert(model), rows[layer])
+
+        return memory_ids
+
+    @staticmethod
+    def _bulk_rows(memories: List[NewMemoryDTO], embeddings: List[List[float]]):
+        """生成批量写入所需的记忆 ID、按记忆层分组的行与向量项"""
+        created_at = datetime.utcnow()
+        memory_ids: List[str] = []
+        rows: Dict[str, List[Dict[str, Any]]] = {"profile": [], "event": []}
+        vectors: List[Dict[str, Any]] = []
+
+        for memory, embedding in zip(memories, embeddings):
+            layer = memory.memory_layer.value
+            memory_id = new_memory_id(memory.memory_type.value, layer, memory.entity_id)
+            row = {
+                "id": memory_id,
+                "memory_type": memory.memory_type.value,
+                "entity_id": memory.entity_id,
+                "content": memory.content,
+                "meta_info": memory.metadata,
+                "embedding_id": point_id_for(memory_id),
+                "created_at": created_at,
+                "updated_at": created_at
+            }
+            expiry_date = None
+            if layer == "event":
+                expiry_date = memory.expiry_date
+                row["is_permanent"] = memory.is_permanent
+                row["expiry_date"] = expiry_date
+
+            memory_ids.append(memory_id)
+            rows[layer].append(row)
+            vectors.append({
+                "memory_id": memory_id,
+                "embedding": embedding,
+                "memory_type": memory.memory_type,
+                "entity_id": memory.entity_id,
+                "metadata": vector_metadata(memory.metadata, layer, created_at, expiry_date)
+            })
+
+        return memory_ids, rows, vectors
+
     async def get_by_id(self, memory_id: str) -> Optional[Dict[str, Any]]:
-        async with async_session() as session:
-            result = await session.execute(
-                select(ProfileMemory).where(ProfileMemory.id == memory_id)
-            )
-            memory = result.scalar_one_or_none()
-            if memory:
-                return {
-                    "id": memory.id,
-                    "memory_type": memory.memory_type,
-                    "entity_id": memory.entity_id,
-                    "content": memory.content,
-                    "metadata": memory.meta_info,
-                    "memory_layer": "profile",
-                    "created_at": memory.created_at,
-                    "updated_at": memory.updated_at,
-                    "embedding_id": memory.embedding_id
-                }
+        memory_layer = self._layer_of(memory_id)
+        if memory_layer is None:
+            return None
 
-            result = await session.execute(
-                select(EventMemory).where(EventMemory.id == memory_id)
-            )
+        model = LAYER_MODELS[memory_layer]
+        async with session_scope() as session:
+            result = await session.execute(select(model).where(model.id == memory_id))
             memory = result.scalar_one_or_none()
-            if memory:
-                return {
-                    "id": memory.id,
-                    "memory_type": memory.memory_type,
-                    "entity_id": memory.entity_id,
-                    "content": memory.content,
-                    "metadata": memory.meta_info,
-                    "memory_layer": "event",
-                    "is_permanent": memory.is_permanent,
-                    "expiry_date": memory.expiry_date,
-                    "created_at": memory.created_at,
-                    "updated_at": memory.updated_at,
-                    "embedding_id": memory.embedding_id
-                }
-
-            return None
+            return self._memory_dict(memory, memory_layer) if memory else None
+
+    async def get_by_ids(self, memory_ids: List[str]) -> List[Dict[str, Any]]:
+        """两张记忆层表各一个 WHERE id IN 子查询，UNION ALL 后一次取回；按输入顺序返回，不存在的 ID 跳过"""
+        if not memory_ids:
+            return []
+
+        branches = [
+            select(
+                model.id, model.memory_type, model.entity_id, model.content,
+                model.meta_info.label("metadata"), model.created_at,
+                literal_column(f"'{memory_layer}'").label("memory_layer")
+            ).where(model.id.in_(memory_ids))
+            for memory_layer, model in LAYER_MODELS.items()
+        ]
+        async with session_scope() as session:
+            result = await session.execute(union_all(*branches))
+            rows = {row["id"]: dict(row) for row in result.mappings().all()}
+
+        return [rows[memory_id] for memory_id in memory_ids if memory_id in rows]
 
     async def get_profile(
         self,
         memory_type: MemoryType,
         entity_id: str
     ) -> List[Dict[str, Any]]:
-        async with async_session() as session:
+        async with session_scope() as session:
             result = await session.execute(
                 select(ProfileMemory).where(
                     ProfileMemory.memory_type == memory_type.value,
@@ -153,7 +236,7 @@ class PostgresMemoryRepository(IMemoryRepository):
         entity_id: str,
         limit: int = 100
     ) -> List[Dict[str, Any]]:
-        async with async_session() as session:
+        async with session_scope() as session:
             result = await session.execute(
                 select(EventMemory).where(
                     EventMemory.memory_type == memory_type.value,
@@ -180,32 +263,8 @@ class PostgresMemoryRepository(IMemoryRepository):
         content: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
         embedding: Optional[List[float]] = None
-    ) -> bool:
-        async with async_session() as session:
-            result = await session.execute(
-                select(ProfileMemory).where(ProfileMemory.id == memory_id)
-            )
-            memory = result.scalar_one_or_none()
-
-            if not memory:
-                return False
-
-            if content is not None:
-                memory.content = content
-            if metadata is not None:
-                memory.meta_info = metadata
-
-            memory.updated_at = datetime.now()
-            await session.commit()
-
-            if embedding:
-                await self.vector_store.update(
-                    memory.embedding_id,
-                    embedding=embedding,
-                    metadata=metadata or {}
-                )
-
-            return True
+    ) -> Optional[Dict[str, Any]]:
+        return await self._update(ProfileMemory, "profile", memory_id, content, metadata, embedding)
 
     async def update_event(
         self,
@@ -213,73 +272,196 @@ class PostgresMemoryRepository(IMemoryRepository):
         content: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
         embedding: Optional[List[float]] = None
-    ) -> bool:
-        async with async_session() as session:
-            result = await session.execute(
-                select(EventMemory).where(EventMemory.id == memory_id)
-            )
-            memory = result.scalar_one_or_none()
-
-            if not memory:
-                return False
-
-            if content is not None:
-                memory.content = content
-            if metadata is not None:
-                memory.meta_info = metadata
-
-            memory.updated_at = datetime.now()
-            await session.commit()
+    ) -> Optional[Dict[str, Any]]:
+        return await self._update(EventMemory, "event", memory_id, content, metadata, embedding)
 
-            if embedding:
-                await self.vector_store.update(
-                    memory.embedding_id,
-                    embedding=embedding,
-                    metadata=metadata or {}
-                )
+    async def update_memory(
+        self,
+        memory_id: str,
+        content: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        embedding: Optional[List[float]] = None
+    ) -> Optional[Dict[str, Any]]:
+        memory_layer = self._layer_of(memory_id)
+        if memory_layer is None:
+            return None
+        return await self._update(
+            LAYER_MODELS[memory_layer], memory_layer, memory_id, content, metadata, embedding
+        )
 
-            return True
+    async def delete_memory(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """一条 DELETE ... RETURNING 删除记忆并取回删除向量所需的字段"""
+        memory_layer = self._layer_of(memory_id)
+        if memory_layer is None:
+            return None
 
-    async def delete_memory(self, memory_id: str) -> bool:
-        async with async_session() as session:
+        model = LAYER_MODELS[memory_layer]
+        async with session_scope() as session:
             result = await session.execute(
-                select(ProfileMemory).where(ProfileMemory.id == memory_id)
+                delete(model)
+                .where(model.id == memory_id)
+                .returning(model.id, model.memory_type, model.entity_id)
             )
-            memory = result.scalar_one_or_none()
-
-            if memory:
-                await self.vector_store.delete(
-                    memory.embedding_id,
-                    MemoryType(memory.memory_type),
-                    memory.entity_id
-                )
-                await session.delete(memory)
-                await session.commit()
-                return True
-
+            memory = result.one_or_none()
+            if memory is None:
+                return None
+
+            await self._remove_vector(session, memory)
+            return {
+                "id": memory.id,
+                "memory_type": memory.memory_type,
+                "entity_id": memory.entity_id,
+                "memory_layer": memory_layer
+            }
+
+    async def _update(
+        self,
+        model,
+        memory_layer: str,
+        memory_id: str,
+        content: Optional[str],
+        metadata: Optional[Dict[str, Any]],
+        embedding: Optional[List[float]]
+    ) -> Optional[Dict[str, Any]]:
+        """一条 UPDATE ... RETURNING 完成更新并取回更新后的行；只改元数据时只更新向量 payload"""
+        values: Dict[str, Any] = {"updated_at": datetime.utcnow()}
+        if content is not None:
+            values["content"] = content
+        if metadata is not None:
+            values["meta_info"] = metadata
+
+        async with session_scope() as session:
             result = await session.execute(
-                select(EventMemory).where(EventMemory.id == memory_id)
+                update(model).where(model.id == memory_id).values(**values).returning(model)
             )
             memory = result.scalar_one_or_none()
+            if memory is None:
+                return None
 
-            if memory:
-                await self.vector_store.delete(
-                    memory.embedding_id,
-                    MemoryType(memory.memory_type),
-                    memory.entity_id
-                )
-                await session.delete(memory)
-                await session.commit()
-                return True
+            if embedding:
+                await self._reindex_vector(session, memory, memory_layer, embedding)
+            elif metadata is not None:
+                await self._update_payload(session, memory, memory_layer)
+
+            return self._memory_dict(memory, memory_layer)
+
+    @staticmethod
+    def _layer_of(memory_id: str) -> Optional[str]:
+        """记忆层编码在记忆 ID 中，据此直接访问对应的表；格式不符时返回 None"""
+        try:
+            memory_layer = memory_layer_of(memory_id)
+        except IndexError:
+            return None
+        return memory_layer if memory_layer in LAYER_MODELS else None
+
+    @staticmethod
+    def _memory_dict(memory, memory_layer: str) -> Dict[str, Any]:
+        result = {
+            "id": memory.id,
+            "memory_type": memory.memory_type,
+            "entity_id": memory.entity_id,
+            "content": memory.content,
+            "metadata": memory.meta_info,
+            "memory_layer": memory_layer,
+            "created_at": memory.created_at,
+            "updated_at": memory.updated_at,
+            "embedding_id": memory.embedding_id
+        }
+        if memory_layer == "event":
+            result["is_permanent"] = memory.is_permanent
+            result["expiry_date"] = memory.expiry_date
+        return result
+
+
+    @property
+    def use_outbox(self) -> bool:
+        """发件箱由后台任务写入 Qdrant，只在 Qdrant 后端下生效"""
+        return settings.VECTOR_INDEX_MODE == "outbox" and settings.VECTOR_BACKEND == "qdrant"
+
+    async def _index_vector(
+        self,
+        session,
+        memory_id: str,
+        memory_type: MemoryType,
+        entity_id: str,
+        embedding: List[float],
+        metadata: Dict[str, Any]
+    ) -> str:
+        """sync 模式直接写向量仓储；outbox 模式写发件箱，随记忆行在同一事务中提交"""
+        if self.use_outbox:
+            point_id = point_id_for(memory_id)
+            session.add(outbox_entry(
+                "upsert", memory_id, memory_type.value, entity_id, point_id, embedding,
+                QdrantStore.build_payload(memory_id, memory_type.value, entity_id, metadata)
+            ))
+            return point_id
+
+        return await self.vector_repo.insert(
+            memory_id, embedding, memory_type, entity_id, metadata
+        )
+
+    async def _reindex_vector(
+        self,
+        session,
+        memory,
+        memory_layer: str,
+        embedding: List[float]
+    ):
+        """用新向量覆盖记忆对应的点，payload 取自更新后的记忆行"""
+        metadata = vector_metadata(
+            memory.meta_info, memory_layer, memory.created_at,
+            getattr(memory, "expiry_date", None)
+        )
+        if self.use_outbox:
+            session.add(outbox_entry(
+                "upsert", memory.id, memory.memory_type, memory.entity_id,
+                point_id_for(memory.id), embedding,
+                QdrantStore.build_payload(memory.id, memory.memory_type, memory.entity_id, metadata)
+            ))
+            return
+
+        await self.vector_repo.update(
+            memory.id, embedding, MemoryType(memory.memory_type), memory.entity_id, metadata
+        )
 
-            return False
+    async def _update_payload(self, session, memory, memory_layer: str):
+        """只改元数据时整体覆盖向量 payload（发件箱操作名为 set_payload），不重写向量"""
+        metadata = vector_metadata(
+            memory.meta_info, memory_layer, memory.created_at,
+            getattr(memory, "expiry_date", None)
+        )
+        if self.use_outbox:
+            session.add(outbox_entry(
+                "set_payload", memory.id, memory.memory_type, memory.entity_id,
+                point_id_for(memory.id), None,
+                QdrantStore.build_payload(memory.id, memory.memory_type, memory.entity_id, metadata)
+            ))
+            return
+
+        await self.vector_repo.update(
+            memory.id, None, MemoryType(memory.memory_type), memory.entity_id, metadata
+        )
+
+    async def _remove_vector(self, session, memory):
+        if self.use_outbox:
+            session.add(outbox_entry(
+                "delete", memory.id, memory.memory_type, memory.entity_id, point_id_for(memory.id)
+            ))
+            return
+
+        await self.vector_repo.delete(memory.id, MemoryType(memory.memory_type), memory.entity_id)
 
 
 class QdrantVectorRepository(IVectorRepository):
-    """Qdrant 向量仓储实现"""
+    """Qdrant 向量仓储实现；小实体的检索由进程内热向量缓存承担"""
 
-    def __init__(self):
-        self.vector_store = QdrantStore()
+    def __init__(
+        self,
+        vector_store: Optional[QdrantStore] = None,
+        hot_cache: Optional[HotVectorCache] = None
+    ):
+        self.vector_store = vector_store or QdrantStore()
+        self.hot_cache = hot_cache or get_hot_vector_cache()
 
     async def insert(
         self,
@@ -289,42 +471,122 @@ class QdrantVectorRepository(IVectorRepository):
         entity_id: str,
         metadata: Dict[str, Any]
     ) -> str:
-        return await self.vector_store.insert(
+        point_id = await self.vector_store.insert(
             memory_id, embedding, memory_type.value, entity_id, metadata
         )
+        if self.hot_cache is not None:
+            self.hot_cache.apply_put(
+                (memory_type.value, entity_id), memory_id, embedding,
+                QdrantStore.build_payload(memory_id, memory_type.value, entity_id, metadata)
+            )
+        return point_id
+
+    async def insert_many(self, vectors: List[Dict[str, Any]]) -> List[str]:
+        """按集合分组，每个集合一次 upsert，各集合并发写入"""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for vector in vectors:
+            collection_name = self.vector_store._get_collection_name(
+                vector["memory_type"].value, vector["entity_id"]
+            )
+            groups.setdefault(collection_name, []).append(vector)
+
+        await asyncio.gather(*(
+            self.vector_store.upsert_points(
+                group[0]["memory_type"].value, group[0]["entity_id"],
+                [
+                    PointStruct(
+                        id=point_id_for(vector["memory_id"]),
+                        vector=vector["embedding"],
+                        payload=self._payload(vector)
+                    )
+                    for vector in group
+                ]
+            )
+            for group in groups.values()
+        ))
+
+        if self.hot_cache is not None:
+            for vector in vectors:
+                self.hot_cache.apply_put(
+                    (vector["memory_type"].value, vector["entity_id"]),
+                    vector["memory_id"], vector["embedding"], self._payload(vector)
+                )
+        return [point_id_for(vector["memory_id"]) for vector in vectors]
+
+    @staticmethod
+    def _payload(vector: Dict[str, Any]) -> Dict[str, Any]:
+        return QdrantStore.build_payload(
+            vector["memory_id"], vector["memory_type"].value, vector["entity_id"], vector["metadata"]
+        )
 
     async def update(
         self,
-        vector_id: str,
+        memory_id: str,
         embedding: Optional[List[float]] = None,
         memory_type: Optional[MemoryType] = None,
         entity_id: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None
     ) -> bool:
-        return await self.vector_store.update(
-            vector_id, embedding,
+        await self.vector_store.update(
+            memory_id, embedding,
             memory_type.value if memory_type else None,
             entity_id, metadata
         )
+        if self.hot_cache is not None and memory_type is not None:
+            self.hot_cache.apply_put(
+                (memory_type.value, entity_id), memory_id, embedding,
+                QdrantStore.build_payload(memory_id, memory_type.value, entity_id, metadata)
+            )
+        return True
 
     async def delete(
         self,
-        vector_id: str,
+        memory_id: str,
         memory_type: MemoryType,
         entity_id: str
     ) -> bool:
-        return await self.vector_store.delete(vector_id, memory_type.value, entity_id)
+        await self.vector_store.delete(memory_id, memory_type.value, entity_id)
+        if self.hot_cache is not None:
+            self.hot_cache.apply_delete((memory_type.value, entity_id), memory_id)
+        return True
 
     async def search(
         self,
         query_embedding: List[float],
         memory_type: MemoryType,
         entity_id: str,
-        top_k: int = 5
+        top_k: int = 5,
+        filters: Optional[MemoryFilterDTO] = None
     ) -> List[Dict[str, Any]]:
-        return await self.vector_store.search(
-            query_embedding, memory_type.value, entity_id, top_k
+        key = (memory_type.value, entity_id)
+        if self.hot_cache is not None:
+            entity = self.hot_cache.get(key)
+            if entity is not None:
+                return [
+                    {"memory_id": memory_id, "score": score, "payload": payload}
+                    for memory_id, score, payload in entity.search(query_embedding, top_k, filters)
+                ]
+
+        results = await self.vector_store.search(
+            query_embedding, memory_type.value, entity_id, top_k, filters
+        )
+        # 有结果说明实体已有向量，后台载入缓存供后续检索使用
+        if self.hot_cache is not None and results:
+            self.hot_cache.schedule_load(key, lambda: self._load_entity(memory_type.value, entity_id))
+        return results
+
+    async def _load_entity(self, memory_type: str, entity_id: str) -> Optional[EntityVectors]:
+        points = await self.vector_store.scroll_entity(
+            memory_type, entity_id, self.hot_cache.max_entity_size
         )
+        if points is None:
+            return None
+
+        entity = EntityVectors(None, self.vector_store.embedding_dim)
+        entity.load(capacity=len(points))
+        for point in points:
+            entity.put(point.payload.get("memory_id", str(point.id)), point.vector, point.payload)
+        return entity
 
 
 class PostgresLogRepository(ILogRepository):
@@ -338,7 +600,7 @@ class PostgresLogRepository(ILogRepository):
         reason: str,
         metadata: Dict[str, Any]
     ) -> str:
-        async with async_session() as session:
+        async with session_scope() as session:
             log = MemoryLog(
                 id=str(uuid.uuid4()),
                 memory_id=memory_id,
@@ -348,16 +610,52 @@ class PostgresLogRepository(ILogRepository):
                 meta_info=metadata
             )
             session.add(log)
-            await session.commit()
             return log.id
 
+    async def log_many(self, entries: List[Dict[str, Any]]) -> List[str]:
+        rows = [
+            self.log_row(
+                entry["memory_id"], entry["memory_layer"], entry["action"],
+                entry["reason"], entry.get("metadata")
+            )
+            for entry in entries
+        ]
+        await self.write_rows(rows)
+        return [row["id"] for row in rows]
+
+    @staticmethod
+    def log_row(
+        memory_id: str,
+        memory_layer: MemoryLayer,
+        action: MemoryAction,
+        reason: str,
+        metadata: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """构造一条日志行，日志 ID 在写入前生成"""
+        return {
+            "id": str(uuid.uuid4()),
+            "memory_id": memory_id,
+            "memory_layer": memory_layer.value,
+            "action": action.value,
+            "reason": reason,
+            "meta_info": metadata or {},
+            "created_at": datetime.utcnow()
+        }
+
+    async def write_rows(self, rows: List[Dict[str, Any]]):
+        """一条多行 INSERT 写入日志行"""
+        if not rows:
+            return
+        async with session_scope() as session:
+            await session.execute(insert(MemoryLog), rows)
+
     async def get_logs(
         self,
         memory_id: str,
         memory_layer: Optional[MemoryLayer] = None,
         limit: int = 10
     ) -> List[Dict[str, Any]]:
-        async with async_session() as session:
+        async with session_scope() as session:
             query_stmt = select(MemoryLog).where(MemoryLog.memory_id == memory_id)
 
             if memory_layer:
@@ -389,7 +687,7 @@ class PostgresLogRepository(ILogRepository):
         reward: float,
         outcome: Dict[str, Any]
     ) -> bool:
-        async with async_session() as session:
+        async with session_scope() as session:
             result = await session.execute(
                 select(MemoryLog).where(MemoryLog.id == log_id)
             )
@@ -401,7 +699,6 @@ class PostgresLogRepository(ILogRepository):
             log.reward = reward
             log.outcome = outcome
             log.evaluated_at = datetime.utcnow()
-            await session.commit()
             return True
 
     async def get_pending_rewards(
@@ -411,7 +708,7 @@ class PostgresLogRepository(ILogRepository):
     ) -> List[Dict[str, Any]]:
         threshold_date = datetime.utcnow() - timedelta(days=days_threshold)
 
-        async with async_session() as session:
+        async with session_scope() as session:
             result = await session.execute(
                 select(MemoryLog).where(
                     MemoryLog.reward.is_(None),
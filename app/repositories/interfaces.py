@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from app.domain.enums import MemoryType, MemoryLayer, MemoryAction
+from app.domain.dto import MemoryFilterDTO, NewMemoryDTO
 
 
 class IMemoryRepository(ABC):
@@ -33,11 +34,25 @@ class IMemoryRepository(ABC):
         """存储 Event 层记忆，返回记忆 ID"""
         pass
 
+    @abstractmethod
+    async def store_many(
+        self,
+        memories: List[NewMemoryDTO],
+        embeddings: List[List[float]]
+    ) -> List[str]:
+        """批量存储记忆（可跨实体、跨记忆层），返回与输入顺序一致的记忆 ID"""
+        pass
+
     @abstractmethod
     async def get_by_id(self, memory_id: str) -> Optional[Dict[str, Any]]:
         """根据 ID 获取记忆"""
         pass
 
+    @abstractmethod
+    async def get_by_ids(self, memory_ids: List[str]) -> List[Dict[str, Any]]:
+        """一次批量获取记忆（可跨记忆层），按输入顺序返回，不存在的 ID 跳过"""
+        pass
+
     @abstractmethod
     async def get_profile(
         self,
@@ -64,8 +79,8 @@ class IMemoryRepository(ABC):
         content: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
         embedding: Optional[List[float]] = None
-    ) -> bool:
-        """更新 Profile 层记忆"""
+    ) -> Optional[Dict[str, Any]]:
+        """更新 Profile 层记忆，返回更新后的记忆；不存在时返回 None"""
         pass
 
     @abstractmethod
@@ -75,13 +90,24 @@ class IMemoryRepository(ABC):
         content: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
         embedding: Optional[List[float]] = None
-    ) -> bool:
-        """更新 Event 层记忆"""
+    ) -> Optional[Dict[str, Any]]:
+        """更新 Event 层记忆，返回更新后的记忆；不存在时返回 None"""
+        pass
+
+    @abstractmethod
+    async def update_memory(
+        self,
+        memory_id: str,
+        content: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        embedding: Optional[List[float]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """按记忆 ID 中编码的记忆层更新记忆，返回更新后的记忆；不存在时返回 None"""
         pass
 
     @abstractmethod
-    async def delete_memory(self, memory_id: str) -> bool:
-        """删除记忆"""
+    async def delete_memory(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """删除记忆，返回被删除记忆的 id、memory_type、entity_id、memory_layer；不存在时返回 None"""
         pass
 
 
@@ -97,29 +123,38 @@ class IVectorRepository(ABC):
         entity_id: str,
         metadata: Dict[str, Any]
     ) -> str:
-        """插入向量，返回向量 ID"""
+        """插入向量，返回由 memory_id 确定性派生的向量 ID"""
+        pass
+
+    @abstractmethod
+    async def insert_many(self, vectors: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量插入向量（可跨实体）
+
+        每项包含 memory_id、embedding、memory_type、entity_id、metadata，返回向量 ID 列表
+        """
         pass
 
     @abstractmethod
     async def update(
         self,
-        vector_id: str,
+        memory_id: str,
         embedding: Optional[List[float]] = None,
         memory_type: Optional[MemoryType] = None,
         entity_id: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None
     ) -> bool:
-        """更新向量"""
+        """按 memory_id 更新向量；embedding 为空时只更新 payload"""
         pass
 
     @abstractmethod
     async def delete(
         self,
-        vector_id: str,
+        memory_id: str,
         memory_type: MemoryType,
         entity_id: str
     ) -> bool:
-        """删除向量"""
+        """按 memory_id 删除向量"""
         pass
 
     @abstractmethod
@@ -128,9 +163,10 @@ class IVectorRepository(ABC):
         query_embedding: List[float],
         memory_type: MemoryType,
         entity_id: str,
-        top_k: int = 5
+        top_k: int = 5,
+        filters: Optional[MemoryFilterDTO] = None
     ) -> List[Dict[str, Any]]:
-        """搜索向量"""
+        """搜索向量；过滤条件下推到向量库，过期记忆默认排除"""
         pass
 
 
@@ -149,6 +185,15 @@ class ILogRepository(ABC):
         """记录操作日志，返回日志 ID"""
         pass
 
+    @abstractmethod
+    async def log_many(self, entries: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量记录操作日志
+
+        每项包含 memory_id、memory_layer、action、reason、metadata，返回日志 ID 列表
+        """
+        pass
+
     @abstractmethod
     async def get_logs(
         self,
@@ -186,3 +231,8 @@ class IEmbeddingService(ABC):
     async def generate(self, text: str) -> List[float]:
         """生成文本向量"""
         pass
+
+    @abstractmethod
+    async def generate_many(self, texts: List[str]) -> List[List[float]]:
+        """批量生成文本向量，返回顺序与输入一致"""
+        pass
@@ -7,10 +7,17 @@ from app.repositories.interfaces import (
     IEmbeddingService
 )
 from app.domain.enums import MemoryType, MemoryLayer, MemoryAction
-from app.domain.dto import ExtractionResultDTO, ExtractedMemoryResultDTO, MemoryDTO
+from app.domain.dto import (
+    ExtractionResultDTO, ExtractedMemoryResultDTO, MemoryDTO, MemoryFilterDTO, NewMemoryDTO
+)
 from app.core.agent import MemoryExtractor
 from app.core.rl_extractor import RLEnhancedExtractor
 from app.core.memory import EmbeddingService
+from app.core.query_cache import (
+    MemoryVersions, QueryResultCache, SemanticQueryCache,
+    get_memory_versions, get_query_result_cache, get_semantic_query_cache
+)
+from app.database.unit_of_work import unit_of_work
 from app.config import settings
 
 
@@ -23,13 +30,21 @@ class MemoryService:
         log_repo: ILogRepository,
         embedding_service: IEmbeddingService,
         extractor: Optional[MemoryExtractor] = None,
-        rl_extractor: Optional[RLEnhancedExtractor] = None
+        rl_extractor: Optional[RLEnhancedExtractor] = None,
+        vector_repo: Optional[IVectorRepository] = None,
+        query_cache: Optional[QueryResultCache] = None,
+        semantic_cache: Optional[SemanticQueryCache] = None,
+        memory_versions: Optional[MemoryVersions] = None
     ):
         self.memory_repo = memory_repo
+        self.vector_repo = vector_repo
         self.log_repo = log_repo
         self.embedding_service = embedding_service
         self.extractor = extractor or MemoryExtractor()
         self.rl_extractor = rl_extractor
+        self.query_cache = query_cache or get_query_result_cache()
+        self.semantic_cache = semantic_cache or get_semantic_query_cache()
+        self.memory_versions = memory_versions or get_memory_versions()
 
     async def store(
         self,
@@ -39,32 +54,59 @@ class MemoryService:
         memory_layer: MemoryLayer = MemoryLayer.EVENT,
         metadata: Optional[Dict[str, Any]] = None,
         is_permanent: bool = False,
-        expiry_date: Optional[datetime] = None
+        expiry_date: Optional[datetime] = None,
+        embedding: Optional[List[float]] = None
     ) -> str:
         """存储记忆"""
-        embedding = await self.embedding_service.generate(content)
+        if embedding is None:
+            embedding = await self.embedding_service.generate(content)
         metadata = metadata or {}
 
-        if memory_layer == MemoryLayer.PROFILE:
-            memory_id = await self.memory_repo.store_profile(
-                memory_type, entity_id, content, metadata, embedding
-            )
-            await self._log_and_record(
-                memory_id, MemoryLayer.PROFILE, MemoryAction.INSERT,
-                f"插入新的 {memory_layer.value} 层记忆", metadata
-            )
-        else:
-            memory_id = await self.memory_repo.store_event(
-                memory_type, entity_id, content, metadata, embedding,
-                is_permanent, expiry_date
-            )
-            await self._log_and_record(
-                memory_id, MemoryLayer.EVENT, MemoryAction.INSERT,
-                f"插入新的 {memory_layer.value} 层记忆", metadata
-            )
+        async with unit_of_work():
+            if memory_layer == MemoryLayer.PROFILE:
+                memory_id = await self.memory_repo.store_profile(
+                    memory_type, entity_id, content, metadata, embedding
+                )
+                await self._log_and_record(
+                    memory_id, MemoryLayer.PROFILE, MemoryAction.INSERT,
+                    f"插入新的 {memory_layer.value} 层记忆", metadata
+                )
+            else:
+                memory_id = await self.memory_repo.store_event(
+                    memory_type, entity_id, content, metadata, embedding,
+                    is_permanent, expiry_date
+                )
+                await self._log_and_record(
+                    memory_id, MemoryLayer.EVENT, MemoryAction.INSERT,
+                    f"插入新的 {memory_layer.value} 层记忆", metadata
+                )
 
+        self._bump_version(memory_type, entity_id)
         return memory_id
 
+    async def store_many(self, memories: List[NewMemoryDTO]) -> List[str]:
+        """批量存储记忆：一次批量生成向量（按提供商批大小切分），记忆与日志各批量写入"""
+        if not memories:
+            return []
+
+        embeddings = await self.embedding_service.generate_many([m.content for m in memories])
+        async with unit_of_work():
+            memory_ids = await self.memory_repo.store_many(memories, embeddings)
+            await self.log_repo.log_many([
+                {
+                    "memory_id": memory_id,
+                    "memory_layer": memory.memory_layer,
+                    "action": MemoryAction.INSERT,
+                    "reason": f"批量导入 {memory.memory_layer.value} 层记忆",
+                    "metadata": memory.metadata
+                }
+                for memory_id, memory in zip(memory_ids, memories)
+            ])
+
+        for memory_type, entity_id in {(m.memory_type, m.entity_id) for m in memories}:
+            self._bump_version(memory_type, entity_id)
+        return memory_ids
+
     async def extract_and_store(
         self,
         memory_type: MemoryType,
@@ -93,70 +135,81 @@ class MemoryService:
             event_count=0
         )
 
-        for mem in extracted:
-            action = mem.get("action", "insert")
-            layer = MemoryLayer(mem.get("memory_layer", "event"))
-
-            if layer == MemoryLayer.PROFILE:
-                result.profile_count += 1
-            else:
-                result.event_count += 1
-
-            if action == "ignore":
-                result.ignored += 1
-                if "memory_id" in mem:
-                    await self._log_and_record(
-                        mem["memory_id"], layer, MemoryAction.IGNORE,
-                        mem.get("reason", ""), {}
+        embeddings = await self._embed_extracted(extracted)
+
+        # 抽取与向量生成完成后再占用连接：本次抽取的所有写入共用一个会话，一次提交
+        async with unit_of_work():
+            for index, mem in enumerate(extracted):
+                action = mem.get("action", "insert")
+                layer = MemoryLayer(mem.get("memory_layer", "event"))
+
+                if layer == MemoryLayer.PROFILE:
+                    result.profile_count += 1
+                else:
+                    result.event_count += 1
+
+                if action == "ignore":
+                    result.ignored += 1
+                    if "memory_id" in mem:
+                        await self._log_and_record(
+                            mem["memory_id"], layer, MemoryAction.IGNORE,
+                            mem.get("reason", ""), {}
+                        )
+                    result.memories.append(
+                        ExtractedMemoryResultDTO(
+                            id=mem.get("memory_id", ""),
+                            action=MemoryAction.IGNORE,
+                            layer=layer,
+                            reason=mem.get("reason", "")
+                        )
                     )
-                result.memories.append(
-                    ExtractedMemoryResultDTO(
-                        id=mem.get("memory_id", ""),
-                        action=MemoryAction.IGNORE,
-                        layer=layer,
-                        reason=mem.get("reason", "")
-                    )
-                )
 
-            elif action == "update":
-                result.updated += 1
-                if "memory_id" in mem:
-                    await self._update_memory(
-                        mem["memory_id"], layer,
-                        mem.get("content"), mem.get("metadata"),
-                        mem.get("reason", "")
-                    )
-                result.memories.append(
-                    ExtractedMemoryResultDTO(
-                        id=mem.get("memory_id", ""),
-                        action=MemoryAction.UPDATE,
-                        layer=layer,
-                        reason=mem.get("reason", "")
+                elif action == "update":
+                    result.updated += 1
+                    if "memory_id" in mem:
+                        updated = await self._update_memory(
+                            mem["memory_id"],
+                            mem.get("content"), mem.get("metadata"),
+                            mem.get("reason", ""), embeddings.get(index)
+                        )
+                        # 记忆层以记忆 ID 为准，LLM 给出的层可能有误
+                        if updated:
+                            layer = MemoryLayer(updated["memory_layer"])
+                    result.memories.append(
+                        ExtractedMemoryResultDTO(
+                            id=mem.get("memory_id", ""),
+                            action=MemoryAction.UPDATE,
+                            layer=layer,
+                            reason=mem.get("reason", "")
+                        )
                     )
-                )
 
-            else:
-                result.inserted += 1
-                memory_id = await self.store(
-                    memory_type, entity_id,
-                    mem.get("content"), layer,
-                    mem.get("metadata")
-                )
-                result.memories.append(
-                    ExtractedMemoryResultDTO(
-                        id=memory_id,
-                        action=MemoryAction.INSERT,
-                        layer=layer,
-                        reason=mem.get("reason", ""),
-                        created_at=datetime.utcnow()
+                else:
+                    result.inserted += 1
+                    memory_id = await self.store(
+                        memory_type, entity_id,
+                        mem.get("content"), layer,
+                        mem.get("metadata"),
+                        embedding=embeddings.get(index)
+                    )
+                    result.memories.append(
+                        ExtractedMemoryResultDTO(
+                            id=memory_id,
+                            action=MemoryAction.INSERT,
+                            layer=layer,
+                            reason=mem.get("reason", ""),
+                            created_at=datetime.utcnow()
+                        )
                     )
-                )
 
+        # 嵌套的 store 在外层提交前已递增版本，提交后再递增一次，提交前缓存的结果随之失效
+        self._bump_version(memory_type, entity_id)
         return result
 
     async def get_by_id(self, memory_id: str) -> Optional[MemoryDTO]:
         """根据 ID 获取记忆"""
-        return await self.memory_repo.get_by_id(memory_id)
+        memory = await self.memory_repo.get_by_id(memory_id)
+        return MemoryDTO(**memory) if memory else None
 
     async def get_profile(
         self,
@@ -191,32 +244,26 @@ class MemoryService:
         content: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
         reason: Optional[str] = None
-    ) -> bool:
-        """更新记忆"""
-        memory = await self.get_by_id(memory_id)
-        if not memory:
-            return False
-
+    ) -> Optional[MemoryDTO]:
+        """更新记忆，返回更新后的记忆；记忆不存在时返回 None"""
         embedding = None
         if content:
             embedding = await self.embedding_service.generate(content)
 
-        if memory.memory_layer == MemoryLayer.PROFILE:
-            success = await self.memory_repo.update_profile(
-                memory_id, content, metadata, embedding
-            )
-        else:
-            success = await self.memory_repo.update_event(
+        async with unit_of_work():
+            memory = await self.memory_repo.update_memory(
                 memory_id, content, metadata, embedding
             )
 
-        if success:
-            await self._log_and_record(
-                memory_id, memory.memory_layer, MemoryAction.UPDATE,
-                reason or "手动更新记忆", {}
-            )
+            if memory:
+                await self._log_and_record(
+                    memory_id, MemoryLayer(memory["memory_layer"]), MemoryAction.UPDATE,
+                    reason or "手动更新记忆", {}
+                )
 
-        return success
+        if memory:
+            self._bump_version(memory["memory_type"], memory["entity_id"])
+        return MemoryDTO(**memory) if memory else None
 
     async def delete(
         self,
@@ -224,19 +271,18 @@ class MemoryService:
         reason: Optional[str] = None
     ) -> bool:
         """删除记忆"""
-        memory = await self.get_by_id(memory_id)
-        if not memory:
-            return False
+        async with unit_of_work():
+            memory = await self.memory_repo.delete_memory(memory_id)
 
-        success = await self.memory_repo.delete_memory(memory_id)
-
-        if success:
-            await self._log_and_record(
-                memory_id, memory.memory_layer, MemoryAction.DELETE,
-                reason or "手动删除记忆", {}
-            )
+            if memory:
+                await self._log_and_record(
+                    memory_id, MemoryLayer(memory["memory_layer"]), MemoryAction.DELETE,
+                    reason or "手动删除记忆", {}
+                )
 
-        return success
+        if memory:
+            self._bump_version(memory["memory_type"], memory["entity_id"])
+        return memory is not None
 
     async def get_logs(
         self,
@@ -252,15 +298,67 @@ class MemoryService:
         memory_type: MemoryType,
         entity_id: str,
         query_text: str,
-        top_k: int = 5
+        top_k: int = 5,
+        filters: Optional[MemoryFilterDTO] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
-        """查询记忆"""
-        query_embedding = await self.embedding_service.generate(query_text)
+        """查询记忆；结果缓存命中时不生成向量也不检索，语义缓存命中时不检索"""
+        cached = self.cached_query(memory_type, entity_id, query_text, top_k, filters)
+        if cached is not None:
+            return cached
+        return await self.search(memory_type, entity_id, query_text, top_k, filters, query_embedding)
 
-        vector_results = await self.memory_repo.search(
-            query_embedding, memory_type, entity_id, top_k
-        )
+    def cached_query(
+        self,
+        memory_type: MemoryType,
+        entity_id: str,
+        query_text: str,
+        top_k: int = 5,
+        filters: Optional[MemoryFilterDTO] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """查找结果缓存；未开启缓存、未命中或已失效时返回 None"""
+        if self.query_cache is None:
+            return None
+        version = self.memory_versions.version(memory_type.value, entity_id)
+        return self.query_cache.get(memory_type.value, entity_id, query_text, top_k, filters, version)
+
+    async def search(
+        self,
+        memory_type: MemoryType,
+        entity_id: str,
+        query_text: str,
+        top_k: int = 5,
+        filters: Optional[MemoryFilterDTO] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        向量检索并写入查询缓存；过滤条件（记忆层、时间窗口、重要性、过期）在向量库内执行，
+        已有查询向量时不再重复生成。检索开始前读取实体记忆版本，检索期间有写入时结果不缓存
+        """
+        version = self.memory_versions.version(memory_type.value, entity_id)
+
+        if query_embedding is None:
+            query_embedding = await self.embedding_service.generate(query_text)
+
+        vector_results = None
+        if self.semantic_cache is not None:
+            vector_results = self.semantic_cache.get(
+                memory_type.value, entity_id, top_k, filters, version, query_embedding
+            )
 
+        if vector_results is None:
+            vector_results = await self.vector_repo.search(
+                query_embedding, memory_type, entity_id, top_k, filters
+            )
+            if self.semantic_cache is not None and self._version_unchanged(memory_type, entity_id, version):
+                self.semantic_cache.put(
+                    memory_type.value, entity_id, top_k, filters, version, query_embedding, vector_results
+                )
+
+        if self.query_cache is not None and self._version_unchanged(memory_type, entity_id, version):
+            self.query_cache.put(
+                memory_type.value, entity_id, query_text, top_k, filters, version, vector_results
+            )
         return vector_results
 
     async def _get_existing_memories(
@@ -291,6 +389,32 @@ class MemoryService:
 
         return memories
 
+    async def _embed_extracted(
+        self,
+        extracted: List[Dict[str, Any]]
+    ) -> Dict[int, List[float]]:
+        """一次批量调用为所有需要写入的抽取结果生成向量，按下标返回"""
+        indexes = [
+            i for i, mem in enumerate(extracted)
+            if mem.get("action", "insert") != "ignore"
+            and mem.get("content")
+            and (mem.get("action", "insert") != "update" or "memory_id" in mem)
+        ]
+        if not indexes:
+            return {}
+
+        embeddings = await self.embedding_service.generate_many(
+            [extracted[i]["content"] for i in indexes]
+        )
+        return dict(zip(indexes, embeddings))
+
+    def _bump_version(self, memory_type, entity_id: str):
+        """记忆写入提交后调用，使该实体缓存的查询结果失效"""
+        self.memory_versions.bump(MemoryType(memory_type).value, entity_id)
+
+    def _version_unchanged(self, memory_type: MemoryType, entity_id: str, version: int) -> bool:
+        return self.memory_versions.version(memory_type.value, entity_id) == version
+
     async def _log_and_record(
         self,
         memory_id: str,
@@ -307,23 +431,21 @@ class MemoryService:
     async def _update_memory(
         self,
         memory_id: str,
-        layer: MemoryLayer,
         content: Optional[str],
         metadata: Optional[Dict[str, Any]],
-        reason: str
-    ):
-        """更新记忆的内部方法"""
-        embedding = None
-        if content:
+        reason: str,
+        embedding: Optional[List[float]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """更新记忆的内部方法，按记忆 ID 中编码的记忆层定位；记忆不存在时返回 None"""
+        if embedding is None and content:
             embedding = await self.embedding_service.generate(content)
 
-        if layer == MemoryLayer.PROFILE:
-            await self.memory_repo.update_profile(
-                memory_id, content, metadata, embedding
-            )
-        else:
-            await self.memory_repo.update_event(
-                memory_id, content, metadata, embedding
-            )
+        memory = await self.memory_repo.update_memory(
+            memory_id, content, metadata, embedding
+        )
 
-        await self._log_and_record(memory_id, layer, MemoryAction.UPDATE, reason, {})
+        if memory:
+            await self._log_and_record(
+                memory_id, MemoryLayer(memory["memory_layer"]), MemoryAction.UPDATE, reason, {}
+            )
+        return memory
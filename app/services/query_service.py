@@ -1,6 +1,11 @@
 from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
 from app.services.memory_service import MemoryService
 from app.domain.enums import MemoryType, MemoryLayer
+from app.domain.dto import MemoryFilterDTO, QueryItemDTO
+from app.core.query_cache import filters_key
+from app.config import settings
+import asyncio
 
 
 class QueryService:
@@ -19,58 +24,164 @@ class QueryService:
         query_text: str,
         user_id: Optional[str] = None,
         agent_id: Optional[str] = None,
-        top_k: int = 5
+        top_k: int = 5,
+        filters: Optional[MemoryFilterDTO] = None
     ) -> Dict[str, Any]:
-        """融合查询用户和 Agent 记忆"""
-        user_memories = []
-        agent_memories = []
+        """融合查询用户和 Agent 记忆（单条批量查询）"""
+        results = await self.query_many([
+            QueryItemDTO(query=query_text, user_id=user_id, agent_id=agent_id, top_k=top_k, filters=filters)
+        ])
+        return results[0]
 
-        if user_id and self.user_memory_service:
-            user_memories = await self.user_memory_service.query(
-                MemoryType.USER, user_id, query_text, top_k
-            )
+    async def query_many(self, items: List[QueryItemDTO]) -> List[Dict[str, Any]]:
+        """
+        批量融合查询，结果与输入顺序一致
 
-        if agent_id and self.agent_memory_service:
-            agent_memories = await self.agent_memory_service.query(
-                MemoryType.AGENT, agent_id, query_text, top_k
-            )
+        先查结果缓存；未命中的分支中不同的查询文本一次批量生成向量，相同的检索只做一次，
+        检索在 QUERY_BATCH_CONCURRENCY 的并发上限内进行。各条按相似度融合排序后，
+        所有命中一次批量从数据库取回记忆内容。
+        """
+        hits = [{MemoryType.USER: [], MemoryType.AGENT: []} for _ in items]
+        searches: Dict[tuple, List[int]] = {}
+        memory_repo = None
+        for index, item in enumerate(items):
+            for service, memory_type, entity_id in self._branches(item):
+                memory_repo = service.memory_repo
+                cached = service.cached_query(memory_type, entity_id, item.query, item.top_k, item.filters)
+                if cached is not None:
+                    hits[index][memory_type] = cached
+                    continue
+                key = (memory_type, entity_id, item.query, item.top_k, filters_key(item.filters))
+                searches.setdefault(key, []).append(index)
+
+        if searches:
+            services = {memory_type: service for service, memory_type in self._services()}
+            texts = list(dict.fromkeys(key[2] for key in searches))
+            embeddings = dict(zip(
+                texts, await next(iter(services.values())).embedding_service.generate_many(texts)
+            ))
+            semaphore = asyncio.Semaphore(settings.QUERY_BATCH_CONCURRENCY)
+
+            async def search(key: tuple, indexes: List[int]):
+                memory_type, entity_id, query_text, top_k, _ = key
+                async with semaphore:
+                    results = await services[memory_type].search(
+                        memory_type, entity_id, query_text, top_k,
+                        items[indexes[0]].filters, embeddings[query_text]
+                    )
+                for index in indexes:
+                    hits[index][memory_type] = results
+
+            await asyncio.gather(*(search(key, indexes) for key, indexes in searches.items()))
+
+        ranked = [self._fuse_and_rank(h[MemoryType.USER], h[MemoryType.AGENT]) for h in hits]
+        fused = await self._hydrate(memory_repo, ranked) if memory_repo is not None else ranked
 
-        fused = self._fuse_and_rank(user_memories, agent_memories)
-        recommendations = self._generate_recommendations(query_text, fused)
+        return [
+            {
+                "query": item.query,
+                "user_memories": [m for m in memories if m["entity_type"] == MemoryType.USER.value],
+                "agent_memories": [m for m in memories if m["entity_type"] == MemoryType.AGENT.value],
+                "fused_context": memories,
+                "recommendations": self._generate_recommendations(item.query, memories)
+            }
+            for item, memories in zip(items, fused)
+        ]
 
-        return {
-            "query": query_text,
-            "user_memories": user_memories,
-            "agent_memories": agent_memories,
-            "fused_context": fused,
-            "recommendations": recommendations
-        }
+    def _services(self):
+        if self.user_memory_service:
+            yield self.user_memory_service, MemoryType.USER
+        if self.agent_memory_service:
+            yield self.agent_memory_service, MemoryType.AGENT
+
+    def _branches(self, item: QueryItemDTO):
+        """一条查询需要检索的 (记忆服务, 记忆类型, 实体 ID)"""
+        entity_ids = {MemoryType.USER: item.user_id, MemoryType.AGENT: item.agent_id}
+        for service, memory_type in self._services():
+            if entity_ids[memory_type]:
+                yield service, memory_type, entity_ids[memory_type]
 
     def _fuse_and_rank(
         self,
-        user_memories: List[Dict[str, Any]],
-        agent_memories: List[Dict[str, Any]]
+        user_hits: List[Dict[str, Any]],
+        agent_hits: List[Dict[str, Any]],
+        now: Optional[float] = None
     ) -> List[Dict[str, Any]]:
-        """融合和排序记忆"""
+        """
+        融合和排序记忆
+
+        两个分支的相似度来自不同集合，不能直接比较：rrf 按分支内排名打分（首位为 1），
+        score 把分支内相似度 min-max 归一化到 [0, 1]。再叠加 payload 中的创建时间
+        （指数衰减）与重要性（1~5 线性）加分，按融合得分降序返回。
+        """
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
         fused = []
+        for memory_type, hits in ((MemoryType.USER, user_hits), (MemoryType.AGENT, agent_hits)):
+            for hit, base in zip(hits, self._base_scores(hits)):
+                payload = hit.get("payload") or {}
+                fused.append({
+                    "id": hit["memory_id"],
+                    "entity_type": memory_type.value,
+                    "score": base + self._recency_boost(payload, now) + self._importance_boost(payload)
+                })
+
+        return sorted(fused, key=lambda x: x["score"], reverse=True)
+
+    @staticmethod
+    def _base_scores(hits: List[Dict[str, Any]]) -> List[float]:
+        if settings.QUERY_FUSION_METHOD == "score":
+            scores = [hit["score"] for hit in hits]
+            if not scores:
+                return []
+            low, high = min(scores), max(scores)
+            if high == low:
+                return [1.0] * len(scores)
+            return [(score - low) / (high - low) for score in scores]
+
+        k = settings.QUERY_RRF_K
+        return [(k + 1) / (k + rank + 1) for rank in range(len(hits))]
+
+    @staticmethod
+    def _recency_boost(payload: Dict[str, Any], now: float) -> float:
+        created_at = payload.get("created_at")
+        if not settings.QUERY_RECENCY_WEIGHT or created_at is None:
+            return 0.0
+        age_days = max(now - created_at, 0.0) / 86400
+        return settings.QUERY_RECENCY_WEIGHT * 0.5 ** (age_days / settings.QUERY_RECENCY_HALF_LIFE_DAYS)
 
-        for mem in user_memories:
-            fused.append({
-                "id": mem.get("id"),
-                "content": mem.get("content"),
-                "type": "user",
-                "created_at": mem.get("created_at")
-            })
+    @staticmethod
+    def _importance_boost(payload: Dict[str, Any]) -> float:
+        try:
+            importance = min(max(int(payload.get("importance", 3)), 1), 5)
+        except (TypeError, ValueError):
+            importance = 3
+        return settings.QUERY_IMPORTANCE_WEIGHT * (importance - 1) / 4
 
-        for mem in agent_memories:
-            fused.append({
-                "id": mem.get("id"),
-                "content": mem.get("content"),
-                "type": "agent",
-                "created_at": mem.get("created_at")
-            })
+    async def _hydrate(self, memory_repo, ranked: List[List[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+        """所有查询的命中一次批量取回内容与元数据；数据库中已不存在的命中（向量残留）丢弃"""
+        memory_ids = list(dict.fromkeys(item["id"] for items in ranked for item in items))
+        memories = await memory_repo.get_by_ids(memory_ids) if memory_ids else []
+        by_id = {memory["id"]: memory for memory in memories}
 
-        return sorted(fused, key=lambda x: x.get("created_at", ""), reverse=True)
+        results = []
+        for items in ranked:
+            hydrated = []
+            for item in items:
+                memory = by_id.get(item["id"])
+                if memory is None:
+                    continue
+                hydrated.append({
+                    "id": item["id"],
+                    "entity_id": memory["entity_id"],
+                    "entity_type": item["entity_type"],
+                    "memory_layer": memory["memory_layer"],
+                    "content": memory["content"],
+                    "metadata": memory["metadata"] or {},
+                    "created_at": memory["created_at"],
+                    "score": item["score"]
+                })
+            results.append(hydrated)
+        return results
 
     def _generate_recommendations(
         self,
@@ -85,7 +196,7 @@ class QueryService:
         for item in context[:3]:
             content = item.get("content", "")[:100]
             recommendations.append(
-                f"Related {item['type']} memory: {content}..."
+                f"Related {item['entity_type']} memory: {content}..."
             )
 
         return recommendations
@@ -0,0 +1,123 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from typing import List, Dict, Any, Tuple
+from sqlalchemy import select
+from qdrant_client.models import (
+    Filter, IsEmptyCondition, PayloadField, OverwritePayloadOperation, SetPayload
+)
+from app.database.models import ProfileMemory, EventMemory, async_session
+from app.database.vector_store import QdrantStore, get_qdrant_client, close_qdrant_client, vector_metadata
+import asyncio
+
+SCROLL_BATCH_SIZE = 256
+
+LAYER_MODELS = {"profile": ProfileMemory, "event": EventMemory}
+
+# 缺少其中任一字段的点是过滤下推之前写入的，过滤检索会漏掉它们
+_LEGACY_FILTER = Filter(should=[
+    IsEmptyCondition(is_empty=PayloadField(key="created_at")),
+    IsEmptyCondition(is_empty=PayloadField(key="importance")),
+    IsEmptyCondition(is_empty=PayloadField(key="memory_layer")),
+])
+
+
+async def _load_memories(memory_ids: List[str]) -> Dict[str, Tuple[str, Any]]:
+    """按主键读取记忆行，返回 memory_id -> (记忆层, 记忆)"""
+    memories = {}
+    if not memory_ids:
+        return memories
+    async with async_session() as session:
+        for layer, model in LAYER_MODELS.items():
+            result = await session.execute(select(model).where(model.id.in_(memory_ids)))
+            for memory in result.scalars().all():
+                memories[memory.id] = (layer, memory)
+    return memories
+
+
+def memory_payload(layer: str, memory: Any) -> Dict[str, Any]:
+    """由记忆行生成完整的向量 payload，与写入路径一致"""
+    metadata = vector_metadata(
+        memory.meta_info, layer, memory.created_at, getattr(memory, "expiry_date", None)
+    )
+    return QdrantStore.build_payload(memory.id, memory.memory_type, memory.entity_id, metadata)
+
+
+async def backfill_collection(client, collection_name: str, dry_run: bool = False) -> Tuple[int, int]:
+    """
+    为一个集合中的旧点补写 payload，返回 (已补写数量, 找不到记忆行的数量)
+
+    只 scroll 缺少过滤字段的点，按 payload 中的 memory_id 读取 PostgreSQL 的记忆行，
+    以覆盖方式写入完整 payload（记忆层、created_at、expiry_at、整数 importance、实体字段）。
+    找不到记忆行的点是孤儿，留给 scripts/reconcile_vectors.py 处理。
+    """
+    filled = orphans = 0
+    offset = None
+    while True:
+        points, offset = await client.scroll(
+            collection_name=collection_name,
+            scroll_filter=_LEGACY_FILTER,
+            limit=SCROLL_BATCH_SIZE,
+            offset=offset,
+            with_payload=["memory_id"],
+            with_vectors=False
+        )
+
+        memory_ids = {str(p.id): (p.payload or {}).get("memory_id") for p in points}
+        memories = await _load_memories([m for m in memory_ids.values() if m])
+        operations = []
+        for point_id, memory_id in memory_ids.items():
+            if memory_id not in memories:
+                orphans += 1
+                continue
+            operations.append(OverwritePayloadOperation(overwrite_payload=SetPayload(
+                payload=memory_payload(*memories[memory_id]), points=[point_id]
+            )))
+
+        if operations and not dry_run:
+            await client.batch_update_points(collection_name=collection_name, update_operations=operations)
+        filled += len(operations)
+
+        if offset is None:
+            return filled, orphans
+
+
+async def backfill(dry_run: bool = False):
+    """
+    补齐过滤下推之前写入的向量 payload，并为已有集合创建过滤检索所需的 payload 索引
+
+    补写后的点不再匹配缺字段的条件，中断后可直接重跑。
+    """
+    client = get_qdrant_client()
+    store = QdrantStore(client)
+    try:
+        for collection_name in await store.memory_collections():
+            if not dry_run:
+                await store.ensure_payload_indexes(collection_name)
+            filled, orphans = await backfill_collection(client, collection_name, dry_run)
+            action = "待补写" if dry_run else "已补写"
+            print(f"{collection_name}: {action} {filled} 个点，{orphans} 个点找不到记忆行")
+    finally:
+        await close_qdrant_client()
+
+    print("检查完成！" if dry_run else "payload 回填完成！")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法:")
+        print("  python backfill_vector_payloads.py backfill  # 补写旧点的过滤字段并创建 payload 索引")
+        print("  python backfill_vector_payloads.py status    # 只统计待补写数量")
+        sys.exit(1)
+
+    command = sys.argv[1].lower()
+
+    if command == "backfill":
+        asyncio.run(backfill())
+    elif command == "status":
+        asyncio.run(backfill(dry_run=True))
+    else:
+        print(f"未知命令: {command}")
+        sys.exit(1)
@@ -0,0 +1,100 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, VectorParams, PointStruct
+from app.config import settings
+import numpy as np
+import asyncio
+import time
+
+COLLECTION = f"{settings.QDRANT_COLLECTION_PREFIX}_bench_transport"
+TOP_KS = [5, 20, 100]
+
+
+def _make_client(prefer_grpc: bool) -> AsyncQdrantClient:
+    return AsyncQdrantClient(
+        url=settings.QDRANT_URL,
+        prefer_grpc=prefer_grpc,
+        grpc_port=settings.QDRANT_GRPC_PORT,
+        pool_size=settings.QDRANT_POOL_SIZE,
+        timeout=settings.QDRANT_TIMEOUT
+    )
+
+
+async def prepare_collection(client: AsyncQdrantClient, num_vectors: int, dim: int):
+    """写入随机向量作为基准数据"""
+    if await client.collection_exists(COLLECTION):
+        await client.delete_collection(COLLECTION)
+    await client.create_collection(
+        collection_name=COLLECTION,
+        vectors_config=VectorParams(size=dim, distance=Distance.COSINE)
+    )
+
+    rng = np.random.default_rng(42)
+    batch_size = 1000
+    for start in range(0, num_vectors, batch_size):
+        vectors = rng.standard_normal((min(batch_size, num_vectors - start), dim), dtype=np.float32)
+        await client.upsert(
+            collection_name=COLLECTION,
+            points=[
+                PointStruct(id=start + i, vector=vector.tolist(), payload={"memory_id": f"bench_{start + i}"})
+                for i, vector in enumerate(vectors)
+            ]
+        )
+
+
+async def measure(client: AsyncQdrantClient, queries: np.ndarray, top_k: int, concurrency: int):
+    """并发执行检索，返回每次调用的耗时（毫秒）与总吞吐"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(query):
+        async with semaphore:
+            started = time.perf_counter()
+            await client.query_points(
+                collection_name=COLLECTION, query=query.tolist(), limit=top_k, with_payload=True
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    elapsed = time.perf_counter() - started
+    return np.array(latencies), len(queries) / elapsed
+
+
+async def run_benchmark(num_vectors: int = 20000, num_queries: int = 500, concurrency: int = 16):
+    dim = settings.embedding_dim
+    rest = _make_client(prefer_grpc=False)
+    grpc = _make_client(prefer_grpc=True)
+
+    print(f"准备基准数据: {num_vectors} 条 {dim} 维向量")
+    await prepare_collection(rest, num_vectors, dim)
+
+    queries = np.random.default_rng(7).standard_normal((num_queries, dim), dtype=np.float32)
+
+    print(f"\n{'transport':<10}{'top_k':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'qps':>10}")
+    try:
+        for top_k in TOP_KS:
+            for name, client in (("rest", rest), ("grpc", grpc)):
+                # 预热，建立连接
+                await measure(client, queries[:20], top_k, concurrency)
+                latencies, qps = await measure(client, queries, top_k, concurrency)
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                print(f"{name:<10}{top_k:>6}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}{qps:>10.0f}")
+    finally:
+        await rest.delete_collection(COLLECTION)
+        await rest.close()
+        await grpc.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+        print("用法:")
+        print("  python scripts/bench_qdrant_transport.py [向量数] [查询数] [并发数]")
+        sys.exit(0)
+
+    args = [int(a) for a in sys.argv[1:4]]
+    asyncio.run(run_benchmark(*args))
@@ -0,0 +1,122 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, VectorParams, PointStruct, HnswConfigDiff
+from app.config import settings
+from app.database.vector_store import quantization_config, search_params
+import numpy as np
+import asyncio
+import time
+
+COLLECTION = f"{settings.QDRANT_COLLECTION_PREFIX}_bench_tuning"
+TOP_K = 10
+
+# (名称, 量化方式, 原始向量落盘, 重打分, oversampling)
+CONFIGS = [
+    ("float32", "none", False, False, 1.0),
+    ("scalar", "scalar", False, False, 1.0),
+    ("scalar+rescore", "scalar", True, True, 2.0),
+    ("binary+rescore", "binary", True, True, 3.0),
+]
+
+
+def estimate_memory_mb(dim: int, quantization: str, on_disk: bool, m: int, num_vectors: int = 1_000_000) -> float:
+    """估算常驻内存：原始向量 + 量化向量 + HNSW 第 0 层邻接表（2m 个 u32）"""
+    per_vector = 0 if on_disk else dim * 4
+    if quantization == "scalar":
+        per_vector += dim
+    elif quantization == "binary":
+        per_vector += dim / 8
+    per_vector += 2 * m * 4
+    return per_vector * num_vectors / 1024 / 1024
+
+
+async def wait_indexed(client: AsyncQdrantClient):
+    """等待索引与量化构建完成"""
+    while True:
+        info = await client.get_collection(COLLECTION)
+        if info.status == "green":
+            return
+        await asyncio.sleep(0.5)
+
+
+async def prepare_collection(client: AsyncQdrantClient, vectors: np.ndarray, quantization: str, on_disk: bool):
+    if await client.collection_exists(COLLECTION):
+        await client.delete_collection(COLLECTION)
+    await client.create_collection(
+        collection_name=COLLECTION,
+        vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.COSINE, on_disk=on_disk),
+        hnsw_config=HnswConfigDiff(m=settings.QDRANT_HNSW_M, ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT),
+        quantization_config=quantization_config(quantization)
+    )
+
+    batch_size = 1000
+    for start in range(0, len(vectors), batch_size):
+        await client.upsert(
+            collection_name=COLLECTION,
+            points=[
+                PointStruct(id=start + i, vector=vector.tolist())
+                for i, vector in enumerate(vectors[start:start + batch_size])
+            ]
+        )
+    await wait_indexed(client)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, top_k: int) -> np.ndarray:
+    """暴力计算余弦相似度，作为召回率的基准"""
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = q @ normalized.T
+    return np.argsort(-scores, axis=1)[:, :top_k]
+
+
+async def run_benchmark(num_vectors: int = 100000, num_queries: int = 200, hnsw_ef: int = 0):
+    dim = settings.embedding_dim
+    rng = np.random.default_rng(42)
+    # 在少量簇中心附近采样，比均匀随机向量更接近真实 embedding 的分布
+    centers = rng.standard_normal((64, dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, 64, num_vectors)] + 0.3 * rng.standard_normal((num_vectors, dim), dtype=np.float32)
+    queries = centers[rng.integers(0, 64, num_queries)] + 0.3 * rng.standard_normal((num_queries, dim), dtype=np.float32)
+
+    print(f"计算精确检索基准: {num_vectors} 条 {dim} 维向量, {num_queries} 条查询")
+    truth = exact_top_k(vectors, queries, TOP_K)
+
+    client = AsyncQdrantClient(url=settings.QDRANT_URL, timeout=300)
+    print(f"\n{'config':<16}{'recall@' + str(TOP_K):>10}{'MB/1M':>10}{'p50(ms)':>10}{'p95(ms)':>10}")
+    try:
+        for name, quantization, on_disk, rescore, oversampling in CONFIGS:
+            await prepare_collection(client, vectors, quantization, on_disk)
+            params = search_params(quantization, hnsw_ef, rescore, oversampling)
+
+            latencies = []
+            recalls = []
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                response = await client.query_points(
+                    collection_name=COLLECTION, query=query.tolist(), limit=TOP_K, search_params=params
+                )
+                latencies.append((time.perf_counter() - started) * 1000)
+                found = {point.id for point in response.points}
+                recalls.append(len(found & set(expected.tolist())) / TOP_K)
+
+            p50, p95 = np.percentile(latencies, [50, 95])
+            memory = estimate_memory_mb(dim, quantization, on_disk, settings.QDRANT_HNSW_M)
+            print(f"{name:<16}{np.mean(recalls):>10.3f}{memory:>10.0f}{p50:>10.2f}{p95:>10.2f}")
+    finally:
+        if await client.collection_exists(COLLECTION):
+            await client.delete_collection(COLLECTION)
+        await client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+        print("用法:")
+        print("  python scripts/bench_qdrant_tuning.py [向量数] [查询数] [检索 ef]")
+        print("输出各配置的 recall@10、每百万向量的常驻内存估算与检索延迟")
+        sys.exit(0)
+
+    args = [int(a) for a in sys.argv[1:4]]
+    asyncio.run(run_benchmark(*args))
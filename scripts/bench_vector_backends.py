@@ -0,0 +1,127 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+from qdrant_client.models import Filter, FieldCondition, MatchValue, FilterSelector
+from app.config import settings
+from app.database.models import async_session
+from app.database.vector_store import QdrantStore, close_qdrant_client
+from app.repositories.impl.postgres_repository import PostgresMemoryRepository, QdrantVectorRepository
+from app.repositories.impl.pgvector_repository import (
+    PgvectorMemoryRepository, PgvectorVectorRepository, LAYER_TABLES
+)
+from app.domain.enums import MemoryType
+import numpy as np
+import asyncio
+import time
+
+SIZES = [10000, 100000, 1000000]
+MEMORY_TYPE = MemoryType.AGENT
+
+
+def _backends():
+    return {
+        "qdrant": (PostgresMemoryRepository(), QdrantVectorRepository()),
+        "pgvector": (PgvectorMemoryRepository(), PgvectorVectorRepository()),
+    }
+
+
+async def insert_vectors(memory_repo, entity_id: str, vectors: np.ndarray, concurrency: int) -> float:
+    """按服务端真实写入路径（记忆行 + 向量）并发写入，返回每秒写入条数"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i, vector):
+        async with semaphore:
+            await memory_repo.store_event(
+                MEMORY_TYPE, entity_id, f"bench memory {i}", {"importance": i % 5 + 1}, vector.tolist()
+            )
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i, v) for i, v in enumerate(vectors)))
+    return len(vectors) / (time.perf_counter() - started)
+
+
+async def measure_search(vector_repo, entity_id: str, queries: np.ndarray, top_k: int, concurrency: int):
+    """并发检索，返回每次调用的耗时（毫秒）与总吞吐"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(query):
+        async with semaphore:
+            started = time.perf_counter()
+            await vector_repo.search(query.tolist(), MEMORY_TYPE, entity_id, top_k)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    elapsed = time.perf_counter() - started
+    return np.array(latencies), len(queries) / elapsed
+
+
+async def cleanup(entity_id: str):
+    """删除基准数据：记忆行，以及 Qdrant 中该实体的点"""
+    async with async_session() as session:
+        for table in LAYER_TABLES.values():
+            await session.execute(text(f"DELETE FROM {table} WHERE entity_id = :entity_id"), {"entity_id": entity_id})
+        await session.commit()
+
+    store = QdrantStore()
+    collection_name = store._get_collection_name(MEMORY_TYPE.value, entity_id)
+    if await store.client.collection_exists(collection_name):
+        await store.client.delete(
+            collection_name=collection_name,
+            points_selector=FilterSelector(filter=Filter(must=[
+                FieldCondition(key="entity_id", match=MatchValue(value=entity_id))
+            ]))
+        )
+
+
+async def run_benchmark(sizes=SIZES, num_queries: int = 500, concurrency: int = 32, top_k: int = 10):
+    dim = settings.embedding_dim
+    rng = np.random.default_rng(42)
+    queries = rng.standard_normal((num_queries, dim), dtype=np.float32)
+
+    print(f"{'backend':<10}{'vectors':>10}{'insert/s':>12}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'qps':>10}")
+    try:
+        for size in sizes:
+            vectors = rng.standard_normal((size, dim), dtype=np.float32)
+            for name, (memory_repo, vector_repo) in _backends().items():
+                entity_id = f"bench_{name}_{size}"
+                await cleanup(entity_id)
+                try:
+                    insert_rate = await insert_vectors(memory_repo, entity_id, vectors, concurrency)
+                    vector_store = getattr(vector_repo, "vector_store", None)
+                    write_buffer = getattr(vector_store, "write_buffer", None)
+                    if write_buffer is not None:
+                        # 等写入缓冲落盘后再测检索
+                        await write_buffer.flush()
+
+                    # 预热
+                    await measure_search(vector_repo, entity_id, queries[:20], top_k, concurrency)
+                    latencies, qps = await measure_search(vector_repo, entity_id, queries, top_k, concurrency)
+                    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                    print(f"{name:<10}{size:>10}{insert_rate:>12.0f}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}{qps:>10.0f}")
+                finally:
+                    await cleanup(entity_id)
+    finally:
+        await close_qdrant_client()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+        print("用法:")
+        print("  python scripts/bench_vector_backends.py [向量数,...] [查询数] [并发数]")
+        print("  例: python scripts/bench_vector_backends.py 10000,100000,1000000 500 32")
+        print("需要先执行 scripts/migrate_pgvector.py migrate")
+        sys.exit(0)
+
+    kwargs = {}
+    if len(sys.argv) > 1:
+        kwargs["sizes"] = [int(s) for s in sys.argv[1].split(",")]
+    if len(sys.argv) > 2:
+        kwargs["num_queries"] = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        kwargs["concurrency"] = int(sys.argv[3])
+    asyncio.run(run_benchmark(**kwargs))
@@ -0,0 +1,111 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+from app.config import settings
+from app.database.models import engine, async_session
+from app.database.vector_store import QdrantStore, get_qdrant_client, close_qdrant_client
+from app.repositories.impl.pgvector_repository import LAYER_TABLES, to_vector_literal
+import asyncio
+
+SCROLL_BATCH_SIZE = 256
+
+
+async def migrate():
+    """
+    启用 pgvector：安装扩展、为记忆表添加 vector 列并建立 HNSW 索引
+
+    索引使用 CREATE INDEX CONCURRENTLY，不阻塞写入；所有语句幂等，可重复执行。
+    """
+    dim = settings.embedding_dim
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with autocommit.connect() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        for layer, table in LAYER_TABLES.items():
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS embedding vector({dim})"))
+            print(f"{table}: 已添加 embedding vector({dim}) 列")
+
+            await conn.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_{layer}_embedding_hnsw "
+                f"ON {table} USING hnsw (embedding vector_cosine_ops) "
+                f"WITH (m = {settings.PGVECTOR_HNSW_M}, ef_construction = {settings.PGVECTOR_HNSW_EF_CONSTRUCTION})"
+            ))
+            print(f"{table}: 已建立 HNSW 索引 idx_{layer}_embedding_hnsw")
+
+    print("pgvector 迁移完成！")
+
+
+async def backfill():
+    """从 Qdrant 回填向量到记忆表的 vector 列（切换 VECTOR_BACKEND 前执行）"""
+    client = get_qdrant_client()
+    try:
+        for collection_name in await QdrantStore(client).memory_collections():
+            filled = 0
+            offset = None
+            while True:
+                points, offset = await client.scroll(
+                    collection_name=collection_name,
+                    limit=SCROLL_BATCH_SIZE,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True
+                )
+
+                rows = {layer: [] for layer in LAYER_TABLES}
+                for point in points:
+                    payload = point.payload or {}
+                    layer = payload.get("memory_layer")
+                    if layer in rows and payload.get("memory_id"):
+                        rows[layer].append({"id": payload["memory_id"], "embedding": to_vector_literal(point.vector)})
+
+                async with async_session() as session:
+                    for layer, params in rows.items():
+                        if params:
+                            await session.execute(
+                                text(f"UPDATE {LAYER_TABLES[layer]} SET embedding = CAST(:embedding AS vector) WHERE id = :id"),
+                                params
+                            )
+                            filled += len(params)
+                    await session.commit()
+
+                if offset is None:
+                    break
+
+            print(f"{collection_name}: 已回填 {filled} 条向量")
+    finally:
+        await close_qdrant_client()
+
+    print("向量回填完成！")
+
+
+async def status():
+    async with async_session() as session:
+        for table in LAYER_TABLES.values():
+            result = await session.execute(text(
+                f"SELECT count(*), count(embedding) FROM {table}"
+            ))
+            total, with_vector = result.one()
+            print(f"{table}: {with_vector}/{total} 条记忆已有向量")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法:")
+        print("  python migrate_pgvector.py migrate   # 安装扩展、添加 vector 列并建立 HNSW 索引")
+        print("  python migrate_pgvector.py backfill  # 从 Qdrant 回填已有向量")
+        print("  python migrate_pgvector.py status    # 查看向量覆盖情况")
+        sys.exit(1)
+
+    command = sys.argv[1].lower()
+
+    if command == "migrate":
+        asyncio.run(migrate())
+    elif command == "backfill":
+        asyncio.run(backfill())
+    elif command == "status":
+        asyncio.run(status())
+    else:
+        print(f"未知命令: {command}")
+        sys.exit(1)
@@ -0,0 +1,105 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import update
+from qdrant_client.models import PointStruct
+from app.database.models import ProfileMemory, EventMemory, async_session
+from app.database.vector_store import QdrantStore, get_qdrant_client, close_qdrant_client, point_id_for
+import asyncio
+
+SCROLL_BATCH_SIZE = 256
+
+
+async def _update_embedding_ids(points):
+    """回写 PostgreSQL 中的 embedding_id；按 payload 中的记忆层分表、按主键批量更新"""
+    profile_rows, event_rows = [], []
+    for point in points:
+        memory_id = point.payload["memory_id"]
+        row = {"id": memory_id, "embedding_id": point_id_for(memory_id)}
+        if point.payload.get("memory_layer") == "profile":
+            profile_rows.append(row)
+        else:
+            event_rows.append(row)
+
+    async with async_session() as session:
+        if profile_rows:
+            await session.execute(update(ProfileMemory), profile_rows)
+        if event_rows:
+            await session.execute(update(EventMemory), event_rows)
+        await session.commit()
+
+
+async def migrate_point_ids(dry_run: bool = False):
+    """
+    把随机 UUID 点 ID 回填为由 memory_id 派生的确定性 ID
+
+    逐集合 scroll，对 ID 不匹配的点以新 ID 重新写入并删除旧点，同时回写
+    PostgreSQL 的 embedding_id。已迁移的点会被跳过，中断后可直接重跑。
+    """
+    client = get_qdrant_client()
+    try:
+        for collection_name in await QdrantStore(client).memory_collections():
+            migrated = 0
+            offset = None
+            while True:
+                points, offset = await client.scroll(
+                    collection_name=collection_name,
+                    limit=SCROLL_BATCH_SIZE,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True
+                )
+
+                stale = [
+                    p for p in points
+                    if p.payload and p.payload.get("memory_id")
+                    and str(p.id) != point_id_for(p.payload["memory_id"])
+                ]
+                if stale and not dry_run:
+                    await client.upsert(
+                        collection_name=collection_name,
+                        points=[
+                            PointStruct(
+                                id=point_id_for(p.payload["memory_id"]),
+                                vector=p.vector,
+                                payload=p.payload
+                            )
+                            for p in stale
+                        ]
+                    )
+                    await client.delete(
+                        collection_name=collection_name,
+                        points_selector=[p.id for p in stale]
+                    )
+                    await _update_embedding_ids(stale)
+                migrated += len(stale)
+
+                if offset is None:
+                    break
+
+            action = "待迁移" if dry_run else "已迁移"
+            print(f"{collection_name}: {action} {migrated} 个点")
+    finally:
+        await close_qdrant_client()
+
+    print("检查完成！" if dry_run else "点 ID 回填完成！")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法:")
+        print("  python migrate_point_ids.py migrate  # 回填确定性点 ID")
+        print("  python migrate_point_ids.py status   # 只统计待迁移数量")
+        sys.exit(1)
+
+    command = sys.argv[1].lower()
+
+    if command == "migrate":
+        asyncio.run(migrate_point_ids())
+    elif command == "status":
+        asyncio.run(migrate_point_ids(dry_run=True))
+    else:
+        print(f"未知命令: {command}")
+        sys.exit(1)
@@ -0,0 +1,128 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from qdrant_client.models import PointStruct
+from app.config import settings
+from app.database.vector_store import QdrantStore, get_qdrant_client, close_qdrant_client
+from app.domain.enums import MemoryType
+import asyncio
+
+SCROLL_BATCH_SIZE = 256
+
+
+async def _per_entity_collections(client, memory_type: str):
+    """列出某记忆类型下所有按实体划分的旧集合，返回 (集合名, entity_id)"""
+    prefix = f"{settings.QDRANT_COLLECTION_PREFIX}_{memory_type}_"
+    response = await client.get_collections()
+    return [
+        (c.name, c.name[len(prefix):])
+        for c in response.collections
+        if c.name.startswith(prefix)
+    ]
+
+
+async def migrate_to_shared_layout(drop_source: bool = False):
+    """
+    把按实体划分的集合流式迁移到每种记忆类型一个的共享多租户集合
+
+    迁移按批 scroll 源集合并 upsert 到目标集合，点 ID 保持不变，payload 中补充
+    entity_id / memory_type。迁移是幂等的，中断后可直接重跑。
+    """
+    client = get_qdrant_client()
+    settings.QDRANT_COLLECTION_LAYOUT = "shared"
+    store = QdrantStore(client)
+
+    try:
+        for memory_type in MemoryType:
+            target = store._get_collection_name(memory_type.value, "")
+            await store.ensure_collection(target)
+
+            for source, entity_id in await _per_entity_collections(client, memory_type.value):
+                migrated = 0
+                offset = None
+                while True:
+                    points, offset = await client.scroll(
+                        collection_name=source,
+                        limit=SCROLL_BATCH_SIZE,
+                        offset=offset,
+                        with_payload=True,
+                        with_vectors=True
+                    )
+                    if points:
+                        await client.upsert(
+                            collection_name=target,
+                            points=[
+                                PointStruct(
+                                    id=point.id,
+                                    vector=point.vector,
+                                    payload={
+                                        **(point.payload or {}),
+                                        "memory_type": memory_type.value,
+                                        "entity_id": entity_id
+                                    }
+                                )
+                                for point in points
+                            ]
+                        )
+                        migrated += len(points)
+                    if offset is None:
+                        break
+
+                print(f"{source} -> {target}: 迁移 {migrated} 个向量")
+
+                if drop_source:
+                    source_count = (await client.count(source, exact=True)).count
+                    if source_count == migrated:
+                        await client.delete_collection(source)
+                        print(f"  已删除源集合 {source}")
+                    else:
+                        print(f"  源集合数量变化 ({source_count} != {migrated})，保留 {source}")
+    finally:
+        await close_qdrant_client()
+
+    print("迁移完成！请设置 QDRANT_COLLECTION_LAYOUT=shared 后重启服务")
+
+
+async def check_layout_status():
+    """统计两种布局下的集合和向量数"""
+    client = get_qdrant_client()
+    status = {}
+    try:
+        for memory_type in MemoryType:
+            per_entity = await _per_entity_collections(client, memory_type.value)
+            shared = f"{settings.QDRANT_COLLECTION_PREFIX}_{memory_type.value}"
+            shared_count = None
+            if await client.collection_exists(shared):
+                shared_count = (await client.count(shared, exact=True)).count
+            status[memory_type.value] = {
+                "per_entity_collections": len(per_entity),
+                "shared_collection_points": shared_count
+            }
+    finally:
+        await close_qdrant_client()
+    return status
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法:")
+        print("  python migrate_qdrant_layout.py migrate         # 迁移到共享集合布局")
+        print("  python migrate_qdrant_layout.py migrate --drop  # 迁移并删除已迁移的旧集合")
+        print("  python migrate_qdrant_layout.py status          # 检查状态")
+        sys.exit(1)
+
+    command = sys.argv[1].lower()
+
+    if command == "migrate":
+        asyncio.run(migrate_to_shared_layout(drop_source="--drop" in sys.argv))
+    elif command == "status":
+        status = asyncio.run(check_layout_status())
+        print("集合布局状态:")
+        for memory_type, item in status.items():
+            print(f"  {memory_type}: 旧集合 {item['per_entity_collections']} 个, "
+                  f"共享集合向量数 {item['shared_collection_points']}")
+    else:
+        print(f"未知命令: {command}")
+        sys.exit(1)
@@ -0,0 +1,409 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from sqlalchemy import select, update, union, union_all, or_, and_
+from qdrant_client.models import PointStruct
+from app.config import settings
+from app.core.memory import EmbeddingService
+from app.core.embedding_cache import CachedEmbeddingService
+from app.database.models import ProfileMemory, EventMemory, async_session
+from app.database.vector_store import (
+    QdrantStore, get_qdrant_client, close_qdrant_client, point_id_for, vector_metadata
+)
+from app.domain.enums import MemoryType
+import asyncio
+import json
+import time
+
+SCROLL_BATCH_SIZE = 1000
+STREAM_BATCH_SIZE = 1000
+SCOPE_PAGE_SIZE = 1000
+REPAIR_BATCH_SIZE = 256
+CHECKPOINT_FILE = Path("reconcile_checkpoint.json")
+
+LAYER_MODELS = {"profile": ProfileMemory, "event": EventMemory}
+
+
+class Scope:
+    """一次归并的范围：一个 Qdrant 集合及其在 PostgreSQL 中对应的记忆"""
+
+    def __init__(self, collection_name: str, memory_type: str, entity_id: Optional[str]):
+        self.collection_name = collection_name
+        self.memory_type = memory_type
+        self.entity_id = entity_id  # shared 布局下为 None，集合内包含该记忆类型的所有实体
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        """范围按该键升序处理，检查点只需记录当前范围"""
+        return self.memory_type, self.entity_id or ""
+
+
+async def _stored_entities() -> AsyncIterator[Tuple[str, str]]:
+    """
+    按 (记忆类型, 实体) 的 C 排序分页读取 PostgreSQL 中的实体，每次只取 SCOPE_PAGE_SIZE 个
+
+    每张表先各自取一页再合并，外层排序只涉及两页数据。
+    """
+    last: Optional[Tuple[str, str]] = None
+    while True:
+        selects = []
+        for model in LAYER_MODELS.values():
+            stmt = select(model.memory_type.label("memory_type"), model.entity_id.label("entity_id")).distinct()
+            if last is not None:
+                stmt = stmt.where(or_(
+                    model.memory_type.collate("C") > last[0],
+                    and_(model.memory_type == last[0], model.entity_id.collate("C") > last[1])
+                ))
+            page = stmt.order_by(
+                model.memory_type.collate("C"), model.entity_id.collate("C")
+            ).limit(SCOPE_PAGE_SIZE).subquery()
+            selects.append(select(page.c.memory_type, page.c.entity_id))
+        query = union(*selects).subquery()
+        stmt = (
+            select(query.c.memory_type, query.c.entity_id)
+            .order_by(query.c.memory_type.collate("C"), query.c.entity_id.collate("C"))
+            .limit(SCOPE_PAGE_SIZE)
+        )
+        async with async_session() as session:
+            rows = (await session.execute(stmt)).all()
+
+        for memory_type, entity_id in rows:
+            yield memory_type, entity_id
+        if len(rows) < SCOPE_PAGE_SIZE:
+            return
+        last = tuple(rows[-1])
+
+
+async def _scopes(store: QdrantStore) -> AsyncIterator[Scope]:
+    """按 Scope.key 升序逐个产生归并范围"""
+    if store.shared_layout:
+        for memory_type in sorted(memory_type.value for memory_type in MemoryType):
+            yield Scope(store._get_collection_name(memory_type, ""), memory_type, None)
+        return
+
+    # per_entity 布局：PostgreSQL 中的实体与已有集合取并集，两边任一侧独有的实体都需要处理。
+    # PostgreSQL 一侧分页读取，与排好序的集合列表归并去重
+    response = await store.client.get_collections()
+    collections = []
+    for memory_type in MemoryType:
+        prefix = f"{settings.QDRANT_COLLECTION_PREFIX}_{memory_type.value}_"
+        for collection in response.collections:
+            if collection.name.startswith(prefix):
+                collections.append((memory_type.value, collection.name[len(prefix):]))
+    collections.sort()
+
+    def scope(entity: Tuple[str, str]) -> Scope:
+        return Scope(store._get_collection_name(*entity), *entity)
+
+    index = 0
+    async for entity in _stored_entities():
+        while index < len(collections) and collections[index] < entity:
+            yield scope(collections[index])
+            index += 1
+        if index < len(collections) and collections[index] == entity:
+            index += 1
+        yield scope(entity)
+    for entity in collections[index:]:
+        yield scope(entity)
+
+
+async def _stream_memories(scope: Scope, after: Optional[str]) -> AsyncIterator[Tuple[Optional[str], str]]:
+    """
+    服务端游标按 embedding_id 顺序流式读取 (embedding_id, memory_id)
+
+    点 ID 由 memory_id 确定性派生并回写到 embedding_id。Qdrant 按 UUID 的 128 位数值排序，
+    与规范的小写十六进制字符串按字节比较的顺序相同，因此排序与续跑条件都显式使用 COLLATE "C"，
+    不受数据库默认排序规则影响；两侧可以归并比较而无需在内存中保存任何一侧的全集。
+    """
+    selects = []
+    for model in LAYER_MODELS.values():
+        stmt = select(model.embedding_id.label("key"), model.id).where(
+            model.memory_type == scope.memory_type
+        )
+        if scope.entity_id is not None:
+            stmt = stmt.where(model.entity_id == scope.entity_id)
+        selects.append(stmt)
+
+    query = union_all(*selects).subquery()
+    stmt = select(query.c.key, query.c.id).order_by(query.c.key.collate("C"))
+    if after is not None:
+        # embedding_id 为空的记忆排在最后，续跑时也需要处理
+        stmt = stmt.where(or_(query.c.key.collate("C") > after, query.c.key.is_(None)))
+
+    async with async_session() as session:
+        result = await session.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for embedding_id, memory_id in result:
+            yield embedding_id, memory_id
+
+
+async def _check_order(items: AsyncIterator[Any], key, source: str, scope: Scope) -> AsyncIterator[Any]:
+    """校验流按升序返回（None 只能出现在末尾），顺序不符时归并结果不可信，直接中止"""
+    previous: Optional[str] = None
+    tail = False
+    async for item in items:
+        current = key(item)
+        if current is None:
+            tail = True
+        elif tail or (previous is not None and current <= previous):
+            raise RuntimeError(
+                f"{scope.collection_name}: {source} 未按 C 排序规则升序返回（{previous} 之后是 {current}），无法归并"
+            )
+        else:
+            previous = current
+        yield item
+
+
+async def _stream_points(client, scope: Scope, after: Optional[str]) -> AsyncIterator[Tuple[str, Optional[float]]]:
+    """按点 ID 顺序 scroll 整个集合，产生 (点 ID, payload 中的 created_at)，不取向量"""
+    if not await client.collection_exists(scope.collection_name):
+        return
+
+    offset = after
+    while True:
+        points, offset = await client.scroll(
+            collection_name=scope.collection_name,
+            limit=SCROLL_BATCH_SIZE,
+            offset=offset,
+            with_payload=["created_at"],
+            with_vectors=False
+        )
+        for point in points:
+            point_id = str(point.id)
+            if after is None or point_id > after:
+                yield point_id, (point.payload or {}).get("created_at")
+        if offset is None:
+            break
+
+
+def _resume_position(
+    memory: Optional[Tuple[Optional[str], str]],
+    point: Optional[Tuple[str, Optional[float]]],
+    last_memory: Optional[str],
+    last_point: Optional[str]
+) -> Optional[str]:
+    """
+    续跑位置：两侧不超过该位置的记录都已处理
+
+    embedding_id 不一致的记忆按原 embedding_id 计入记忆侧的进度，两侧各自的进度取较小值，
+    续跑时不会跳过另一侧尚未比较的记录。某一侧已读完时只看另一侧；
+    embedding_id 为空的记忆排在最后，续跑时总会重新读取，不计入进度。
+    """
+    memories_left = memory is not None and memory[0] is not None
+    points_left = point is not None
+    if memories_left and points_left:
+        if last_memory is None or last_point is None:
+            return None
+        return min(last_memory, last_point)
+    if memories_left:
+        return last_memory
+    if points_left:
+        return last_point
+    return max((last for last in (last_memory, last_point) if last is not None), default=None)
+
+
+class Reconciler:
+    def __init__(
+        self,
+        dry_run: bool = False,
+        checkpoint_file: Path = CHECKPOINT_FILE,
+        client=None,
+        embedding_service=None
+    ):
+        self.dry_run = dry_run
+        self.checkpoint_file = checkpoint_file
+        self.client = client or get_qdrant_client()
+        self.store = QdrantStore(self.client)
+        self.embedding_service = embedding_service or CachedEmbeddingService(EmbeddingService())
+        self.checkpoint = self._load_checkpoint()
+        self.stats = {"matched": 0, "orphans": 0, "missing": 0, "recent": 0}
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        if not self.dry_run and self.checkpoint_file.exists():
+            return json.loads(self.checkpoint_file.read_text())
+        return {"layout": settings.QDRANT_COLLECTION_LAYOUT, "scope": None, "last": None, "done": False}
+
+    def _save_checkpoint(self, scope: Scope, last: Optional[str], done: bool = False):
+        """范围按键升序处理，只记录当前范围及其进度，检查点大小与实体数无关"""
+        if self.dry_run:
+            return
+        self.checkpoint.update({"scope": list(scope.key), "last": last, "done": done})
+        tmp = self.checkpoint_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.checkpoint))
+        tmp.replace(self.checkpoint_file)
+
+    async def run(self):
+        if self.checkpoint.get("layout") != settings.QDRANT_COLLECTION_LAYOUT:
+            print("检查点与当前集合布局不一致，请先执行 reset")
+            return
+
+        resume = tuple(self.checkpoint["scope"]) if self.checkpoint.get("scope") else None
+        async for scope in _scopes(self.store):
+            if resume is not None and scope.key < resume:
+                continue
+            if resume is not None and scope.key == resume:
+                if self.checkpoint.get("done"):
+                    continue
+                await self.reconcile_scope(scope, self.checkpoint.get("last"))
+            else:
+                await self.reconcile_scope(scope, None)
+
+        action = "发现" if self.dry_run else "已修复"
+        print(
+            f"完成！一致 {self.stats['matched']}，{action}孤儿向量 {self.stats['orphans']}，"
+            f"{action}缺失向量 {self.stats['missing']}，"
+            f"跳过写入不足 {settings.RECONCILE_ORPHAN_GRACE_SECONDS:g} 秒的孤儿向量 {self.stats['recent']}"
+        )
+
+    def memories(self, scope: Scope, after: Optional[str]) -> AsyncIterator[Tuple[Optional[str], str]]:
+        return _stream_memories(scope, after)
+
+    def points(self, scope: Scope, after: Optional[str]) -> AsyncIterator[Tuple[str, Optional[float]]]:
+        return _stream_points(self.client, scope, after)
+
+    @staticmethod
+    def _recent(created_at: Optional[float]) -> bool:
+        """
+        sync 模式下向量先于记忆行提交写入，对正在运行的系统，新点可能只是还没提交的写入。
+        created_at 在宽限期内的孤儿点不删除；没有 created_at 的旧点按孤儿处理
+        """
+        return created_at is not None and time.time() - created_at < settings.RECONCILE_ORPHAN_GRACE_SECONDS
+
+    async def reconcile_scope(self, scope: Scope, after: Optional[str]):
+        """归并两侧有序流：只在 Qdrant 中的是孤儿，只在 PostgreSQL 中（或 embedding_id 不一致）的是缺失"""
+        memories = _check_order(self.memories(scope, after), lambda memory: memory[0], "PostgreSQL", scope)
+        points = _check_order(self.points(scope, after), lambda point: point[0], "Qdrant", scope)
+        memory = await anext(memories, None)
+        point = await anext(points, None)
+
+        orphans: List[str] = []
+        missing: List[str] = []
+        # embedding_id 不一致的记忆按确定性 ID 补写，之后遇到的对应点不再当作孤儿删除；
+        # 若点先于记忆出现，会先被删除、随后由补写恢复，结果同样一致
+        rekeyed = set()
+        last_memory = last_point = after
+        while memory is not None or point is not None:
+            # 两侧按键交替推进，embedding_id 为空的记忆排在所有点之后
+            memory_first = memory is not None and (
+                point is None or (memory[0] is not None and memory[0] <= point[0])
+            )
+            if memory_first and memory[0] != point_id_for(memory[1]):
+                # embedding_id 为空或不是确定性 ID：按缺失处理，修复时一并回写；
+                # 与它 ID 相同的旧点随后按孤儿删除
+                missing.append(memory[1])
+                rekeyed.add(point_id_for(memory[1]))
+                if memory[0] is not None:
+                    last_memory = memory[0]
+                memory = await anext(memories, None)
+            elif memory_first and memory[0] == point[0]:
+                self.stats["matched"] += 1
+                last_memory = last_point = point[0]
+                memory = await anext(memories, None)
+                point = await anext(points, None)
+            elif memory_first:
+                missing.append(memory[1])
+                last_memory = memory[0]
+                memory = await anext(memories, None)
+            else:
+                point_id, created_at = point
+                if point_id not in rekeyed:
+                    if self._recent(created_at):
+                        self.stats["recent"] += 1
+                    else:
+                        orphans.append(point_id)
+                last_point = point_id
+                point = await anext(points, None)
+
+            if len(orphans) + len(missing) >= REPAIR_BATCH_SIZE:
+                await self._repair(scope, orphans, missing)
+                self._save_checkpoint(scope, _resume_position(memory, point, last_memory, last_point))
+                orphans, missing = [], []
+
+        await self._repair(scope, orphans, missing)
+        self._save_checkpoint(scope, _resume_position(memory, point, last_memory, last_point), done=True)
+        print(f"{scope.collection_name}: 完成")
+
+    async def _repair(self, scope: Scope, orphans: List[str], missing: List[str]):
+        self.stats["orphans"] += len(orphans)
+        self.stats["missing"] += len(missing)
+        if self.dry_run:
+            return
+
+        if orphans:
+            await self.client.delete(collection_name=scope.collection_name, points_selector=orphans)
+        if missing:
+            await self._reindex(missing)
+
+    async def _reindex(self, memory_ids: List[str]):
+        """重新生成（优先命中 Embedding 缓存）并写入缺失的向量，同时回写 embedding_id"""
+        rows: List[Tuple[str, Any]] = []
+        async with async_session() as session:
+            for layer, model in LAYER_MODELS.items():
+                result = await session.execute(select(model).where(model.id.in_(memory_ids)))
+                rows.extend((layer, memory) for memory in result.scalars().all())
+
+        if not rows:
+            return
+
+        embeddings = await self.embedding_service.generate_many([memory.content for _, memory in rows])
+
+        groups: Dict[Tuple[str, str], List[PointStruct]] = {}
+        for (layer, memory), embedding in zip(rows, embeddings):
+            metadata = vector_metadata(
+                memory.meta_info, layer, memory.created_at, getattr(memory, "expiry_date", None)
+            )
+            groups.setdefault((memory.memory_type, memory.entity_id), []).append(PointStruct(
+                id=point_id_for(memory.id),
+                vector=embedding,
+                payload=QdrantStore.build_payload(memory.id, memory.memory_type, memory.entity_id, metadata)
+            ))
+        for (memory_type, entity_id), points in groups.items():
+            await self.store.upsert_points(memory_type, entity_id, points)
+
+        async with async_session() as session:
+            for layer, model in LAYER_MODELS.items():
+                updates = [
+                    {"id": memory.id, "embedding_id": point_id_for(memory.id)}
+                    for row_layer, memory in rows
+                    if row_layer == layer and memory.embedding_id != point_id_for(memory.id)
+                ]
+                if updates:
+                    await session.execute(update(model), updates)
+            await session.commit()
+
+
+async def reconcile(dry_run: bool = False, checkpoint_file: Path = CHECKPOINT_FILE):
+    if settings.VECTOR_BACKEND != "qdrant":
+        print(f"当前向量后端为 {settings.VECTOR_BACKEND}，向量与记忆同库存储，无需对账")
+        return
+
+    reconciler = Reconciler(dry_run, checkpoint_file)
+    try:
+        await reconciler.run()
+    finally:
+        await close_qdrant_client()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法:")
+        print("  python reconcile_vectors.py check [检查点文件]   # 只统计孤儿/缺失向量，不修改数据")
+        print("  python reconcile_vectors.py repair [检查点文件]  # 删除孤儿向量、补写缺失向量，可中断续跑")
+        print("  python reconcile_vectors.py reset [检查点文件]   # 删除检查点，下次从头开始")
+        sys.exit(1)
+
+    command = sys.argv[1].lower()
+    checkpoint_file = Path(sys.argv[2]) if len(sys.argv) > 2 else CHECKPOINT_FILE
+
+    if command == "check":
+        asyncio.run(reconcile(dry_run=True, checkpoint_file=checkpoint_file))
+    elif command == "repair":
+        asyncio.run(reconcile(checkpoint_file=checkpoint_file))
+    elif command == "reset":
+        checkpoint_file.unlink(missing_ok=True)
+        print("检查点已删除")
+    else:
+        print(f"未知命令: {command}")
+        sys.exit(1)
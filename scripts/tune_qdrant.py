@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.database.vector_store import QdrantStore, get_qdrant_client, close_qdrant_client
+import asyncio
+
+
+async def apply():
+    """
+    把 Settings 中的量化、落盘与 HNSW 配置应用到所有已有集合，并补建过滤检索的 payload 索引
+
+    配置变更由 Qdrant 在后台重建索引，期间集合可正常读写；可重复执行。
+    """
+    client = get_qdrant_client()
+    store = QdrantStore(client)
+    try:
+        for collection_name in await store.memory_collections():
+            await store.apply_collection_config(collection_name)
+            print(f"{collection_name}: 已应用配置")
+    finally:
+        await close_qdrant_client()
+
+    print(
+        f"完成！quantization={settings.QDRANT_QUANTIZATION} on_disk={settings.QDRANT_ON_DISK_VECTORS} "
+        f"m={settings.QDRANT_HNSW_M} ef_construct={settings.QDRANT_HNSW_EF_CONSTRUCT}"
+    )
+
+
+async def status():
+    client = get_qdrant_client()
+    try:
+        for collection_name in await QdrantStore(client).memory_collections():
+            info = await client.get_collection(collection_name)
+            params = info.config.params.vectors
+            hnsw = info.config.hnsw_config
+            quantization = info.config.quantization_config
+            print(
+                f"{collection_name}: status={info.status} points={info.points_count} "
+                f"on_disk={getattr(params, 'on_disk', None)} m={hnsw.m} ef_construct={hnsw.ef_construct} "
+                f"quantization={type(quantization).__name__ if quantization else 'none'}"
+            )
+    finally:
+        await close_qdrant_client()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法:")
+        print("  python tune_qdrant.py apply   # 将当前配置应用到已有集合")
+        print("  python tune_qdrant.py status  # 查看各集合当前配置")
+        sys.exit(1)
+
+    command = sys.argv[1].lower()
+
+    if command == "apply":
+        asyncio.run(apply())
+    elif command == "status":
+        asyncio.run(status())
+    else:
+        print(f"未知命令: {command}")
+        sys.exit(1)
@@ -0,0 +1,53 @@
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+from scripts import backfill_vector_payloads
+from app.database.vector_store import QdrantStore, point_id_for
+from app.domain.dto import MemoryFilterDTO
+
+
+@pytest.mark.asyncio
+async def test_backfill_fills_legacy_payloads(monkeypatch):
+    """测试旧点补写过滤字段后能被过滤检索命中，过期事件被排除；找不到记忆行的点不动"""
+    client = AsyncQdrantClient(location=":memory:")
+    collection_name = "zmemory_user_u1"
+    await client.create_collection(collection_name, vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    await client.upsert(collection_name, points=[
+        PointStruct(id=point_id_for("profile_1"), vector=[1.0, 0.0], payload={"memory_id": "profile_1"}),
+        PointStruct(id=point_id_for("event_1"), vector=[1.0, 0.1], payload={"memory_id": "event_1", "importance": "5"}),
+        PointStruct(id=point_id_for("gone"), vector=[1.0, 0.2], payload={"memory_id": "gone"}),
+    ])
+
+    now = datetime.utcnow()
+    rows = {
+        "profile_1": ("profile", SimpleNamespace(
+            id="profile_1", memory_type="user", entity_id="u1", meta_info={"importance": 4}, created_at=now
+        )),
+        "event_1": ("event", SimpleNamespace(
+            id="event_1", memory_type="user", entity_id="u1", meta_info={"importance": "5"},
+            created_at=now - timedelta(days=2), expiry_date=now - timedelta(days=1)
+        )),
+    }
+
+    async def load_memories(memory_ids):
+        return {memory_id: rows[memory_id] for memory_id in memory_ids if memory_id in rows}
+
+    monkeypatch.setattr(backfill_vector_payloads, "_load_memories", load_memories)
+
+    assert await backfill_vector_payloads.backfill_collection(client, collection_name, dry_run=True) == (2, 1)
+    assert await backfill_vector_payloads.backfill_collection(client, collection_name) == (2, 1)
+    # 补写后的点不再被选中，重跑只剩孤儿
+    assert await backfill_vector_payloads.backfill_collection(client, collection_name) == (0, 1)
+
+    store = QdrantStore(client)
+    recent = await store.search(
+        [1.0, 0.0], "user", "u1", filters=MemoryFilterDTO(created_after=now - timedelta(hours=1))
+    )
+    assert [r["memory_id"] for r in recent] == ["profile_1"]
+    important = await store.search(
+        [1.0, 0.0], "user", "u1", filters=MemoryFilterDTO(min_importance=5, include_expired=True)
+    )
+    assert [r["memory_id"] for r in important] == ["event_1"]
+    assert important[0]["payload"]["memory_layer"] == "event"
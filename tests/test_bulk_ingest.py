@@ -0,0 +1,152 @@
+import asyncio
+import json
+import httpx
+import pytest
+from fastapi import FastAPI
+from typing import List, AsyncIterator
+from app.api.dependencies import container
+from app.api.routes.memory import bulk_ingest, router
+from app.config import settings
+from app.domain.dto import NewMemoryDTO
+from app.domain.enums import MemoryType, MemoryLayer, MemoryAction
+from app.repositories.impl.postgres_repository import new_memory_id, memory_layer_of
+from app.services.memory_service import MemoryService
+from tests.test_embedding import FakeEmbeddingService
+
+
+class FakeBulkService:
+    """记录每批写入的假记忆服务"""
+
+    def __init__(self, fail_on: int = -1):
+        self.chunks: List[List[NewMemoryDTO]] = []
+        self.fail_on = fail_on
+        self.stored = asyncio.Event()
+
+    async def store_many(self, memories: List[NewMemoryDTO]) -> List[str]:
+        self.chunks.append(memories)
+        self.stored.set()
+        if len(self.chunks) - 1 == self.fail_on:
+            raise RuntimeError("database unavailable")
+        return [f"{m.memory_type.value}_{m.memory_layer.value}_{m.entity_id}_{i}" for i, m in enumerate(memories)]
+
+
+class FakeMemoryRepository:
+    def __init__(self):
+        self.stored = []
+
+    async def store_many(self, memories, embeddings):
+        self.stored.append((memories, embeddings))
+        return [new_memory_id(m.memory_type.value, m.memory_layer.value, m.entity_id) for m in memories]
+
+
+class FakeLogRepository:
+    def __init__(self):
+        self.entries = []
+
+    async def log_many(self, entries):
+        self.entries.extend(entries)
+        return [str(i) for i in range(len(entries))]
+
+
+async def _lines(lines: List[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line
+
+
+def test_new_memory_id_is_unique():
+    """测试同一实体在同一微秒内生成的记忆 ID 不重复，且可解析出记忆层"""
+    ids = [new_memory_id("user", "event", "u_1") for _ in range(1000)]
+    assert len(set(ids)) == 1000
+    assert all(memory_layer_of(memory_id) == "event" for memory_id in ids)
+
+
+@pytest.mark.asyncio
+async def test_bulk_ingest_streams_results_in_order(monkeypatch):
+    """测试按批写入，无效行就地报错，结果顺序与输入一致"""
+    monkeypatch.setattr(settings, "BULK_INGEST_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "BULK_INGEST_CONCURRENCY", 2)
+    service = FakeBulkService(fail_on=1)
+
+    lines = [
+        json.dumps({"memory_type": "user", "entity_id": "u1", "content": "a"}),
+        json.dumps({"memory_type": "agent", "entity_id": "a1", "content": "b", "memory_layer": "profile"}),
+        "",
+        "{not json",
+        json.dumps({"memory_type": "user", "entity_id": "u2", "content": "c"}),
+        json.dumps({"memory_type": "robot", "entity_id": "r1", "content": "d"}),
+        json.dumps({"memory_type": "user", "entity_id": "u3", "content": "e"}),
+    ]
+    results = [json.loads(line) async for line in bulk_ingest(service, _lines(lines))]
+
+    assert [r["line"] for r in results] == [1, 2, 4, 5, 6, 7]
+    assert [len(chunk) for chunk in service.chunks] == [2, 1, 1]
+    assert results[0]["status"] == "success" and results[0]["layer"] == "event"
+    assert results[1]["id"].startswith("agent_profile_a1")
+    # 第二批写入失败：该批的有效行与解析失败的行都标记为错误
+    assert results[2]["status"] == "error"
+    assert results[3] == {"line": 5, "status": "error", "error": "database unavailable"}
+    assert results[4]["status"] == "error"
+    assert results[5]["status"] == "success"
+
+
+@pytest.mark.asyncio
+async def test_store_many_embeds_and_logs_in_bulk():
+    """测试批量存储只调用一次批量向量生成，日志批量写入"""
+    memory_repo = FakeMemoryRepository()
+    log_repo = FakeLogRepository()
+    embedding_service = FakeEmbeddingService()
+    service = MemoryService(memory_repo, log_repo, embedding_service, extractor=object())
+
+    memories = [
+        NewMemoryDTO(memory_type=MemoryType.USER, entity_id=f"u{i % 3}", content=f"memory {i}")
+        for i in range(10)
+    ]
+    memories.append(NewMemoryDTO(
+        memory_type=MemoryType.AGENT, entity_id="a1", content="profile", memory_layer=MemoryLayer.PROFILE
+    ))
+    memory_ids = await service.store_many(memories)
+
+    assert len(embedding_service.calls) == 1
+    assert len(memory_repo.stored) == 1
+    assert len(memory_ids) == 11
+    assert [entry["memory_id"] for entry in log_repo.entries] == memory_ids
+    assert all(entry["action"] == MemoryAction.INSERT for entry in log_repo.entries)
+    assert log_repo.entries[-1]["memory_layer"] == MemoryLayer.PROFILE
+
+
+@pytest.mark.asyncio
+async def test_bulk_endpoint_streams_results(monkeypatch):
+    """测试经由应用发送真实请求：请求体分块上传，上传结束前已开始写入，编码错误的行单独报错"""
+    monkeypatch.setattr(settings, "BULK_INGEST_CHUNK_SIZE", 2)
+    service = FakeBulkService()
+    monkeypatch.setattr(container, "_user_memory_service", service)
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+
+    lines = [
+        json.dumps({"memory_type": "user", "entity_id": f"u{i}", "content": f"memory {i}"})
+        for i in range(5)
+    ]
+
+    async def body():
+        # 每个分块在行中间截断，验证跨分块的行拼接
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        for start in range(0, len(data), 37):
+            yield data[start:start + 37]
+        # 第一批写入之前不再上传：请求体读完才开始写入时这里会超时
+        await asyncio.wait_for(service.stored.wait(), 5)
+        yield b'{"memory_type": "user", "entity_id": "u9", "content": "\xff"}\n'
+
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/api/memory/bulk", content=body(), headers={"Content-Type": "application/x-ndjson"}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["line"] for r in results] == [1, 2, 3, 4, 5, 6]
+    assert all(r["status"] == "success" for r in results[:5])
+    assert results[5]["status"] == "error" and "UTF-8" in results[5]["error"]
+    assert [len(chunk) for chunk in service.chunks] == [2, 2, 1]
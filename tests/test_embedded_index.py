@@ -0,0 +1,83 @@
+import pytest
+from datetime import datetime, timedelta
+from app.database.embedded_index import EmbeddedVectorIndex, EntityVectors
+from app.database.vector_store import vector_metadata
+from app.repositories.impl.embedded_repository import EmbeddedVectorRepository
+from app.domain.dto import MemoryFilterDTO
+from app.domain.enums import MemoryType, MemoryLayer
+
+
+@pytest.mark.asyncio
+async def test_embedded_search_and_filters(tmp_path):
+    """测试精确检索排序与过滤条件"""
+    repo = EmbeddedVectorRepository(EmbeddedVectorIndex(str(tmp_path), dim=4))
+    now = datetime.utcnow()
+    await repo.insert("p1", [1.0, 0.0, 0.0, 0.0], MemoryType.USER, "u1",
+                      vector_metadata({"importance": 5}, "profile", now))
+    await repo.insert("e1", [0.9, 0.1, 0.0, 0.0], MemoryType.USER, "u1",
+                      vector_metadata({"importance": 2}, "event", now))
+    await repo.insert("e2", [1.0, 0.0, 0.0, 0.0], MemoryType.USER, "u1",
+                      vector_metadata({}, "event", now, now - timedelta(hours=1)))
+
+    results = await repo.search([1.0, 0.0, 0.0, 0.0], MemoryType.USER, "u1", 10)
+    assert [r["memory_id"] for r in results] == ["p1", "e1"]
+    assert results[0]["score"] == pytest.approx(1.0)
+
+    events = await repo.search([1.0, 0.0, 0.0, 0.0], MemoryType.USER, "u1", 10,
+                               MemoryFilterDTO(memory_layer=MemoryLayer.EVENT, include_expired=True))
+    assert [r["memory_id"] for r in events] == ["e2", "e1"]
+
+    assert await repo.search([1.0, 0.0, 0.0, 0.0], MemoryType.USER, "nobody", 10) == []
+
+
+@pytest.mark.asyncio
+async def test_embedded_persistence_and_eviction(tmp_path):
+    """测试重启后从磁盘恢复（含更新、删除）以及超出内存预算时的 LRU 卸载"""
+    index = EmbeddedVectorIndex(str(tmp_path), dim=4, dtype="int8", max_bytes=1)
+    repo = EmbeddedVectorRepository(index)
+    await repo.insert("a", [1.0, 0.0, 0.0, 0.0], MemoryType.AGENT, "x/1", {})
+    await repo.insert("b", [0.0, 1.0, 0.0, 0.0], MemoryType.AGENT, "x/1", {})
+    await repo.update("a", [0.0, 0.0, 1.0, 0.0], MemoryType.AGENT, "x/1", {"importance": 4})
+    await repo.delete("b", MemoryType.AGENT, "x/1")
+    await repo.insert("c", [1.0, 0.0, 0.0, 0.0], MemoryType.AGENT, "x/2", {})
+
+    assert index.stats()["entities"] == 1
+    assert index.evictions == 1
+    index.close()
+
+    reloaded = EmbeddedVectorRepository(EmbeddedVectorIndex(str(tmp_path), dim=4, dtype="int8"))
+    results = await reloaded.search([0.0, 0.0, 1.0, 0.0], MemoryType.AGENT, "x/1", 10)
+    assert [r["memory_id"] for r in results] == ["a"]
+    assert results[0]["score"] == pytest.approx(1.0, abs=0.01)
+    assert results[0]["payload"]["importance"] == 4
+
+
+
+@pytest.mark.asyncio
+async def test_embedded_update_without_location(tmp_path):
+    """测试缺少记忆类型或实体时更新返回 False，只更新 payload 时不创建实体目录"""
+    repo = EmbeddedVectorRepository(EmbeddedVectorIndex(str(tmp_path), dim=4))
+    await repo.insert("a", [1.0, 0.0, 0.0, 0.0], MemoryType.USER, "u1", {})
+
+    assert await repo.update("a", metadata={"importance": 5}) is False
+    assert await repo.update("a", memory_type=MemoryType.USER, metadata={"importance": 5}) is False
+    assert await repo.update("a", None, MemoryType.USER, "nobody", {"importance": 5}) is False
+    assert not (tmp_path / "user" / "nobody").exists()
+
+    assert await repo.update("a", None, MemoryType.USER, "u1", {"importance": 5}) is True
+    results = await repo.search([1.0, 0.0, 0.0, 0.0], MemoryType.USER, "u1", 10)
+    assert results[0]["payload"]["importance"] == 5
+
+def test_entity_compaction(tmp_path):
+    """测试删除过多后压缩文件，存活向量不变"""
+    entity = EntityVectors(tmp_path / "e", dim=2)
+    entity.load()
+    for i in range(200):
+        entity.put(f"m{i}", [1.0, float(i)], {"memory_id": f"m{i}"})
+    for i in range(150):
+        entity.delete(f"m{i}")
+
+    assert entity.count == 99  # 第 101 次删除时压缩，之后的删除留待下次压缩
+    assert sorted(entity.rows) == sorted(f"m{i}" for i in range(150, 200))
+    assert entity.search([0.0, 1.0], 1)[0][0] == "m199"
+    entity.close()
@@ -0,0 +1,236 @@
+import asyncio
+import threading
+import time
+import pytest
+import numpy as np
+from typing import List
+from app.core.memory import EmbeddingService, BatchingEmbeddingService
+from app.core.local_embedding import embed_texts, close_local_embedder
+from app.core import local_embedding
+from app.core.embedding_cache import CachedEmbeddingService
+from app.core.provider_pool import ProviderExecutor
+from app.config import settings
+from app.repositories.interfaces import IEmbeddingService
+
+
+class FakeEmbeddingService(IEmbeddingService):
+    """记录批量调用的假 Embedding 服务"""
+
+    def __init__(self):
+        self.calls: List[List[str]] = []
+
+    async def generate(self, text: str) -> List[float]:
+        return (await self.generate_many([text]))[0]
+
+    async def generate_many(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+@pytest.mark.asyncio
+async def test_batching_coalesces_concurrent_requests():
+    """测试窗口期内的并发请求合并为一次调用"""
+    inner = FakeEmbeddingService()
+    service = BatchingEmbeddingService(inner, window_ms=5, max_batch_size=100)
+
+    texts = [f"text-{i}" * (i + 1) for i in range(20)]
+    results = await asyncio.gather(*(service.generate(t) for t in texts))
+
+    assert len(inner.calls) == 1
+    assert results == [[float(len(t)), 1.0] for t in texts]
+
+
+@pytest.mark.asyncio
+async def test_batching_flushes_at_max_size():
+    """测试达到最大批次时立即下发"""
+    inner = FakeEmbeddingService()
+    service = BatchingEmbeddingService(inner, window_ms=1000, max_batch_size=4)
+
+    await asyncio.gather(*(service.generate(f"t{i}") for i in range(8)))
+
+    assert [len(c) for c in inner.calls] == [4, 4]
+
+
+@pytest.mark.asyncio
+async def test_batching_deduplicates_within_batch():
+    """测试同一批次内的重复文本只请求一次"""
+    inner = FakeEmbeddingService()
+    service = BatchingEmbeddingService(inner, window_ms=5)
+
+    await asyncio.gather(*(service.generate("same") for _ in range(5)))
+
+    assert inner.calls == [["same"]]
+
+
+@pytest.mark.asyncio
+async def test_batching_propagates_errors():
+    """测试批量调用失败时所有等待方都收到异常"""
+
+    class FailingEmbeddingService(FakeEmbeddingService):
+        async def generate_many(self, texts):
+            raise RuntimeError("provider down")
+
+    service = BatchingEmbeddingService(FailingEmbeddingService(), window_ms=5)
+    results = await asyncio.gather(
+        service.generate("a"), service.generate("b"), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cache_serves_repeats_from_memory():
+    """测试重复文本命中进程内缓存"""
+    inner = FakeEmbeddingService()
+    service = CachedEmbeddingService(inner, persistent=False)
+
+    first = await service.generate_many(["a", "bb", "a"])
+    second = await service.generate("bb")
+
+    assert inner.calls == [["a", "bb"]]
+    assert first[0] == first[2]
+    assert second == first[1]
+    stats = service.stats()["cache"]
+    assert stats["misses"] == 2
+    assert stats["memory_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_least_recently_used():
+    """测试 LRU 淘汰"""
+    inner = FakeEmbeddingService()
+    service = CachedEmbeddingService(inner, max_entries=2, persistent=False)
+
+    await service.generate("a")
+    await service.generate("b")
+    await service.generate("a")
+    await service.generate("c")
+    await service.generate("a")
+    await service.generate("b")
+
+    assert inner.calls == [["a"], ["b"], ["c"], ["b"]]
+
+
+@pytest.mark.asyncio
+async def test_cache_key_changes_with_provider(monkeypatch):
+    """测试切换 Embedding 提供商后缓存自动失效"""
+    inner = FakeEmbeddingService()
+    service = CachedEmbeddingService(inner, persistent=False)
+
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "dashscope")
+    await service.generate("a")
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "openai")
+    await service.generate("a")
+
+    assert inner.calls == [["a"], ["a"]]
+
+
+@pytest.mark.asyncio
+async def test_provider_executor_keeps_event_loop_responsive():
+    """测试同步 SDK 调用不阻塞事件循环，并统计在途请求"""
+    executor = ProviderExecutor({"slow": 2})
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    call = asyncio.ensure_future(executor.run("slow", time.sleep, 0.2))
+    await asyncio.sleep(0.05)
+    assert executor.stats()["slow"]["running"] == 1
+
+    await ticker()
+    await call
+
+    assert ticks == 10
+    assert executor.stats()["slow"]["running"] == 0
+    assert executor.stats()["slow"]["completed"] == 1
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_provider_executor_separates_queued_running_and_failed():
+    """测试线程池占满时排队与执行中分开统计，失败的调用不计入成功数"""
+    executor = ProviderExecutor({"slow": 1})
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait()
+
+    def failing():
+        raise ValueError("provider error")
+
+    first = asyncio.ensure_future(executor.run("slow", blocking))
+    second = asyncio.ensure_future(executor.run("slow", failing))
+    await asyncio.sleep(0)
+    await asyncio.to_thread(started.wait)
+
+    stats = executor.stats()["slow"]
+    assert (stats["queued"], stats["running"]) == (1, 1)
+
+    release.set()
+    await first
+    with pytest.raises(ValueError):
+        await second
+
+    stats = executor.stats()["slow"]
+    assert (stats["queued"], stats["running"]) == (0, 0)
+    assert (stats["completed"], stats["failed"]) == (1, 1)
+    executor.shutdown()
+
+
+def test_local_embedding_is_deterministic_and_normalized():
+    """测试本地 Embedding 结果确定且已归一化"""
+    first = embed_texts(["用户喜欢喝咖啡", "hello world", ""], dim=256)
+    second = embed_texts(["用户喜欢喝咖啡", "hello world", ""], dim=256)
+
+    assert first.shape == (3, 256)
+    assert np.array_equal(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0)
+
+
+def test_local_embedding_similar_texts_score_higher():
+    """测试相似文本的余弦相似度更高"""
+    vectors = embed_texts(
+        ["用户喜欢喝咖啡", "用户很喜欢喝咖啡", "今天北京下雨了"], dim=512
+    )
+
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+
+@pytest.mark.asyncio
+async def test_embedding_service_local_provider(monkeypatch):
+    """测试 EMBEDDING_PROVIDER=local 时使用配置的维度"""
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "local")
+    monkeypatch.setattr(settings, "LOCAL_EMBEDDING_DIM", 128)
+
+    close_local_embedder()
+    embeddings = await EmbeddingService().generate_many(["a", "b"])
+    close_local_embedder()
+
+    assert settings.embedding_dim == 128
+    assert [len(e) for e in embeddings] == [128, 128]
+
+
+@pytest.mark.asyncio
+async def test_close_local_embedder_stops_process_pool(monkeypatch):
+    """测试应用关闭时回收本地 Embedding 的进程池"""
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "local")
+    monkeypatch.setattr(settings, "LOCAL_EMBEDDING_DIM", 64)
+    monkeypatch.setattr(settings, "LOCAL_EMBEDDING_PROCESSES", 1)
+    close_local_embedder()
+
+    texts = [f"text {i}" for i in range(300)]
+    embeddings = await EmbeddingService().generate_many(texts)
+    pool = local_embedding._local_embedder._pool
+    assert pool is not None and len(embeddings) == 300
+
+    close_local_embedder()
+
+    assert local_embedding._local_embedder is None
+    with pytest.raises(RuntimeError):
+        pool.submit(embed_texts, ["a"], 64)
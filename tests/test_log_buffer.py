@@ -0,0 +1,144 @@
+import asyncio
+import pytest
+from typing import List, Dict, Any
+from app.repositories.impl.buffered_log_repository import BufferedLogRepository
+from app.repositories.impl.postgres_repository import PostgresLogRepository
+from app.services.memory_service import MemoryService
+from app.database import unit_of_work as uow
+from app.domain.enums import MemoryType, MemoryLayer, MemoryAction
+
+
+class FakeLogRepository(PostgresLogRepository):
+    """只记录批量写入的假日志仓储"""
+
+    def __init__(self, delay: float = 0.0):
+        self.batches: List[List[Dict[str, Any]]] = []
+        self.delay = delay
+
+    async def write_rows(self, rows: List[Dict[str, Any]]):
+        await asyncio.sleep(self.delay)
+        self.batches.append(list(rows))
+
+    async def get_logs(self, memory_id, memory_layer=None, limit=10):
+        return [row for batch in self.batches for row in batch if row["memory_id"] == memory_id]
+
+
+@pytest.mark.asyncio
+async def test_log_buffer_batches_rows():
+    """测试日志立即返回 ID，按数量阈值合并为多行写入，读取前先写出缓冲"""
+    inner = FakeLogRepository()
+    repo = BufferedLogRepository(inner, max_batch_size=10, flush_interval_ms=1000, max_pending=100)
+
+    log_ids = await asyncio.gather(*(
+        repo.log_action(f"m{i}", MemoryLayer.EVENT, MemoryAction.INSERT, "test", {})
+        for i in range(25)
+    ))
+    assert len(set(log_ids)) == 25
+
+    logs = await repo.get_logs("m24")
+    assert [log["id"] for log in logs] == [log_ids[24]]
+    assert sum(len(batch) for batch in inner.batches) == 25
+    assert max(len(batch) for batch in inner.batches) == 10
+    assert len(inner.batches) <= 4
+
+    await repo.stop()
+    assert repo.stats()["written"] == 25
+
+
+@pytest.mark.asyncio
+async def test_log_buffer_backpressure_and_stop():
+    """测试队列满时写入方等待，stop 写出剩余日志"""
+    inner = FakeLogRepository(delay=0.01)
+    repo = BufferedLogRepository(inner, max_batch_size=5, flush_interval_ms=5, max_pending=5)
+
+    for i in range(30):
+        await repo.log_action(f"m{i}", MemoryLayer.PROFILE, MemoryAction.UPDATE, "test", {})
+        assert repo.stats()["pending"] <= 5
+
+    await repo.stop()
+    assert sum(len(batch) for batch in inner.batches) == 30
+    assert all(row["memory_layer"] == "profile" for batch in inner.batches for row in batch)
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class FakeMemoryRepository:
+    async def store_event(self, memory_type, entity_id, content, metadata, embedding, is_permanent, expiry_date):
+        return f"{memory_type.value}_event_{entity_id}_1"
+
+
+@pytest.mark.asyncio
+async def test_store_uses_log_buffer_inside_unit_of_work(monkeypatch):
+    """测试记忆写入在工作单元内时日志仍进入写后缓冲，而不是在事务中直接写入"""
+    monkeypatch.setattr(uow, "async_session", FakeSession)
+    inner = FakeLogRepository()
+    repo = BufferedLogRepository(inner, max_batch_size=10, flush_interval_ms=1000, max_pending=100)
+    service = MemoryService(FakeMemoryRepository(), repo, None, extractor=object())
+
+    memory_id = await service.store(MemoryType.USER, "u1", "喜欢咖啡", embedding=[1.0, 0.0])
+
+    assert repo.stats()["logged"] == 1
+    assert inner.batches == []
+    await repo.stop()
+    assert [row["memory_id"] for batch in inner.batches for row in batch] == [memory_id]
+
+
+class FakeExtractor:
+    """把 Profile 记忆的更新误标为 Event 层的抽取器"""
+
+    async def extract_memories(self, content, entity_id, existing_memories):
+        return [{
+            "action": "update", "memory_id": "user_profile_u1_1.0", "memory_layer": "event",
+            "content": "喜欢手冲咖啡", "reason": "补充细节"
+        }]
+
+
+class LayerFromIdRepository(FakeMemoryRepository):
+    """只提供按记忆 ID 更新的假记忆仓储"""
+
+    def __init__(self):
+        self.updated = []
+
+    async def get_profile(self, memory_type, entity_id):
+        return []
+
+    async def get_events(self, memory_type, entity_id, limit):
+        return []
+
+    async def update_memory(self, memory_id, content=None, metadata=None, embedding=None):
+        self.updated.append(memory_id)
+        return {"id": memory_id, "memory_type": "user", "entity_id": "u1", "memory_layer": "profile"}
+
+
+@pytest.mark.asyncio
+async def test_extracted_update_uses_layer_from_memory_id(monkeypatch):
+    """测试抽取结果中的更新按记忆 ID 定位记忆层，LLM 标错的层不影响更新与日志"""
+    monkeypatch.setattr(uow, "async_session", FakeSession)
+    inner = FakeLogRepository()
+    repo = BufferedLogRepository(inner, max_batch_size=10, flush_interval_ms=1000, max_pending=100)
+    memory_repo = LayerFromIdRepository()
+    service = MemoryService(memory_repo, repo, None, extractor=FakeExtractor())
+
+    async def embed_extracted(extracted):
+        return {0: [1.0, 0.0]}
+
+    monkeypatch.setattr(service, "_embed_extracted", embed_extracted)
+
+    result = await service.extract_and_store(MemoryType.USER, "u1", "我喜欢手冲咖啡", enable_rl=False)
+    await repo.stop()
+
+    assert memory_repo.updated == ["user_profile_u1_1.0"]
+    assert result.memories[0].layer == MemoryLayer.PROFILE
+    assert [row["memory_layer"] for batch in inner.batches for row in batch] == ["profile"]
@@ -0,0 +1,119 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.database import unit_of_work as uow
+from app.database.models import Base, ProfileMemory, EventMemory
+from app.domain.enums import MemoryType
+from app.repositories.impl.postgres_repository import PostgresMemoryRepository
+from app.config import settings
+
+
+class SyncBackedSession:
+    """把同步 SQLite 会话包装成仓储使用的异步会话接口，语句真实执行（含 RETURNING）"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, *args, **kwargs):
+        return self.session.execute(statement, *args, **kwargs)
+
+    def add(self, instance):
+        self.session.add(instance)
+
+    async def commit(self):
+        self.session.commit()
+
+    async def rollback(self):
+        self.session.rollback()
+
+
+class FakeVectorRepository:
+    def __init__(self):
+        self.calls = []
+
+    async def update(self, memory_id, embedding=None, memory_type=None, entity_id=None, metadata=None):
+        self.calls.append(("update", memory_id, embedding, metadata))
+        return True
+
+    async def delete(self, memory_id, memory_type, entity_id):
+        self.calls.append(("delete", memory_id))
+        return True
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_MODE", "sync")
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[ProfileMemory.__table__, EventMemory.__table__])
+    session = Session(engine, expire_on_commit=False)
+    session.add(ProfileMemory(
+        id="user_profile_u1_1.0", memory_type="user", entity_id="u1",
+        content="likes tea", meta_info={"importance": 4, "tag": "drink"}, created_at=datetime(2024, 1, 1)
+    ))
+    session.add(EventMemory(
+        id="user_event_u1_2.0", memory_type="user", entity_id="u1",
+        content="drank tea", meta_info={}, created_at=datetime(2024, 1, 2)
+    ))
+    session.commit()
+    monkeypatch.setattr(uow, "async_session", lambda: SyncBackedSession(session))
+
+    repo = PostgresMemoryRepository(vector_repo=FakeVectorRepository())
+    repo.session = session
+    return repo
+
+
+@pytest.mark.asyncio
+async def test_missing_and_malformed_ids(repo):
+    """测试不存在的 ID、格式不符或记忆层未知的 ID 返回 None，不触碰向量"""
+    for memory_id in ["user_event_u1_9.9", "garbage", "user_weird_u1_1.0"]:
+        assert await repo.get_by_id(memory_id) is None
+        assert await repo.update_memory(memory_id, content="x", embedding=[1.0]) is None
+        assert await repo.delete_memory(memory_id) is None
+    assert repo.vector_repo.calls == []
+
+
+@pytest.mark.asyncio
+async def test_metadata_only_update_sets_payload(repo):
+    """测试只改元数据时一条 UPDATE ... RETURNING 返回更新后的行，向量只更新 payload"""
+    memory = await repo.update_memory("user_profile_u1_1.0", metadata={"importance": 2})
+
+    assert memory["memory_layer"] == "profile"
+    assert memory["content"] == "likes tea"
+    assert memory["metadata"] == {"importance": 2}
+    [(operation, memory_id, embedding, metadata)] = repo.vector_repo.calls
+    assert (operation, memory_id, embedding) == ("update", "user_profile_u1_1.0", None)
+    assert metadata["importance"] == 2 and "tag" not in metadata
+    assert metadata["memory_layer"] == "profile"
+
+
+@pytest.mark.asyncio
+async def test_content_update_reindexes_vector(repo):
+    """测试内容更新时按 ID 中的记忆层更新对应表，并用新向量覆盖写入"""
+    memory = await repo.update_memory("user_event_u1_2.0", content="drank coffee", embedding=[0.5, 0.5])
+
+    assert memory["memory_layer"] == "event"
+    assert memory["content"] == "drank coffee"
+    [(operation, memory_id, embedding, metadata)] = repo.vector_repo.calls
+    assert (operation, memory_id, embedding) == ("update", "user_event_u1_2.0", [0.5, 0.5])
+    assert metadata["memory_layer"] == "event"
+    assert repo.session.get(EventMemory, "user_event_u1_2.0").content == "drank coffee"
+
+
+@pytest.mark.asyncio
+async def test_delete_returns_deleted_row(repo):
+    """测试一条 DELETE ... RETURNING 删除记忆并删除对应向量"""
+    deleted = await repo.delete_memory("user_event_u1_2.0")
+
+    assert deleted == {
+        "id": "user_event_u1_2.0", "memory_type": "user", "entity_id": "u1", "memory_layer": "event"
+    }
+    assert repo.vector_repo.calls == [("delete", "user_event_u1_2.0")]
+    assert await repo.get_by_id("user_event_u1_2.0") is None
+    assert (await repo.get_by_id("user_profile_u1_1.0"))["memory_type"] == "user"
@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+from app.repositories.impl.pgvector_repository import PgvectorVectorRepository, to_vector_literal
+from app.repositories.impl.postgres_repository import memory_layer_of
+from app.domain.dto import MemoryFilterDTO
+from app.domain.enums import MemoryType, MemoryLayer
+
+
+def test_vector_literal_and_layer():
+    """测试向量文本格式与从记忆 ID 解析记忆层"""
+    assert to_vector_literal([1, 0.5, -2]) == "[1.0,0.5,-2.0]"
+    assert memory_layer_of("user_event_u_1_1700000000.123") == "event"
+    assert memory_layer_of("agent_profile_a1_1700000000.0") == "profile"
+
+
+def test_search_sql_applies_filters():
+    """测试检索 SQL：按记忆层裁剪子查询，过期条件只作用于 Event 层"""
+    repo = PgvectorVectorRepository()
+
+    sql, params = repo._build_search_sql([0.1, 0.2], MemoryType.USER, "u1", 5)
+    assert sql.count("SELECT") == 2
+    assert "expiry_date > :now" in sql
+
+    sql, params = repo._build_search_sql(
+        [0.1, 0.2], MemoryType.USER, "u1", 5,
+        MemoryFilterDTO(
+            memory_layer=MemoryLayer.PROFILE,
+            created_after=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            min_importance=4
+        )
+    )
+    assert sql.count("SELECT") == 1
+    assert "FROM profile_memories" in sql
+    assert "expiry_date >" not in sql
+    assert params["created_after"] == datetime(2024, 1, 1)
+    assert params["min_importance"] == 4
+    # 重要性取值不是整数（"4.5"、"high"）时不能使整个检索报错
+    assert "(metadata->>'importance')::int" not in sql
+    assert "ELSE 3 END >= :min_importance" in sql
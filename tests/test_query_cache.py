@@ -0,0 +1,156 @@
+import math
+import time
+import numpy as np
+import pytest
+from app.core import query_cache as query_cache_module
+from app.core.query_cache import MemoryVersions, QueryResultCache, SemanticQueryCache, RecentQueries
+from app.domain.dto import MemoryFilterDTO
+from app.domain.enums import MemoryType
+from app.services.memory_service import MemoryService
+from app.services.query_service import QueryService
+from tests.test_embedding import FakeEmbeddingService
+from tests.test_query_service import SlowVectorRepository, FakeMemoryRepository
+
+
+class FakeWriteRepository(FakeMemoryRepository):
+    async def store_event(self, memory_type, entity_id, content, metadata, embedding,
+                          is_permanent=False, expiry_date=None):
+        return f"{memory_type.value}_event_{entity_id}_3.0"
+
+
+class FakeLogRepository:
+    async def log_action(self, memory_id, memory_layer, action, reason, metadata):
+        return "log"
+
+
+def _service(embedding_service, vector_repo, **caches):
+    return MemoryService(
+        FakeWriteRepository(), FakeLogRepository(), embedding_service, extractor=object(),
+        vector_repo=vector_repo, memory_versions=MemoryVersions(), **caches
+    )
+
+
+def test_version_change_invalidates_entries():
+    """测试查询文本归一化后命中，版本变化后条目失效，超出上限按 LRU 淘汰"""
+    cache = QueryResultCache(max_entries=2)
+    results = [{"memory_id": "m1", "score": 0.9, "payload": {}}]
+
+    cache.put("user", "u1", "What do I like?", 5, None, 1, results)
+    assert cache.get("user", "u1", "  what do  I like? ", 5, None, 1) is results
+    assert cache.get("user", "u1", "what do I like?", 3, None, 1) is None
+    assert cache.get("user", "u1", "what do I like?", 5, MemoryFilterDTO(min_importance=4), 1) is None
+    assert cache.get("user", "u1", "what do I like?", 5, None, 2) is None
+    assert cache.get("user", "u1", "what do I like?", 5, None, 1) is None
+    assert cache.invalidations == 1
+
+    for i in range(3):
+        cache.put("user", "u2", f"q{i}", 5, None, 0, results)
+    assert cache.evictions == 1
+    assert cache.stats()["hit_rate"] == pytest.approx(1 / 5)
+
+
+def test_expiring_results_and_tracked_entity_limit(monkeypatch):
+    """测试结果中的记忆过期后条目失效；实体版本被淘汰后不会命中旧结果"""
+    cache = QueryResultCache()
+    expiring = [{"memory_id": "m1", "score": 0.9, "payload": {"expiry_at": time.time() - 1}}]
+    cache.put("user", "u1", "q", 5, None, 0, expiring)
+    assert cache.get("user", "u1", "q", 5, None, 0) is None
+    include_expired = MemoryFilterDTO(include_expired=True)
+    cache.put("user", "u1", "q", 5, include_expired, 0, expiring)
+    assert cache.get("user", "u1", "q", 5, include_expired, 0) is expiring
+
+    monkeypatch.setattr(query_cache_module, "_TRACKED_ENTITIES_MAX", 2)
+    versions = MemoryVersions()
+    versions.bump("user", "u1")
+    u1, u9 = versions.version("user", "u1"), versions.version("user", "u9")
+    versions.bump("user", "u2")
+    versions.bump("user", "u3")
+    # u1 的版本被淘汰并入下限，之后没有写入，版本不变；未写入过的 u9 的版本随下限变化
+    assert versions.version("user", "u1") == u1
+    assert versions.version("user", "u9") != u9
+    versions.bump("user", "u4")
+    assert versions.version("user", "u1") != u1
+
+
+def test_semantic_cache_matches_near_duplicates():
+    """测试相似度不低于阈值且版本一致时复用结果，环形缓冲覆盖最旧的查询"""
+    cache = SemanticQueryCache(threshold=0.9, size=2)
+    first = [{"memory_id": "m1", "score": 0.9, "payload": {}}]
+    second = [{"memory_id": "m2", "score": 0.8, "payload": {}}]
+    cache.put("user", "u1", 5, None, 1, [1.0, 0.0, 0.0], first)
+    cache.put("user", "u1", 5, None, 1, [0.0, 1.0, 0.0], second)
+
+    assert cache.get("user", "u1", 5, None, 1, [2.0, 0.2, 0.0]) is first
+    assert cache.get("user", "u1", 5, None, 1, [0.1, 1.0, 0.0]) is second
+    assert cache.get("user", "u1", 5, None, 1, [1.0, 1.0, 0.0]) is None
+    assert cache.get("user", "u1", 5, None, 2, [1.0, 0.0, 0.0]) is None
+    assert cache.get("user", "u1", 3, None, 1, [1.0, 0.0, 0.0]) is None
+    assert cache.get("user", "u1", 5, None, 1, [1.0, 0.0]) is None
+
+    cache.put("user", "u1", 5, None, 1, [0.0, 0.0, 1.0], second)
+    assert cache.get("user", "u1", 5, None, 1, [1.0, 0.0, 0.0]) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 5
+    assert 0.9 <= stats["mean_hit_similarity"] <= 1.0
+
+
+def test_semantic_buffer_grows_on_demand():
+    """测试环形缓冲按需倍增到容量上限，写满后覆盖最旧的查询"""
+    buffer = RecentQueries(capacity=3, dim=4)
+    assert buffer.embeddings.shape == (1, 4)
+
+    queries = [np.eye(4, dtype=np.float32)[i] for i in range(4)]
+    for i in range(3):
+        buffer.put(queries[i], 1, math.inf, [{"memory_id": f"m{i}"}])
+    assert buffer.embeddings.shape == (3, 4)
+    assert buffer.best_match(queries[2], 1) == (2, pytest.approx(1.0))
+
+    buffer.put(queries[3], 1, math.inf, [{"memory_id": "m3"}])
+    assert buffer.embeddings.shape == (3, 4)
+    assert buffer.results[0] == [{"memory_id": "m3"}]
+    assert buffer.best_match(queries[0], 1)[1] < 0.5
+
+
+@pytest.mark.asyncio
+async def test_repeated_queries_skip_embedding_and_search():
+    """测试重复查询不生成向量也不检索，写入后重新检索"""
+    embedding_service = FakeEmbeddingService()
+    vector_repo = SlowVectorRepository(delay=0)
+    service = _service(embedding_service, vector_repo, query_cache=QueryResultCache())
+    fused = QueryService(service, service)
+
+    first = await fused.query("what does the user like", user_id="u1", agent_id="a1")
+    second = await fused.query("What does the user like", user_id="u1", agent_id="a1")
+    assert second["fused_context"] == first["fused_context"]
+    assert len(embedding_service.calls) == 1
+    assert len(vector_repo.queries) == 2
+
+    await service.store(MemoryType.USER, "u1", "likes tea")
+    await fused.query("what does the user like", user_id="u1", agent_id="a1")
+    # store 生成一次向量，用户分支重新检索，Agent 分支仍命中缓存
+    assert len(embedding_service.calls) == 3
+    assert len(vector_repo.queries) == 3
+    assert service.query_cache.stats()["hits"] == 3
+
+
+@pytest.mark.asyncio
+async def test_paraphrased_queries_skip_search():
+    """测试查询向量足够相似时不再检索，写入后重新检索"""
+    embedding_service = FakeEmbeddingService()
+    vector_repo = SlowVectorRepository(delay=0)
+    service = _service(embedding_service, vector_repo, semantic_cache=SemanticQueryCache(threshold=0.99))
+
+    # 假 Embedding 的向量为 [文本长度, 1.0]，长度相近的查询余弦相似度接近 1
+    first = await service.query(MemoryType.USER, "u1", "what does the user like to drink")
+    second = await service.query(MemoryType.USER, "u1", "what drinks does the user enjoy")
+    assert second is first
+    assert len(vector_repo.queries) == 1
+
+    await service.query(MemoryType.USER, "u1", "tea?")
+    assert len(vector_repo.queries) == 2
+
+    await service.store(MemoryType.USER, "u1", "likes tea")
+    await service.query(MemoryType.USER, "u1", "what drinks does the user enjoy")
+    assert len(vector_repo.queries) == 3
+    assert service.semantic_cache.stats()["hits"] == 1
@@ -0,0 +1,171 @@
+import asyncio
+import pytest
+from datetime import datetime, timezone
+from app.config import settings
+from app.domain.dto import QueryItemDTO
+from app.domain.enums import MemoryType
+from app.services.memory_service import MemoryService
+from app.services.query_service import QueryService
+from tests.test_embedding import FakeEmbeddingService
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc).timestamp()
+
+
+def _hit(memory_id, score, days_old=0.0, importance=3):
+    return {
+        "memory_id": memory_id,
+        "score": score,
+        "payload": {"created_at": NOW - days_old * 86400, "importance": importance}
+    }
+
+
+class SlowVectorRepository:
+    """每次检索耗时固定的假向量仓储，记录收到的查询向量与同时在途检索数的峰值"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.queries = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def search(self, query_embedding, memory_type, entity_id, top_k=5, filters=None):
+        self.queries.append(query_embedding)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return [
+            _hit(f"{memory_type.value}_event_{entity_id}_1.0", 0.9),
+            _hit(f"{memory_type.value}_event_{entity_id}_2.0", 0.8)
+        ]
+
+
+class FakeMemoryRepository:
+    """记录批量读取次数的假记忆仓储；ID 以 _2.0 结尾的记忆视为已删除"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_by_ids(self, memory_ids):
+        self.calls.append(list(memory_ids))
+        return [
+            {
+                "id": memory_id,
+                "entity_id": memory_id.split("_")[2],
+                "memory_layer": "event",
+                "content": f"content of {memory_id}",
+                "metadata": None,
+                "created_at": None
+            }
+            for memory_id in memory_ids if not memory_id.endswith("_2.0")
+        ]
+
+
+def _memory_service(embedding_service, vector_repo, memory_repo=None):
+    return MemoryService(memory_repo, None, embedding_service, extractor=object(), vector_repo=vector_repo)
+
+
+@pytest.mark.asyncio
+async def test_fused_query_embeds_once_and_searches_concurrently():
+    """测试融合查询只生成一次查询向量，用户与 Agent 分支并发检索，命中一次批量取回"""
+    embedding_service = FakeEmbeddingService()
+    vector_repo = SlowVectorRepository(delay=0.1)
+    memory_repo = FakeMemoryRepository()
+    service = QueryService(
+        _memory_service(embedding_service, vector_repo, memory_repo),
+        _memory_service(embedding_service, vector_repo, memory_repo)
+    )
+
+    result = await service.query("what does the user like", user_id="u1", agent_id="a1")
+
+    assert len(embedding_service.calls) == 1
+    assert len(vector_repo.queries) == 2
+    assert vector_repo.queries[0] == vector_repo.queries[1]
+    # 两个分支的检索在时间上重叠
+    assert vector_repo.peak == 2
+    assert len(memory_repo.calls) == 1 and len(memory_repo.calls[0]) == 4
+    # 数据库中已不存在的命中被丢弃，其余带回内容
+    assert [m["id"] for m in result["user_memories"]] == ["user_event_u1_1.0"]
+    assert result["agent_memories"][0]["content"] == "content of agent_event_a1_1.0"
+    assert result["agent_memories"][0]["metadata"] == {}
+    assert len(result["fused_context"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_single_branch_query():
+    """测试只提供一个实体时只检索该分支"""
+    embedding_service = FakeEmbeddingService()
+    vector_repo = SlowVectorRepository(delay=0)
+    service = QueryService(_memory_service(embedding_service, vector_repo, FakeMemoryRepository()), None)
+
+    result = await service.query("hello", agent_id="a1")
+    assert result["user_memories"] == [] and result["agent_memories"] == []
+    assert result["fused_context"] == []
+    assert embedding_service.calls == []
+
+    result = await service.query("hello", user_id="u1")
+    assert len(result["user_memories"]) == 1
+    assert vector_repo.queries[0][0] == float(len("hello"))
+
+
+def test_fusion_normalizes_branches_and_applies_boosts(monkeypatch):
+    """测试分支内归一化后融合，时间衰减与重要性加分改变排序"""
+    monkeypatch.setattr(settings, "QUERY_RECENCY_WEIGHT", 0.0)
+    monkeypatch.setattr(settings, "QUERY_IMPORTANCE_WEIGHT", 0.0)
+    service = QueryService()
+    user_hits = [_hit("u_a", 0.9), _hit("u_b", 0.5)]
+    # Agent 集合的相似度整体偏低，归一化后首位与用户首位同分
+    agent_hits = [_hit("a_a", 0.4), _hit("a_b", 0.3)]
+
+    monkeypatch.setattr(settings, "QUERY_FUSION_METHOD", "score")
+    ranked = service._fuse_and_rank(user_hits, agent_hits, now=NOW)
+    assert {item["id"]: item["score"] for item in ranked} == {"u_a": 1.0, "a_a": 1.0, "u_b": 0.0, "a_b": 0.0}
+
+    monkeypatch.setattr(settings, "QUERY_FUSION_METHOD", "rrf")
+    ranked = service._fuse_and_rank(user_hits, agent_hits, now=NOW)
+    assert [item["score"] for item in ranked][:2] == [1.0, 1.0]
+    assert ranked[2]["score"] == pytest.approx(61 / 62)
+
+    monkeypatch.setattr(settings, "QUERY_RECENCY_WEIGHT", 0.2)
+    monkeypatch.setattr(settings, "QUERY_RECENCY_HALF_LIFE_DAYS", 30.0)
+    monkeypatch.setattr(settings, "QUERY_IMPORTANCE_WEIGHT", 0.1)
+    user_hits = [_hit("old", 0.9, days_old=60), _hit("new", 0.85, days_old=0, importance=5)]
+    ranked = service._fuse_and_rank(user_hits, [], now=NOW)
+    assert [item["id"] for item in ranked] == ["new", "old"]
+    assert ranked[0]["score"] == pytest.approx(61 / 62 + 0.2 + 0.1)
+    assert ranked[1]["score"] == pytest.approx(1.0 + 0.2 * 0.25 + 0.05)
+
+
+@pytest.mark.asyncio
+async def test_query_many_batches_embeddings_searches_and_hydration(monkeypatch):
+    """测试批量查询：不同查询文本一次批量生成向量，相同检索只做一次，并发受限，一次批量取回，结果保持输入顺序"""
+    monkeypatch.setattr(settings, "QUERY_BATCH_CONCURRENCY", 2)
+    embedding_service = FakeEmbeddingService()
+    vector_repo = SlowVectorRepository(delay=0.05)
+    memory_repo = FakeMemoryRepository()
+    service = QueryService(
+        _memory_service(embedding_service, vector_repo, memory_repo),
+        _memory_service(embedding_service, vector_repo, memory_repo)
+    )
+
+    items = [
+        QueryItemDTO(query="likes", user_id="u1", agent_id="a1"),
+        QueryItemDTO(query="dislikes", user_id="u2"),
+        QueryItemDTO(query="likes", user_id="u1"),
+        QueryItemDTO(query="likes", agent_id="a2"),
+    ]
+    results = await service.query_many(items)
+
+    assert embedding_service.calls == [["likes", "dislikes"]]
+    # (u1, likes) 只检索一次：u1/likes、a1/likes、u2/dislikes、a2/likes
+    assert len(vector_repo.queries) == 4
+    assert vector_repo.peak == 2
+    assert len(memory_repo.calls) == 1
+    assert [r["query"] for r in results] == ["likes", "dislikes", "likes", "likes"]
+    assert [m["entity_id"] for m in results[0]["fused_context"]] == ["u1", "a1"]
+    assert [m["entity_id"] for m in results[1]["user_memories"]] == ["u2"]
+    assert results[2]["user_memories"] == results[0]["user_memories"]
+    assert results[2]["agent_memories"] == []
+    assert [m["entity_id"] for m in results[3]["agent_memories"]] == ["a2"]
@@ -0,0 +1,185 @@
+import json
+import time
+import uuid
+import pytest
+from scripts import reconcile_vectors
+from scripts.reconcile_vectors import Reconciler, Scope
+from app.database.vector_store import point_id_for
+from app.config import settings
+
+SCOPE = Scope("zmemory_user_u1", "user", "u1")
+
+
+def _legacy_id(n):
+    """迁移前的随机点 ID，这里取固定值便于控制排序"""
+    return str(uuid.UUID(int=n))
+
+
+class FakeClient:
+    """只记录删除的假 Qdrant 客户端，points 为集合中现有的点 ID，created_at 为部分点的写入时间"""
+
+    def __init__(self, points, created_at=None):
+        self.points = set(points)
+        self.created_at = created_at or {}
+        self.deleted = []
+
+    async def delete(self, collection_name, points_selector):
+        self.points -= set(points_selector)
+        self.deleted.extend(points_selector)
+
+
+class FakeReconciler(Reconciler):
+    """
+    用内存中的两侧数据代替 PostgreSQL 与 Qdrant
+
+    rows 为 memory_id -> embedding_id；记忆侧与服务端游标一样在开始时取快照，
+    点侧与 scroll 一样逐页读取，能看到归并过程中补写的点。fail_on_reindex 次补写时抛出异常，模拟中断。
+    """
+
+    def __init__(self, rows, points, checkpoint_file, fail_on_reindex=None, created_at=None):
+        super().__init__(
+            checkpoint_file=checkpoint_file, client=FakeClient(points, created_at), embedding_service=object()
+        )
+        self.rows = rows
+        self.reindexed = []
+        self.reindex_calls = 0
+        self.fail_on_reindex = fail_on_reindex
+
+    async def memories(self, scope, after):
+        snapshot = sorted(
+            ((embedding_id, memory_id) for memory_id, embedding_id in self.rows.items()),
+            key=lambda row: (row[0] is None, row[0] or "")
+        )
+        for embedding_id, memory_id in snapshot:
+            if after is None or embedding_id is None or embedding_id > after:
+                yield embedding_id, memory_id
+
+    async def points(self, scope, after):
+        last = after
+        while True:
+            remaining = sorted(p for p in self.client.points if last is None or p > last)
+            if not remaining:
+                return
+            last = remaining[0]
+            yield last, self.client.created_at.get(last)
+
+    async def _reindex(self, memory_ids):
+        self.reindex_calls += 1
+        if self.reindex_calls == self.fail_on_reindex:
+            raise RuntimeError("interrupted")
+        for memory_id in memory_ids:
+            self.client.points.add(point_id_for(memory_id))
+            self.rows[memory_id] = point_id_for(memory_id)
+        self.reindexed.extend(memory_ids)
+
+
+@pytest.mark.asyncio
+async def test_missing_and_orphan_points(tmp_path):
+    """测试只在 PostgreSQL 中的记忆补写向量，只在 Qdrant 中的点被删除"""
+    rows = {memory_id: point_id_for(memory_id) for memory_id in ("a", "b", "c")}
+    orphan = point_id_for("deleted")
+    reconciler = FakeReconciler(rows, [point_id_for("a"), point_id_for("c"), orphan], tmp_path / "cp.json")
+
+    await reconciler.reconcile_scope(SCOPE, None)
+
+    assert reconciler.client.deleted == [orphan]
+    assert reconciler.reindexed == ["b"]
+    assert reconciler.stats == {"matched": 2, "orphans": 1, "missing": 1, "recent": 0}
+    assert reconciler.client.points == {point_id_for(m) for m in rows}
+    checkpoint = json.loads((tmp_path / "cp.json").read_text())
+    assert checkpoint["scope"] == list(SCOPE.key) and checkpoint["done"] is True
+
+
+@pytest.mark.asyncio
+async def test_recent_orphans_are_kept(tmp_path):
+    """测试宽限期内的孤儿点（可能属于尚未提交的写入）不删除，没有 created_at 的旧点照常删除"""
+    fresh, stale, legacy = point_id_for("in-flight"), point_id_for("stale"), point_id_for("legacy")
+    created_at = {fresh: time.time(), stale: time.time() - settings.RECONCILE_ORPHAN_GRACE_SECONDS - 1}
+    reconciler = FakeReconciler({}, [fresh, stale, legacy], tmp_path / "cp.json", created_at=created_at)
+
+    await reconciler.reconcile_scope(SCOPE, None)
+
+    assert sorted(reconciler.client.deleted) == sorted([stale, legacy])
+    assert reconciler.client.points == {fresh}
+    assert reconciler.stats["recent"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rekeys_legacy_and_empty_embedding_ids(tmp_path, monkeypatch):
+    """测试 embedding_id 为旧随机 ID 或为空的记忆按确定性 ID 补写，补写的点不会被当作孤儿删除"""
+    monkeypatch.setattr(reconcile_vectors, "REPAIR_BATCH_SIZE", 1)
+    legacy = _legacy_id(1)
+    rows = {"r": legacy, "n": None}
+    reconciler = FakeReconciler(rows, [legacy], tmp_path / "cp.json")
+
+    await reconciler.reconcile_scope(SCOPE, None)
+
+    assert reconciler.client.deleted == [legacy]
+    assert sorted(reconciler.reindexed) == ["n", "r"]
+    assert rows == {"r": point_id_for("r"), "n": point_id_for("n")}
+    assert reconciler.client.points == {point_id_for("r"), point_id_for("n")}
+
+    again = FakeReconciler(rows, reconciler.client.points, tmp_path / "again.json")
+    await again.reconcile_scope(SCOPE, None)
+    assert again.stats == {"matched": 2, "orphans": 0, "missing": 0, "recent": 0}
+
+
+@pytest.mark.asyncio
+async def test_rekey_progress_survives_interruption(tmp_path, monkeypatch):
+    """测试全部需要重新派生 ID 时检查点仍会推进，中断后续跑不从头开始，结果与一次跑完相同"""
+    monkeypatch.setattr(reconcile_vectors, "REPAIR_BATCH_SIZE", 2)
+    legacy = {f"m{i}": _legacy_id(i + 1) for i in range(10)}
+    rows = dict(legacy)
+    checkpoint_file = tmp_path / "cp.json"
+
+    first = FakeReconciler(rows, legacy.values(), checkpoint_file, fail_on_reindex=4)
+    with pytest.raises(RuntimeError):
+        await first.reconcile_scope(SCOPE, None)
+    state = json.loads(checkpoint_file.read_text())
+    assert state["last"] is not None and not state["done"]
+
+    resumed = FakeReconciler(rows, first.client.points, checkpoint_file)
+    await resumed.reconcile_scope(SCOPE, resumed.checkpoint["last"])
+
+    assert len(resumed.reindexed) < len(legacy)
+    assert rows == {memory_id: point_id_for(memory_id) for memory_id in legacy}
+    assert resumed.client.points == {point_id_for(memory_id) for memory_id in legacy}
+
+
+@pytest.mark.asyncio
+async def test_out_of_order_stream_aborts(tmp_path):
+    """测试点侧不是升序时中止归并，不做任何修复"""
+    class Unordered(FakeReconciler):
+        async def points(self, scope, after):
+            for point in sorted(self.client.points, reverse=True):
+                yield point, None
+
+    reconciler = Unordered({}, [_legacy_id(1), _legacy_id(2)], tmp_path / "cp.json")
+    with pytest.raises(RuntimeError, match="C 排序规则"):
+        await reconciler.reconcile_scope(SCOPE, None)
+    assert reconciler.client.deleted == []
+
+
+@pytest.mark.asyncio
+async def test_scopes_merge_paged_entities_with_collections(monkeypatch):
+    """测试 per_entity 布局下分页读取的实体与已有集合按键归并去重，两侧独有的实体都会处理"""
+    class Collections:
+        async def get_collections(self):
+            names = ["zmemory_user_u1", "zmemory_user_u3", "zmemory_agent_a0", "other"]
+            return type("Response", (), {"collections": [type("C", (), {"name": n}) for n in names]})
+
+    async def stored_entities():
+        for entity in [("agent", "a1"), ("user", "u1"), ("user", "u2")]:
+            yield entity
+
+    monkeypatch.setattr(settings, "QDRANT_COLLECTION_LAYOUT", "per_entity")
+    monkeypatch.setattr(settings, "QDRANT_COLLECTION_PREFIX", "zmemory")
+    monkeypatch.setattr(reconcile_vectors, "_stored_entities", stored_entities)
+    store = reconcile_vectors.QdrantStore(Collections())
+
+    scopes = [scope async for scope in reconcile_vectors._scopes(store)]
+
+    assert [scope.key for scope in scopes] == [
+        ("agent", "a0"), ("agent", "a1"), ("user", "u1"), ("user", "u2"), ("user", "u3")
+    ]
+    assert scopes[0].collection_name == "zmemory_agent_a0"
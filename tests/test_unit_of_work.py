@@ -0,0 +1,65 @@
+import pytest
+from app.database import unit_of_work as uow
+
+
+class FakeSession:
+    """记录提交与回滚次数的假会话"""
+
+    def __init__(self, opened: list):
+        self.commits = 0
+        self.rollbacks = 0
+        opened.append(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    sessions = []
+    monkeypatch.setattr(uow, "async_session", lambda: FakeSession(sessions))
+    return sessions
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_shares_one_session(opened):
+    """测试工作单元内的仓储会话（含嵌套工作单元）共用一个会话并只提交一次"""
+    async with uow.unit_of_work() as session:
+        assert uow.in_unit_of_work()
+        async with uow.session_scope() as first:
+            pass
+        async with uow.unit_of_work() as nested:
+            async with uow.session_scope() as second:
+                pass
+
+    assert first is second is nested is session
+    assert len(opened) == 1
+    assert session.commits == 1
+    assert not uow.in_unit_of_work()
+
+    async with uow.session_scope() as standalone:
+        pass
+    assert standalone is not session
+    assert standalone.commits == 1
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_rolls_back_on_error(opened):
+    """测试工作单元内出错时整体回滚，不提交"""
+    with pytest.raises(RuntimeError):
+        async with uow.unit_of_work():
+            async with uow.session_scope():
+                raise RuntimeError("extraction failed")
+
+    assert opened[0].commits == 0
+    assert opened[0].rollbacks == 1
+    assert not uow.in_unit_of_work()
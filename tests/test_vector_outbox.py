@@ -0,0 +1,176 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import postgresql
+from app.database import vector_outbox
+from app.database.vector_outbox import VectorOutboxDrainer, outbox_entry
+from app.config import settings
+
+T0 = datetime(2024, 1, 1)
+
+
+class FakeStore:
+    """记录写入顺序的假向量存储；fail_on 中的 (操作, 实体) 写入失败"""
+
+    def __init__(self, fail_on=()):
+        self.calls = []
+        self.fail_on = set(fail_on)
+
+    async def _record(self, operation, entity_id, items):
+        self.calls.append((operation, entity_id, items))
+        if (operation, entity_id) in self.fail_on:
+            raise RuntimeError("qdrant unavailable")
+
+    async def upsert_points(self, memory_type, entity_id, points):
+        await self._record("upsert", entity_id, [str(p.id) for p in points])
+
+    async def delete_points(self, memory_type, entity_id, point_ids):
+        await self._record("delete", entity_id, list(point_ids))
+
+    async def set_payloads(self, memory_type, entity_id, payloads):
+        await self._record("set_payload", entity_id, [(point_id, payload) for point_id, payload in payloads])
+
+
+def _entry(seconds, operation, point_id, entity_id="u1", payload=None):
+    entry = outbox_entry(
+        operation, f"memory_{point_id}", "user", entity_id, point_id,
+        embedding=[1.0, 0.0] if operation == "upsert" else None, payload=payload
+    )
+    entry.created_at = T0 + timedelta(seconds=seconds)
+    entry.seq = seconds
+    return entry
+
+
+@pytest.mark.asyncio
+async def test_entries_apply_in_creation_order():
+    """测试按创建顺序写入：被覆盖的记录丢弃，相邻同类操作合并，删除后的点不会被重新写入"""
+    store = FakeStore()
+    drainer = VectorOutboxDrainer(vector_store=store)
+    entries = [
+        _entry(3, "delete", "x"),
+        _entry(0, "delete", "w"),
+        _entry(1, "upsert", "x"),
+        _entry(2, "upsert", "y"),
+        _entry(4, "set_payload", "y", payload={"importance": 5}),
+    ]
+
+    done, retries = await drainer.apply(entries)
+
+    assert store.calls == [
+        ("delete", "u1", ["w"]),
+        ("upsert", "u1", ["y"]),
+        ("delete", "u1", ["x"]),
+        ("set_payload", "u1", [("y", {"importance": 5})]),
+    ]
+    assert sorted(done) == sorted(e.id for e in entries)
+    assert retries == []
+
+
+@pytest.mark.asyncio
+async def test_failed_entity_stops_and_backs_off():
+    """测试写入失败的实体按退避重试，其后续记录本批不再处理，其他实体不受影响"""
+    store = FakeStore(fail_on={("upsert", "u1")})
+    drainer = VectorOutboxDrainer(vector_store=store)
+    failing = _entry(0, "upsert", "a")
+    failing.attempts = 2
+    later = _entry(1, "delete", "b")
+    other = _entry(2, "upsert", "c", entity_id="u2")
+
+    before = datetime.utcnow()
+    done, retries = await drainer.apply([failing, later, other])
+
+    assert [call[:2] for call in store.calls] == [("upsert", "u1"), ("upsert", "u2")]
+    assert done == [other.id]
+    assert retries == [failing, later]
+    assert failing.attempts == 3
+    assert failing.last_error == "qdrant unavailable"
+    assert failing.next_attempt_at >= before + timedelta(seconds=8)
+    # 后续记录不计失败次数，与失败记录同时重试
+    assert later.attempts == 0
+    assert later.next_attempt_at == failing.next_attempt_at
+    assert drainer.failed == 1 and drainer.processed == 1
+
+
+@pytest.mark.asyncio
+async def test_backoff_is_capped(monkeypatch):
+    """测试退避时间不超过 OUTBOX_MAX_BACKOFF"""
+    monkeypatch.setattr(settings, "OUTBOX_MAX_BACKOFF", 30.0)
+    drainer = VectorOutboxDrainer(vector_store=FakeStore(fail_on={("set_payload", "u1")}))
+    entry = _entry(0, "set_payload", "a", payload={"tag": "x"})
+    entry.attempts = 10
+
+    before = datetime.utcnow()
+    _, retries = await drainer.apply([entry])
+
+    assert retries == [entry]
+    assert entry.next_attempt_at <= datetime.utcnow() + timedelta(seconds=30)
+    assert entry.next_attempt_at >= before + timedelta(seconds=30)
+
+
+@pytest.mark.asyncio
+async def test_same_transaction_entries_follow_seq():
+    """测试同一事务写入的记录 created_at 相同时按 seq 排序"""
+    store = FakeStore()
+    drainer = VectorOutboxDrainer(vector_store=store)
+    upsert, delete = _entry(0, "upsert", "x"), _entry(0, "delete", "x")
+    upsert.seq, delete.seq = 2, 1
+
+    await drainer.apply([upsert, delete])
+
+    assert store.calls == [("upsert", "u1", ["x"])]
+
+
+class ClaimSession:
+    """记录认领事务中执行的语句，按顺序返回预设结果"""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.statements = []
+        self.committed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        rows = self.results.pop(0) if self.results else []
+        return type("Result", (), {"scalars": lambda _: type("Scalars", (), {"all": lambda _: rows})()})()
+
+    async def commit(self):
+        self.committed = True
+
+    async def rollback(self):
+        pass
+
+    def expunge(self, entry):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_claim_locks_entities_before_reading_rows(monkeypatch):
+    """测试认领先对实体取 advisory lock，再在新语句中按 seq 读取记录；拿不到锁的实体不认领"""
+    entry = _entry(0, "upsert", "x")
+    session = ClaimSession([["user/u1", "user/u2"], ["user/u1"], [entry]])
+    monkeypatch.setattr(vector_outbox, "async_session", lambda: session)
+
+    entries = await VectorOutboxDrainer(vector_store=FakeStore())._claim()
+
+    assert entries == [entry]
+    candidates, lock, rows, lease = session.statements
+    assert "GROUP BY" in candidates
+    assert "pg_try_advisory_xact_lock" in lock
+    assert "FOR UPDATE SKIP LOCKED" in rows and "ORDER BY vector_outbox.seq" in rows
+    assert "vector_outbox_1.seq < vector_outbox.seq" in rows
+    assert lease.startswith("UPDATE vector_outbox") and session.committed
+
+
+@pytest.mark.asyncio
+async def test_claim_skips_when_entities_are_locked(monkeypatch):
+    """测试候选实体全部被其他实例锁住时不读取记录"""
+    session = ClaimSession([["user/u1"], []])
+    monkeypatch.setattr(vector_outbox, "async_session", lambda: session)
+
+    assert await VectorOutboxDrainer(vector_store=FakeStore())._claim() == []
+    assert len(session.statements) == 2 and not session.committed
@@ -0,0 +1,311 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from qdrant_client import AsyncQdrantClient
+from app.database import vector_store
+from app.database.vector_store import QdrantStore, point_id_for, vector_metadata
+from app.domain.dto import MemoryFilterDTO
+from app.domain.enums import MemoryLayer, MemoryType
+from app.database.vector_buffer import VectorWriteBuffer
+from app.database.vector_cache import HotVectorCache
+from app.repositories.impl.postgres_repository import QdrantVectorRepository
+from app.config import settings
+
+
+class CountingClient(AsyncQdrantClient):
+    """统计集合管理调用次数的内存 Qdrant 客户端"""
+
+    def __init__(self):
+        super().__init__(location=":memory:")
+        self.exists_calls = 0
+        self.create_calls = 0
+
+    async def collection_exists(self, collection_name, **kwargs):
+        self.exists_calls += 1
+        return await super().collection_exists(collection_name, **kwargs)
+
+    async def create_collection(self, *args, **kwargs):
+        self.create_calls += 1
+        return await super().create_collection(*args, **kwargs)
+
+
+@pytest.fixture
+def store():
+    vector_store._known_collections.clear()
+    vector_store._missing_collections.clear()
+    store = QdrantStore(client=CountingClient())
+    store.embedding_dim = 4
+    return store
+
+
+@pytest.mark.asyncio
+async def test_insert_checks_collection_once(store):
+    """测试集合存在性只在首次写入时检查"""
+    for i in range(5):
+        await store.insert(f"m{i}", [1.0, 0.0, 0.0, float(i)], "user", "u1")
+
+    assert store.client.exists_calls == 1
+    assert store.client.create_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_insert_tolerates_concurrent_create(store):
+    """测试集合已被其他进程创建时不报错"""
+    name = store._get_collection_name("user", "u1")
+    await store.client.create_collection(
+        name, vectors_config=vector_store.VectorParams(size=4, distance=vector_store.Distance.COSINE)
+    )
+
+    async def never_exists(*args, **kwargs):
+        return False
+
+    store.client.collection_exists = never_exists
+
+    await store.insert("m1", [1.0, 0.0, 0.0, 0.0], "user", "u1")
+
+    assert name in vector_store._known_collections
+
+
+@pytest.mark.asyncio
+async def test_search_missing_collection_returns_empty(store):
+    """测试没有集合的实体直接返回空结果并被负缓存"""
+    assert await store.search([1.0, 0.0, 0.0, 0.0], "user", "nobody") == []
+    assert await store.search([1.0, 0.0, 0.0, 0.0], "user", "nobody") == []
+    assert store.client.exists_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_insert_clears_negative_cache(store):
+    """测试写入后负缓存失效"""
+    await store.search([1.0, 0.0, 0.0, 0.0], "user", "u1")
+    await store.insert("m1", [1.0, 0.0, 0.0, 0.0], "user", "u1")
+
+    results = await store.search([1.0, 0.0, 0.0, 0.0], "user", "u1")
+
+    assert [r["memory_id"] for r in results] == ["m1"]
+
+
+@pytest.mark.asyncio
+async def test_shared_layout_isolates_tenants(store, monkeypatch):
+    """测试共享集合布局下检索按 entity_id 隔离"""
+    monkeypatch.setattr(settings, "QDRANT_COLLECTION_LAYOUT", "shared")
+
+    await store.insert("u1_m", [1.0, 0.0, 0.0, 0.0], "user", "u1")
+    await store.insert("u2_m", [1.0, 0.0, 0.0, 0.0], "user", "u2")
+
+    results = await store.search([1.0, 0.0, 0.0, 0.0], "user", "u1")
+
+    assert store._get_collection_name("user", "u1") == store._get_collection_name("user", "u2")
+    assert [r["memory_id"] for r in results] == ["u1_m"]
+    assert results[0]["payload"]["entity_id"] == "u1"
+
+
+
+@pytest.mark.asyncio
+async def test_memory_collections_covers_both_layouts(store, monkeypatch):
+    """测试列出记忆集合时同时包含 per_entity 与 shared 布局的集合，不含其他集合"""
+    await store.insert("u1_m", [1.0, 0.0, 0.0, 0.0], "user", "u1")
+    monkeypatch.setattr(settings, "QDRANT_COLLECTION_LAYOUT", "shared")
+    await store.insert("a1_m", [1.0, 0.0, 0.0, 0.0], "agent", "a1")
+    await store.ensure_collection("other_collection")
+
+    prefix = settings.QDRANT_COLLECTION_PREFIX
+    assert sorted(await store.memory_collections()) == [f"{prefix}_agent", f"{prefix}_user_u1"]
+
+@pytest.mark.asyncio
+async def test_write_buffer_batches_concurrent_inserts(store):
+    """测试并发写入按集合合并为批量 upsert"""
+    store.write_buffer = VectorWriteBuffer(store.client, max_batch_size=100, flush_interval_ms=5)
+    await store.ensure_collection(store._get_collection_name("user", "u1"))
+
+    await asyncio.gather(*(
+        store.insert(f"m{i}", [1.0, 0.0, 0.0, float(i)], "user", "u1")
+        for i in range(20)
+    ))
+
+    assert store.write_buffer.stats() == {"points": 20, "batches": 1, "pending": 0}
+    count = await store.client.count(store._get_collection_name("user", "u1"))
+    assert count.count == 20
+
+
+def test_explicit_write_buffer_is_kept(store):
+    """测试显式传入的写入缓冲不被共享缓冲替换；只传自定义客户端时不使用共享缓冲"""
+    buffer = VectorWriteBuffer(store.client, max_batch_size=10, flush_interval_ms=5)
+    assert QdrantStore(write_buffer=buffer).write_buffer is buffer
+    assert QdrantStore(client=store.client, write_buffer=buffer).write_buffer is buffer
+    assert QdrantStore(client=store.client).write_buffer is None
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_flush_on_shutdown(store):
+    """测试关闭时写出缓冲区"""
+    buffer = VectorWriteBuffer(store.client, max_batch_size=100, flush_interval_ms=60000)
+    name = store._get_collection_name("user", "u1")
+    await store.ensure_collection(name)
+
+    future = buffer.add(name, vector_store.PointStruct(id=1, vector=[1.0, 0.0, 0.0, 0.0], payload={}))
+    await buffer.flush()
+
+    assert future.done()
+    assert (await store.client.count(name)).count == 1
+
+
+@pytest.mark.asyncio
+async def test_point_ids_are_derived_from_memory_id(store):
+    """测试重复写入同一记忆不会产生重复向量，更新和删除直接按 memory_id 定位"""
+    name = store._get_collection_name("user", "u1")
+
+    first = await store.insert("m1", [1.0, 0.0, 0.0, 0.0], "user", "u1")
+    second = await store.insert("m1", [1.0, 0.0, 0.0, 0.0], "user", "u1")
+    assert first == second == point_id_for("m1")
+    assert (await store.client.count(name)).count == 1
+
+    await store.update("m1", None, "user", "u1", {"importance": 5})
+    points = await store.client.retrieve(name, [point_id_for("m1")], with_vectors=True)
+    assert points[0].payload["importance"] == 5
+    assert points[0].vector == [1.0, 0.0, 0.0, 0.0]
+
+    await store.delete("m1", "user", "u1")
+    assert (await store.client.count(name)).count == 0
+
+
+@pytest.mark.asyncio
+async def test_search_filters(store):
+    """测试记忆层、重要性、时间窗口与过期过滤在检索时生效"""
+    now = datetime.utcnow()
+    await store.insert("p1", [1.0, 0.0, 0.0, 0.0], "user", "u1",
+                       vector_metadata({"importance": 5}, "profile", now))
+    await store.insert("e1", [1.0, 0.1, 0.0, 0.0], "user", "u1",
+                       vector_metadata({"importance": 2}, "event", now - timedelta(days=10)))
+    await store.insert("e2", [1.0, 0.2, 0.0, 0.0], "user", "u1",
+                       vector_metadata({"importance": 4}, "event", now, now - timedelta(hours=1)))
+
+    async def ids(filters=None):
+        results = await store.search([1.0, 0.0, 0.0, 0.0], "user", "u1", 10, filters)
+        return sorted(r["memory_id"] for r in results)
+
+    assert await ids() == ["e1", "p1"]
+    assert await ids(MemoryFilterDTO(include_expired=True)) == ["e1", "e2", "p1"]
+    assert await ids(MemoryFilterDTO(memory_layer=MemoryLayer.EVENT)) == ["e1"]
+    assert await ids(MemoryFilterDTO(min_importance=3)) == ["p1"]
+    assert await ids(MemoryFilterDTO(created_after=now - timedelta(days=1))) == ["p1"]
+
+
+@pytest.mark.asyncio
+async def test_hot_cache_serves_small_entities(store):
+    """测试小实体首次检索后由进程内缓存检索，写入同步到缓存，大实体不缓存"""
+    cache = HotVectorCache(max_bytes=1024 * 1024, max_entity_size=3, ttl=60)
+    repo = QdrantVectorRepository(store, cache)
+    for i in range(3):
+        await repo.insert(f"m{i}", [1.0, float(i), 0.0, 0.0], MemoryType.USER, "small", {})
+
+    query = [1.0, 0.0, 0.0, 0.0]
+    from_qdrant = await repo.search(query, MemoryType.USER, "small", 2)
+    await asyncio.gather(*cache._loading.values())
+    from_cache = await repo.search(query, MemoryType.USER, "small", 2)
+
+    assert cache.hits == 1
+    assert [r["memory_id"] for r in from_cache] == [r["memory_id"] for r in from_qdrant]
+    assert from_cache[0]["score"] == pytest.approx(from_qdrant[0]["score"], abs=1e-5)
+
+    await repo.delete("m0", MemoryType.USER, "small")
+    await repo.update("m2", [1.0, 0.0, 0.0, 0.0], MemoryType.USER, "small", {})
+    results = await repo.search(query, MemoryType.USER, "small", 2)
+    assert [r["memory_id"] for r in results] == ["m2", "m1"]
+
+    for i in range(4):
+        await repo.insert(f"l{i}", [1.0, 0.0, 0.0, 0.0], MemoryType.USER, "large", {})
+    await repo.search(query, MemoryType.USER, "large", 2)
+    await asyncio.gather(*cache._loading.values())
+    assert cache.get((MemoryType.USER.value, "large")) is None
+    assert cache.stats()["large_entities"] == 1
+
+
+@pytest.mark.asyncio
+async def test_metadata_update_overwrites_payload(store):
+    """测试只改元数据时 payload 整体覆盖：删除的键在 Qdrant 与热缓存中都不再存在"""
+    cache = HotVectorCache(max_bytes=1024 * 1024, max_entity_size=10, ttl=60)
+    repo = QdrantVectorRepository(store, cache)
+    await repo.insert("m1", [1.0, 0.0, 0.0, 0.0], MemoryType.USER, "u1", {"tag": "a", "importance": 4})
+    await repo.search([1.0, 0.0, 0.0, 0.0], MemoryType.USER, "u1", 1)
+    await asyncio.gather(*cache._loading.values())
+
+    await repo.update("m1", None, MemoryType.USER, "u1", {"importance": 2})
+
+    cached = await repo.search([1.0, 0.0, 0.0, 0.0], MemoryType.USER, "u1", 1)
+    assert cache.hits == 1
+    points = await store.client.retrieve(store._get_collection_name("user", "u1"), ids=[point_id_for("m1")])
+    assert "tag" not in points[0].payload and points[0].payload["importance"] == 2
+    assert cached[0]["payload"] == points[0].payload
+
+
+@pytest.mark.asyncio
+async def test_quantized_collection_config(store, monkeypatch):
+    """测试量化配置下的集合创建、检索参数与对已有集合应用配置"""
+    monkeypatch.setattr(settings, "QDRANT_QUANTIZATION", "scalar")
+    monkeypatch.setattr(settings, "QDRANT_SEARCH_EF", 64)
+
+    params = vector_store.search_params("scalar", 64, True, 2.0)
+    assert params.hnsw_ef == 64
+    assert params.quantization.rescore is True
+    assert vector_store.search_params("none") is None
+
+    await store.insert("m1", [1.0, 0.0, 0.0, 0.0], "user", "u1")
+    results = await store.search([1.0, 0.0, 0.0, 0.0], "user", "u1")
+    assert [r["memory_id"] for r in results] == ["m1"]
+
+    await store.apply_collection_config(store._get_collection_name("user", "u1"))
+
+
+@pytest.mark.asyncio
+async def test_set_payloads_keeps_vectors(store):
+    """测试只改元数据时批量覆盖 payload（删除的键不保留），向量保持不变"""
+    await store.insert("m1", [1.0, 0.0, 0.0, 0.0], "user", "u1", {"importance": 2, "tag": "x"})
+    await store.insert("m2", [0.0, 1.0, 0.0, 0.0], "user", "u1", {"importance": 2})
+
+    await store.set_payloads("user", "u1", [
+        (point_id_for("m1"), QdrantStore.build_payload("m1", "user", "u1", {"importance": 5})),
+        (point_id_for("m2"), QdrantStore.build_payload("m2", "user", "u1", {"importance": 4})),
+    ])
+
+    points = await store.client.retrieve(
+        store._get_collection_name("user", "u1"),
+        ids=[point_id_for("m1"), point_id_for("m2")],
+        with_vectors=True
+    )
+    by_id = {point.payload["memory_id"]: point for point in points}
+    assert by_id["m1"].payload["importance"] == 5
+    assert "tag" not in by_id["m1"].payload
+    assert by_id["m2"].payload["importance"] == 4
+    assert by_id["m1"].vector[0] == pytest.approx(1.0)
+
+
+@pytest.mark.asyncio
+async def test_recreates_collection_deleted_externally(store):
+    """测试集合在服务之外被删除后，写入与检索清除缓存、重建集合并重试一次"""
+    name = store._get_collection_name("user", "u1")
+    await store.insert("m1", [1.0, 0.0, 0.0, 0.0], "user", "u1")
+    await store.client.delete_collection(name)
+
+    assert await store.search([1.0, 0.0, 0.0, 0.0], "user", "u1") == []
+    await store.insert("m2", [0.0, 1.0, 0.0, 0.0], "user", "u1")
+
+    results = await store.search([0.0, 1.0, 0.0, 0.0], "user", "u1")
+    assert [r["memory_id"] for r in results] == ["m2"]
+    assert store.client.create_calls == 2
+
+
+@pytest.mark.asyncio
+async def test_buffered_write_recreates_deleted_collection(store):
+    """测试经写入缓冲的批量写入遇到集合被删除时同样重建后重试"""
+    store.write_buffer = VectorWriteBuffer(store.client, max_batch_size=2, flush_interval_ms=5)
+    await store.insert("m1", [1.0, 0.0, 0.0, 0.0], "user", "u1")
+    await store.client.delete_collection(store._get_collection_name("user", "u1"))
+
+    await asyncio.gather(
+        store.insert("m2", [0.0, 1.0, 0.0, 0.0], "user", "u1"),
+        store.insert("m3", [0.0, 0.0, 1.0, 0.0], "user", "u1"),
+    )
+
+    results = await store.search([0.0, 1.0, 0.0, 0.0], "user", "u1", top_k=5)
+    assert sorted(r["memory_id"] for r in results) == ["m2", "m3"]